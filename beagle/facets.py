@@ -0,0 +1,60 @@
+import json
+import hashlib
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+
+def get_facets(queryset, lookups, cache_timeout=None):
+    """
+    Counts the distinct values of several fields of a queryset in one query, grouping
+    the filtered rows by each field with GROUPING SETS
+
+        get_facets(FileRepository.all(), ['metadata__requestId', 'file__file_type__name'])
+        {'metadata__requestId': {'10075_D': 12, ...}, 'file__file_type__name': {'fastq': 12}}
+
+    Each object of the queryset is counted once, even if its filters join many-valued
+    relations; null values aren't counted. Results are cached by the SQL of the query
+    for cache_timeout seconds, FACETS_CACHE_TIMEOUT by default; 0 disables caching
+    """
+    lookups = list(OrderedDict.fromkeys(lookups))
+    facets = OrderedDict((lookup, dict()) for lookup in lookups)
+    if not lookups:
+        return facets
+    if cache_timeout is None:
+        cache_timeout = settings.FACETS_CACHE_TIMEOUT
+
+    objects = queryset.model._default_manager.using(queryset.db).filter(pk__in=queryset.order_by().values('pk'))
+    sql, params = objects.values(*lookups).query.sql_with_params()
+    columns = ['f%s' % i for i in range(len(lookups))]
+    facets_sql = "SELECT {groupings}, {columns}, COUNT(*) FROM ({sql}) AS filtered ({columns}) " \
+                 "GROUP BY GROUPING SETS ({sets})".format(groupings=', '.join('GROUPING(%s)' % c for c in columns),
+                                                          columns=', '.join(columns),
+                                                          sql=sql,
+                                                          sets=', '.join('(%s)' % c for c in columns))
+
+    cache_key = None
+    if cache_timeout:
+        cache_key = 'beagle-facets-%s' % hashlib.sha1(repr((facets_sql, params)).encode('utf-8')).hexdigest()
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(facets_sql, params)
+        for row in cursor.fetchall():
+            groupings = row[:len(columns)]
+            values = row[len(columns):-1]
+            # GROUPING() is 0 for the column of the grouping set the row belongs to
+            i = groupings.index(0)
+            value = values[i]
+            if value is None:
+                continue
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, sort_keys=True)
+            facets[lookups[i]][value] = row[-1]
+
+    if cache_key:
+        cache.set(cache_key, facets, cache_timeout)
+    return facets
@@ -264,6 +264,9 @@ CACHES = {
     }
 }
 
+FACETS_CACHE_TIMEOUT = int(os.environ.get('BEAGLE_FACETS_CACHE_TIMEOUT', 0))
+ETL_CONFIGURATION_CACHE_TTL = int(os.environ.get('BEAGLE_ETL_CONFIGURATION_CACHE_TTL', 60))
+
 RABBITMQ_USERNAME = os.environ.get('BEAGLE_RABBITMQ_USERNAME', 'guest')
 RABBITMQ_PASSWORD = os.environ.get('BEAGLE_RABBITMQ_PASSWORD', 'guest')
 RABBITMQ_URL = os.environ.get('BEAGLE_RABBITMQ_URL', 'localhost')
@@ -273,6 +276,7 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERYD_CONCURRENCY = 1
+RUN_DISPATCH_CHUNK_SIZE = int(os.environ.get('BEAGLE_RUN_DISPATCH_CHUNK_SIZE', 50))
 CELERY_EVENT_QUEUE_PREFIX = os.environ.get('BEAGLE_CELERY_QUEUE_PREFIX', 'beagle.production')
 
 LIMS_USERNAME = os.environ.get('BEAGLE_LIMS_USERNAME')
@@ -323,12 +327,23 @@ NOTIFIER_ACTIVE = os.environ.get("BEAGLE_NOTIFIER_ACTIVE", True)
 NOTIFIER_CC = os.environ.get("BEAGLE_NOTIFIER_CC", '') # Put "CC [~webbera] and [~socci]" for production
 NOTIFIER_STORAGE_DIR = os.environ.get("BEAGLE_NOTIFIER_STORAGE_DIR", '/tmp')
 NOTIFIER_FILE_GROUP = os.environ.get("BEAGLE_NOTIFIER_FILE_GROUP")
+NOTIFIER_BUFFER_WINDOW = float(os.environ.get("BEAGLE_NOTIFIER_BUFFER_WINDOW", 5))
+NOTIFIER_ATTACHMENT_MAX_SIZE = int(os.environ.get("BEAGLE_NOTIFIER_ATTACHMENT_MAX_SIZE", 10 * 1024 * 1024))
+NOTIFIER_TICKET_CONCURRENCY = int(os.environ.get("BEAGLE_NOTIFIER_TICKET_CONCURRENCY", 4))
 
 JIRA_URL = os.environ.get("JIRA_URL", "")
 JIRA_USERNAME = os.environ.get("JIRA_USERNAME", "")
 JIRA_PASSWORD = os.environ.get("JIRA_PASSWORD", "")
 JIRA_PROJECT = os.environ.get("JIRA_PROJECT", "")
 JIRA_PIPELINE_FIELD_ID = os.environ.get('JIRA_PIPELINE_FIELD_ID', "customfield_10901")
+JIRA_TIMEOUT = float(os.environ.get('JIRA_TIMEOUT', 30))
+JIRA_MAX_RETRIES = int(os.environ.get('JIRA_MAX_RETRIES', 3))
+JIRA_BACKOFF_FACTOR = float(os.environ.get('JIRA_BACKOFF_FACTOR', 1))
+JIRA_BACKOFF_MAX = float(os.environ.get('JIRA_BACKOFF_MAX', 60))
+JIRA_RATE_LIMIT = float(os.environ.get('JIRA_RATE_LIMIT', 5))
+JIRA_RATE_BURST = int(os.environ.get('JIRA_RATE_BURST', 10))
+JIRA_POOL_SIZE = int(os.environ.get('JIRA_POOL_SIZE', 10))
+JIRA_MAX_TRANSITION_ATTEMPTS = int(os.environ.get('JIRA_MAX_TRANSITION_ATTEMPTS', 3))
 
 BEAGLE_URL = os.environ.get('BEAGLE_URL', 'http://silo:5001')
 
@@ -336,6 +351,8 @@ BEAGLE_RUNNER_QUEUE = os.environ.get('BEAGLE_RUNNER_QUEUE', 'beagle_runner_queue
 BEAGLE_DEFAULT_QUEUE = os.environ.get('BEAGLE_DEFAULT_QUEUE', 'beagle_default_queue')
 BEAGLE_JOB_SCHEDULER_QUEUE = os.environ.get('BEAGLE_JOB_SCHEDULER_QUEUE', 'beagle_job_scheduler_queue')
 BEAGLE_SHARED_TMPDIR = os.environ.get('BEAGLE_SHARED_TMPDIR', '/juno/work/ci/temp')
+TEMPO_MPGEN_CACHE_DIR = os.environ.get('BEAGLE_TEMPO_MPGEN_CACHE_DIR',
+                                       os.path.join(os.path.expanduser('~'), '.cache', 'beagle', 'tempo_mpgen'))
 
 PROJECT_DIR = os.path.dirname(os.path.realpath(__file__))
 ROOT_DIR = os.path.dirname(PROJECT_DIR)
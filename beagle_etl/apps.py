@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class BeagleEtlConfig(AppConfig):
     name = 'beagle_etl'
+
+    def ready(self):
+        import beagle_etl.recipe_routing
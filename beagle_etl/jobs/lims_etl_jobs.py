@@ -6,21 +6,24 @@ from django.conf import settings
 from beagle_etl.jobs import TYPES
 from notifier.models import JobGroup, JobGroupNotifier
 from notifier.events import ETLSetRecipeEvent, OperatorRequestEvent, SetCIReviewEvent, SetLabelEvent, \
-    NotForCIReviewEvent, UnknownAssayEvent, DisabledAssayEvent, AdminHoldEvent, CustomCaptureCCEvent, RedeliveryEvent, \
+    NotForCIReviewEvent, UnknownAssayEvent, DisabledAssayEvent, AdminHoldEvent, CustomCaptureCCEvent, \
     RedeliveryUpdateEvent, ETLImportCompleteEvent, ETLImportPartiallyCompleteEvent, \
     ETLImportNoSamplesEvent, LocalStoreFileEvent, ExternalEmailEvent, OnlyNormalSamplesEvent
 
-from notifier.tasks import send_notification, notifier_start
-from beagle_etl.models import JobStatus, Job, Operator, ETLConfiguration
+from notifier.tasks import send_notification, notify, get_notifier, start_request_tickets
+from notifier.notification_buffer import NotificationBuffer
+from beagle_etl.models import JobStatus, Job
+from beagle_etl.recipe_routing import RoutingTable, RecipeStatus
 from file_system.serializers import UpdateFileSerializer
 from file_system.exceptions import MetadataValidationException
 from file_system.repository.file_repository import FileRepository
+from file_system.repository.file_query_cache import FileQueryCache
 from file_system.models import File, FileGroup, FileMetadata, FileType, ImportMetadata, Sample
 from beagle_etl.exceptions import FailedToFetchSampleException, FailedToSubmitToOperatorException, \
     ErrorInconsistentDataException, MissingDataException, FailedToFetchPoolNormalException, FailedToCalculateChecksum
 from runner.tasks import create_jobs_from_request
 from file_system.helper.checksum import sha1, FailedToCalculateChecksum
-from runner.operator.helper import format_sample_name, format_patient_id
+from runner.operator.helper import format_sample_name, format_patient_id, parse_fastq_name
 from beagle_etl.lims_client import LIMSClient
 from django.contrib.auth.models import User
 
@@ -35,53 +38,93 @@ def fetch_new_requests_lims(timestamp, redelivery=True):
     if not request_ids:
         logger.info("There is no new RequestIDs")
         return []
-    for request in request_ids:
-        job, message = create_request_job(request['request'], redelivery=redelivery)
+    for request_id, job, message in create_request_jobs([request['request'] for request in request_ids],
+                                                        redelivery=redelivery):
         if job:
             if job.status == JobStatus.CREATED:
                 children.add(str(job.id))
         else:
-            logger.info("Job for requestId: %s not completed. %s", request['request'], message)
+            logger.info("Job for requestId: %s not completed. %s", request_id, message)
     return list(children)
 
 
 def create_request_job(request_id, redelivery=False):
-    logger.info(
-        "Searching for job: %s for request_id: %s" % (TYPES['REQUEST'], request_id))
-    count = Job.objects.filter(run=TYPES['REQUEST'], args__request_id=request_id,
-                               status__in=[JobStatus.CREATED, JobStatus.IN_PROGRESS,
-                                           JobStatus.WAITING_FOR_CHILDREN]).count()
-    request_redelivered = Job.objects.filter(run=TYPES['REQUEST'], args__request_id=request_id).count() > 0
-
-    assays = ETLConfiguration.objects.first()
-
-    if request_redelivered and not (assays.redelivery and redelivery):
-        return None, "Request is redelivered, but redelivery deactivated"
-
-    if count == 0:
-        job_group = JobGroup()
-        job_group.save()
-        job_group_notifier_id = notifier_start(job_group, request_id)
-        job_group_notifier = JobGroupNotifier.objects.get(id=job_group_notifier_id)
-        job = Job(run=TYPES['REQUEST'],
-                  args={'request_id': request_id, 'job_group': str(job_group.id),
-                        'job_group_notifier': job_group_notifier_id, 'redelivery': request_redelivered},
-                  status=JobStatus.CREATED,
-                  max_retry=1,
-                  children=[],
-                  callback=TYPES['REQUEST_CALLBACK'],
-                  callback_args={'request_id': request_id, 'job_group': str(job_group.id),
-                                 'job_group_notifier': job_group_notifier_id},
-                  job_group=job_group,
-                  job_group_notifier=job_group_notifier)
-        job.save()
-        if request_redelivered:
-            redelivery_event = RedeliveryEvent(job_group_notifier_id).to_dict()
-            send_notification.delay(redelivery_event)
-        return job, "Job Created"
+    _, job, message = create_request_jobs([request_id], redelivery=redelivery)[0]
+    return job, message
+
+
+def create_request_jobs(request_ids, redelivery=False):
+    """
+    Creates the REQUEST jobs for a delivery of requests with a fixed number of queries:
+    existing jobs are looked up at once, and job groups, notifiers and jobs are bulk
+    created. Tickets are created afterwards by start_request_tickets; until its ticket
+    exists a job is locked, so the scheduler doesn't pick it up
+    Returns a list of (request_id, job or None, message) in request order
+    """
+    logger.info("Searching for jobs: %s for request_ids: %s" % (TYPES['REQUEST'], request_ids))
+    existing = dict()
+    for request_id, status in Job.objects.filter(run=TYPES['REQUEST'], args__request_id__in=request_ids) \
+            .values_list('args__request_id', 'status'):
+        existing.setdefault(request_id, set()).add(status)
+
+    assays = RoutingTable.get().configuration
+    notifier = get_notifier() if settings.NOTIFIER_ACTIVE else None
+
+    results = list()
+    new = list()
+    for request_id in request_ids:
+        if any(request_id == r[0] for r in new):
+            results.append((request_id, None, "Job already created"))
+            continue
+        existing_statuses = existing.get(request_id, set())
+        request_redelivered = bool(existing_statuses)
+        if request_redelivered and not (assays.redelivery and redelivery):
+            results.append((request_id, None, "Request is redelivered, but redelivery deactivated"))
+            continue
+        if existing_statuses & {JobStatus.CREATED, JobStatus.IN_PROGRESS, JobStatus.WAITING_FOR_CHILDREN}:
+            results.append((request_id, None, "Job already running"))
+            continue
+        new.append((request_id, request_redelivered))
+        results.append((request_id, len(new) - 1, "Job Created"))
+
+    job_groups = JobGroup.objects.bulk_create([JobGroup() for _ in new])
+    job_group_notifiers = [None] * len(new)
+    if notifier:
+        job_group_notifiers = JobGroupNotifier.objects.bulk_create(
+            [JobGroupNotifier(job_group=job_group, notifier_type=notifier) for job_group in job_groups])
+    jobs = list()
+    for (request_id, request_redelivered), job_group, job_group_notifier in zip(new, job_groups,
+                                                                               job_group_notifiers):
+        job_group_notifier_id = str(job_group_notifier.id) if job_group_notifier else None
+        jobs.append(Job(run=TYPES['REQUEST'],
+                        args={'request_id': request_id, 'job_group': str(job_group.id),
+                              'job_group_notifier': job_group_notifier_id, 'redelivery': request_redelivered},
+                        status=JobStatus.CREATED,
+                        max_retry=1,
+                        children=[],
+                        callback=TYPES['REQUEST_CALLBACK'],
+                        callback_args={'request_id': request_id, 'job_group': str(job_group.id),
+                                       'job_group_notifier': job_group_notifier_id},
+                        job_group=job_group,
+                        job_group_notifier=job_group_notifier,
+                        lock=job_group_notifier is not None))
+    jobs = Job.objects.bulk_create(jobs)
+    results = [(request_id, jobs[job] if job is not None else None, message)
+               for request_id, job, message in results]
+
+    if notifier and new:
+        start_request_tickets.delay([(str(job_group_notifier.id), request_id, request_redelivered)
+                                     for (request_id, request_redelivered), job_group_notifier
+                                     in zip(new, job_group_notifiers)])
+    return results
 
 
 def request_callback(request_id, job_group=None, job_group_notifier=None):
+    with NotificationBuffer(), FileQueryCache():
+        return _request_callback(request_id, job_group, job_group_notifier)
+
+
+def _request_callback(request_id, job_group=None, job_group_notifier=None):
     jg = None
     jgn = None
     try:
@@ -90,87 +133,89 @@ def request_callback(request_id, job_group=None, job_group_notifier=None):
     except JobGroupNotifier.DoesNotExist:
         logger.debug("[RequestCallback] JobGroup not set")
     job_group_notifier_id = str(jgn.id) if jgn else None
-    assays = ETLConfiguration.objects.first()
-    recipes = list(FileRepository.filter(metadata={'requestId': request_id}, values_metadata='recipe').all())
+    routing_table = RoutingTable.get()
+    recipes = FileRepository.filter_cached(metadata={'requestId': request_id}, values_metadata='recipe')
     if not recipes:
         raise FailedToSubmitToOperatorException(
            "Not enough metadata to choose the operator for requestId:%s" % request_id)
 
-    if len(FileRepository.filter(metadata={'requestId': request_id}, values_metadata='recipe').all()) == 0:
+    if len(FileRepository.filter_cached(metadata={'requestId': request_id}, values_metadata='recipe')) == 0:
         no_samples_event = ETLImportNoSamplesEvent(job_group_notifier_id).to_dict()
-        send_notification.delay(no_samples_event)
+        notify(no_samples_event)
         return []
 
-    if not all(item in assays.all_recipes for item in recipes):
+    recipes_status = routing_table.status(recipes)
+    if recipes_status == RecipeStatus.UNKNOWN:
         ci_review_e = SetCIReviewEvent(job_group_notifier_id).to_dict()
-        send_notification.delay(ci_review_e)
+        notify(ci_review_e)
         set_unknown_assay_label = SetLabelEvent(job_group_notifier_id, 'unrecognized_assay').to_dict()
-        send_notification.delay(set_unknown_assay_label)
+        notify(set_unknown_assay_label)
         unknown_assay_event = UnknownAssayEvent(job_group_notifier_id, recipes[0]).to_dict()
-        send_notification.delay(unknown_assay_event)
+        notify(unknown_assay_event)
         return []
 
-    if any(item in assays.hold_recipes for item in recipes):
+    if recipes_status == RecipeStatus.HOLD:
         admin_hold_event = AdminHoldEvent(job_group_notifier_id).to_dict()
-        send_notification.delay(admin_hold_event)
+        notify(admin_hold_event)
         custom_capture_event = CustomCaptureCCEvent(job_group_notifier_id, recipes[0]).to_dict()
-        send_notification.delay(custom_capture_event)
+        notify(custom_capture_event)
         return []
 
-    if any(item in assays.disabled_recipes for item in recipes):
+    if recipes_status == RecipeStatus.DISABLED:
         not_for_ci = NotForCIReviewEvent(job_group_notifier_id).to_dict()
-        send_notification.delay(not_for_ci)
+        notify(not_for_ci)
         disabled_assay_event = DisabledAssayEvent(job_group_notifier_id, recipes[0]).to_dict()
-        send_notification.delay(disabled_assay_event)
+        notify(disabled_assay_event)
         return []
 
     if not all([JobStatus(job['status']) == JobStatus.COMPLETED for job in
         Job.objects.filter(job_group=job_group).values("status")]):
         ci_review_e = SetCIReviewEvent(job_group_notifier_id).to_dict()
-        send_notification.delay(ci_review_e)
+        notify(ci_review_e)
 
-    lab_head_email = FileRepository.filter(metadata={'requestId': request_id}, values_metadata='labHeadEmail').first()
+    lab_head_emails = FileRepository.filter_cached(metadata={'requestId': request_id}, values_metadata='labHeadEmail')
+    lab_head_email = lab_head_emails[0] if lab_head_emails else None
     try:
         if lab_head_email.split("@")[1] != "mskcc.org":
             event = ExternalEmailEvent(job_group_notifier_id, request_id).to_dict()
-            send_notification.delay(event)
+            notify(event)
     except Exception:
         logger.error("Failed to check labHeadEmail")
 
-    if len(FileRepository.filter(metadata={'requestId': request_id, 'tumorOrNormal': 'Tumor'})) == 0:
+    if len(FileRepository.filter_cached(metadata={'requestId': request_id, 'tumorOrNormal': 'Tumor'})) == 0:
         only_normal_samples_event = OnlyNormalSamplesEvent(job_group_notifier_id, request_id).to_dict()
-        send_notification.delay(only_normal_samples_event)
+        notify(only_normal_samples_event)
 
-    operators = Operator.objects.filter(recipes__overlap=recipes)
+    operators = routing_table.operators(recipes)
 
     if not operators:
         # TODO: Import ticket will have CIReviewNeeded
         msg = "No operator defined for requestId %s with recipe %s" % (request_id, recipes)
         logger.error(msg)
         e = OperatorRequestEvent(job_group_notifier_id, "[CIReviewEvent] %s" % msg).to_dict()
-        send_notification.delay(e)
+        notify(e)
         ci_review_e = SetCIReviewEvent(job_group_notifier_id).to_dict()
-        send_notification.delay(ci_review_e)
+        notify(ci_review_e)
         raise FailedToSubmitToOperatorException(msg)
     for operator in operators:
         if not operator.active:
             msg = "Operator not active: %s" % operator.class_name
             logger.info(msg)
             e = OperatorRequestEvent(job_group_notifier_id, "[CIReviewEvent] %s" % msg).to_dict()
-            send_notification.delay(e)
+            notify(e)
             error_label = SetLabelEvent(job_group_notifier_id, 'operator_inactive').to_dict()
-            send_notification.delay(error_label)
+            notify(error_label)
             ci_review_e = SetCIReviewEvent(job_group_notifier_id).to_dict()
-            send_notification.delay(ci_review_e)
+            notify(ci_review_e)
         else:
             logger.info("Submitting request_id %s to %s operator" % (request_id, operator.class_name))
             if Job.objects.filter(job_group=job_group, args__request_id=request_id, run=TYPES['SAMPLE'],
                                   status=JobStatus.FAILED).all():
                 partialy_complete_event = ETLImportPartiallyCompleteEvent(job_notifier=job_group_notifier_id).to_dict()
-                send_notification.delay(partialy_complete_event)
+                notify(partialy_complete_event)
             else:
                 complete_event = ETLImportCompleteEvent(job_notifier=job_group_notifier_id).to_dict()
-                send_notification.delay(complete_event)
+                notify(complete_event)
 
             create_jobs_from_request.delay(request_id, operator.id, job_group)
     return []
@@ -316,7 +361,7 @@ def create_pooled_normal(filepath, file_group_id):
         logger.info("Pooled normal already created filepath")
     file_group_obj = FileGroup.objects.get(id=file_group_id)
     file_type_obj = FileType.objects.filter(name='fastq').first()
-    assays = ETLConfiguration.objects.first()
+    assays = RoutingTable.get().configuration
     assay_list = assays.all_recipes
     run_id = None
     preservation_type = None
@@ -377,7 +422,7 @@ def fetch_sample_metadata(sample_id, igocomplete, request_id, request_metadata,
     except Sample.DoesNotExist:
         sample = Sample.objects.create(sample_id=sample_id)
 
-    validate_sample(sample_id, data.get('libraries', []), igocomplete, redelivery)
+    existing_files = validate_sample(sample_id, data.get('libraries', []), igocomplete, redelivery)
 
     libraries = data.pop('libraries')
     for library in libraries:
@@ -392,16 +437,29 @@ def fetch_sample_metadata(sample_id, igocomplete, request_id, request_metadata,
                 logger.info("Adding file %s" % fastq)
                 create_or_update_file(fastq, request_id, settings.IMPORT_FILE_GROUP, 'fastq', igocomplete, data,
                                       library, run, sample,
-                                      request_metadata, R1_or_R2(fastq), update=redelivery,
-                                      job_group_notifier=job_group_notifier)
+                                      request_metadata, parse_fastq_name(fastq).read or 'UNKNOWN', update=redelivery,
+                                      job_group_notifier=job_group_notifier, existing_files=existing_files)
+
+
+def get_existing_files(paths):
+    """
+    Returns a dict of path -> File for the paths already registered, with one query
+    """
+    return {f.path: f for f in File.objects.filter(path__in=list(set(paths)))}
 
 
 def validate_sample(sample_id, libraries, igocomplete, redelivery=False):
+    """
+    Checks that every run of the sample has fastqs and, unless it's a redelivery, that
+    none of them is registered yet. Returns a dict of path -> File for the sample's
+    fastqs which already exist, for create_or_update_file
+    """
     conflict = False
     missing_fastq = False
     invalid_number_of_fastq = False
     failed_runs = []
     conflict_files = []
+    sample_fastqs = []
     if not libraries:
         if igocomplete:
             raise ErrorInconsistentDataException(
@@ -427,20 +485,17 @@ def validate_sample(sample_id, libraries, igocomplete, redelivery=False):
                 run_id = run['runId'] if run['runId'] else 'None'
                 failed_runs.append(run_id)
             else:
-                if not redelivery:
-                    for fastq in fastqs:
-                        file_search = None
-                        try:
-                            file_search = File.objects.get(path=fastq)
-                        except File.DoesNotExist:
-                            pass
-                        # file_search = FileRepository.filter(path=fastq).first()
-                        logger.info("Processing %s" % fastq)
-                        if file_search:
-                            msg = "File %s already created with id:%s" % (file_search.path, str(file_search.id))
-                            logger.error(msg)
-                            conflict = True
-                            conflict_files.append((file_search.path, str(file_search.id)))
+                sample_fastqs.extend(fastqs)
+    existing_files = get_existing_files(sample_fastqs)
+    if not redelivery:
+        for fastq in sample_fastqs:
+            file_search = existing_files.get(fastq)
+            logger.info("Processing %s" % fastq)
+            if file_search:
+                msg = "File %s already created with id:%s" % (file_search.path, str(file_search.id))
+                logger.error(msg)
+                conflict = True
+                conflict_files.append((file_search.path, str(file_search.id)))
     if missing_fastq:
         if igocomplete:
             raise ErrorInconsistentDataException(
@@ -457,24 +512,7 @@ def validate_sample(sample_id, libraries, igocomplete, redelivery=False):
                 res_str += "%s: %s" % (f[0], f[1])
             raise ErrorInconsistentDataException(
                 "Conflict of fastq file(s) %s" % res_str)
-
-
-def R1_or_R2(filename):
-    reversed_filename = ''.join(reversed(filename))
-    R1_idx = reversed_filename.find('1R')
-    R2_idx = reversed_filename.find('2R')
-    if R1_idx == -1 and R2_idx == -1:
-        return "UNKNOWN"
-    elif R1_idx > 0 and R2_idx == -1:
-        return "R1"
-    elif R2_idx > 0 and R1_idx == -1:
-        return 'R2'
-    elif R1_idx > 0 and R2_idx > 0:
-        if R1_idx < R2_idx:
-            return 'R1'
-        else:
-            return 'R2'
-    return 'UNKNOWN'
+    return existing_files
 
 
 def convert_to_dict(runs):
@@ -499,7 +537,11 @@ def convert_to_dict(runs):
 
 
 def create_or_update_file(path, request_id, file_group_id, file_type, igocomplete, data, library, run, sample,
-                          request_metadata, r, update=False, job_group_notifier=None):
+                          request_metadata, r, update=False, job_group_notifier=None, existing_files=None):
+    """
+    existing_files is a dict of path -> File for the files already registered, as
+    returned by validate_sample; without it the file is looked up by path
+    """
     logger.info("Creating file %s " % path)
     try:
         file_group_obj = FileGroup.objects.get(id=file_group_id)
@@ -527,9 +569,12 @@ def create_or_update_file(path, request_id, file_group_id, file_type, igocomplet
         logger.error("Failed to create file %s. Error %s" % (path, str(e)))
         raise FailedToFetchSampleException("Failed to create file %s. Error %s" % (path, str(e)))
     else:
-        f = FileRepository.filter(path=path).first()
+        if existing_files is None:
+            existing_files = get_existing_files([path])
+        f = existing_files.get(path)
         if not f:
-            create_file_object(path, file_group_obj, lims_metadata, metadata, file_type_obj, sample)
+            existing_files[path] = create_file_object(path, file_group_obj, lims_metadata, metadata, file_type_obj,
+                                                      sample)
 
             if update:
                 message = "File registered: %s" % path
@@ -537,15 +582,15 @@ def create_or_update_file(path, request_id, file_group_id, file_type, igocomplet
                 send_notification.delay(update)
         else:
             if update:
-                before = f.file.filemetadata_set.order_by('-created_date').count()
-                update_file_object(f.file, path, metadata)
-                after = f.file.filemetadata_set.order_by('-created_date').count()
+                before = f.filemetadata_set.order_by('-created_date').count()
+                update_file_object(f, path, metadata)
+                after = f.filemetadata_set.order_by('-created_date').count()
                 if after != before:
-                    all_metadata = f.file.filemetadata_set.order_by('-created_date')
+                    all_metadata = f.filemetadata_set.order_by('-created_date')
                     ddiff = DeepDiff(all_metadata[1].metadata,
                                      all_metadata[0].metadata,
                                      ignore_order=True)
-                    diff_file_name = "%s_metadata_update.json" % f.file.file_name
+                    diff_file_name = "%s_metadata_update.json" % f.file_name
                     message = "Updating file metadata: %s, details in file %s\n" % (path, diff_file_name)
                     update = RedeliveryUpdateEvent(job_group_notifier, message).to_dict()
                     diff_details_event = LocalStoreFileEvent(job_group_notifier, diff_file_name, str(ddiff)).to_dict()
@@ -593,6 +638,7 @@ def create_file_object(path, file_group, lims_metadata, metadata, file_type, sam
                            args={'file_id': str(f.id), 'path': path},
                            status=JobStatus.CREATED, max_retry=3, children=[])
         import_metadata = ImportMetadata.objects.create(file=f, metadata=lims_metadata)
+        return f
     except Exception as e:
         logger.error("Failed to create file %s. Error %s" % (path, str(e)))
         raise FailedToFetchSampleException("Failed to create file %s. Error %s" % (path, str(e)))
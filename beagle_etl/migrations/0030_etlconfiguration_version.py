@@ -0,0 +1,18 @@
+# Generated by Django 2.2.11 on 2020-09-14 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beagle_etl', '0029_operator_notifier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='etlconfiguration',
+            name='version',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -72,3 +72,17 @@ class ETLConfiguration(models.Model):
     all_recipes = ArrayField(models.CharField(max_length=100), null=True, blank=True)
     disabled_recipes = ArrayField(models.CharField(max_length=100), null=True, blank=True)
     hold_recipes = ArrayField(models.CharField(max_length=100), null=True, blank=True)
+    version = models.IntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        """
+        Bumps version in the database, so a stale instance can't write back an old one
+        """
+        if self.pk and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs['update_fields'] = [f for f in update_fields if f != 'version']
+        super().save(*args, **kwargs)
+        ETLConfiguration.objects.filter(pk=self.pk).update(version=models.F('version') + 1)
+        self.refresh_from_db(fields=['version'])
@@ -0,0 +1,122 @@
+"""
+Process-level routing table of recipes, built from ETLConfiguration and the Operators
+
+Imports look up the configuration for every request and pooled normal file; the
+table is loaded once and shared until the configuration version changes. Saving
+ETLConfiguration or an Operator bumps the version, and drops the table of the
+process it's saved in; other processes recheck the version every
+ETL_CONFIGURATION_CACHE_TTL seconds.
+"""
+import time
+import logging
+import threading
+from enum import IntEnum
+from collections import namedtuple
+from django.conf import settings
+from django.db.models import F
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from beagle_etl.models import ETLConfiguration, Operator
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RecipeStatus(IntEnum):
+    """
+    Ordered by precedence, a request is routed by the highest status of its recipes
+    """
+    ENABLED = 0
+    DISABLED = 1
+    HOLD = 2
+    UNKNOWN = 3
+
+
+RecipeRoute = namedtuple('RecipeRoute', ['status', 'operators'])
+
+UNKNOWN_ROUTE = RecipeRoute(RecipeStatus.UNKNOWN, ())
+
+
+class RoutingTable(object):
+    """
+    Maps each recipe to its status and the operators it is submitted to
+
+        table = RoutingTable.get()
+        table.route('IMPACT468')
+        RecipeRoute(status=<RecipeStatus.ENABLED: 0>, operators=(<Operator: TempoOperator>,))
+        table.status(['IMPACT468', 'HoldAssay'])
+        <RecipeStatus.HOLD: 2>
+
+    configuration is the ETLConfiguration the table was built from, and must not be
+    modified
+    """
+    _table = None
+    _checked = 0
+    _lock = threading.Lock()
+
+    def __init__(self, configuration, operators):
+        self.configuration = configuration
+        self.version = configuration.version if configuration else None
+        all_recipes = set(configuration.all_recipes or []) if configuration else set()
+        hold_recipes = set(configuration.hold_recipes or []) if configuration else set()
+        disabled_recipes = set(configuration.disabled_recipes or []) if configuration else set()
+        recipes = set(all_recipes)
+        for operator in operators:
+            recipes.update(operator.recipes)
+        self.routes = dict()
+        for recipe in recipes:
+            if recipe not in all_recipes:
+                status = RecipeStatus.UNKNOWN
+            elif recipe in hold_recipes:
+                status = RecipeStatus.HOLD
+            elif recipe in disabled_recipes:
+                status = RecipeStatus.DISABLED
+            else:
+                status = RecipeStatus.ENABLED
+            self.routes[recipe] = RecipeRoute(status, tuple(o for o in operators if recipe in o.recipes))
+
+    def route(self, recipe):
+        return self.routes.get(recipe, UNKNOWN_ROUTE)
+
+    def status(self, recipes):
+        return max([self.route(recipe).status for recipe in recipes], default=RecipeStatus.ENABLED)
+
+    def operators(self, recipes):
+        """
+        Returns the operators of any of the recipes, once each, in id order
+        """
+        operators = dict()
+        for recipe in recipes:
+            for operator in self.route(recipe).operators:
+                operators[operator.id] = operator
+        return [operators[operator_id] for operator_id in sorted(operators)]
+
+    @classmethod
+    def get(cls):
+        table = cls._table
+        if table and time.monotonic() - cls._checked < settings.ETL_CONFIGURATION_CACHE_TTL:
+            return table
+        with cls._lock:
+            version = ETLConfiguration.objects.values_list('version', flat=True).first()
+            if cls._table is None or cls._table.version != version:
+                LOGGER.debug("Loading recipe routing table, configuration version %s", version)
+                cls._table = cls(ETLConfiguration.objects.first(), list(Operator.objects.order_by('id')))
+            cls._checked = time.monotonic()
+            return cls._table
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._table = None
+
+
+@receiver(post_save, sender=ETLConfiguration)
+@receiver(post_delete, sender=ETLConfiguration)
+def invalidate_configuration(sender, instance, **kwargs):
+    RoutingTable.clear()
+
+
+@receiver(post_save, sender=Operator)
+@receiver(post_delete, sender=Operator)
+def invalidate_operator(sender, instance, **kwargs):
+    ETLConfiguration.objects.update(version=F('version') + 1)
+    RoutingTable.clear()
@@ -10,13 +10,16 @@ from django.test import TestCase
 from django.conf import settings
 from beagle_etl.tasks import scheduler
 from beagle_etl.models import JobStatus, Job, ETLConfiguration
+from beagle_etl.recipe_routing import RoutingTable
 from beagle_etl.exceptions import FailedToFetchSampleException, MissingDataException, ErrorInconsistentDataException, FailedToFetchPoolNormalException
 from rest_framework.test import APITestCase
 from runner.models import Operator
 from notifier.models import JobGroup, JobGroupNotifier, Notifier
+from notifier.tasks import start_request_tickets
 from file_system.repository import FileRepository
 from file_system.models import File, FileMetadata, FileType, FileGroup, Storage, StorageType
-from beagle_etl.jobs.lims_etl_jobs import create_pooled_normal, fetch_sample_metadata, get_run_id_from_string, fetch_samples, request_callback
+from beagle_etl.jobs.lims_etl_jobs import create_pooled_normal, fetch_sample_metadata, get_run_id_from_string, fetch_samples, request_callback, \
+    create_request_jobs
 
 # use local execution for Celery tasks
 # if beagle_etl.celery.app.conf['task_always_eager'] == False:
@@ -97,6 +100,7 @@ class TestCreatePooledNormal(TestCase):
     ]
 
     def setUp(self):
+        RoutingTable.clear()
         self.storage = Storage.objects.create(name="LOCAL", type=StorageType.LOCAL)
         self.file_group = FileGroup.objects.create(name=settings.POOLED_NORMAL_FILE_GROUP, storage=self.storage)
         assay = ETLConfiguration.objects.first()
@@ -105,6 +109,9 @@ class TestCreatePooledNormal(TestCase):
         assay.disabled = ['DisabledAssay']
         assay.save()
 
+    def tearDown(self):
+        RoutingTable.clear()
+
     def test_true(self):
         self.assertTrue(True)
 
@@ -199,6 +206,7 @@ class MockResponse:
 class TestImportSample(APITestCase):
 
     def setUp(self):
+        RoutingTable.clear()
         self.storage = Storage.objects.create(name="LOCAL", type=StorageType.LOCAL)
         self.fastq = FileType.objects.create(name='fastq')
         self.file_group = FileGroup.objects.create(name="LIMS", storage=self.storage)
@@ -501,6 +509,7 @@ class TestImportSample(APITestCase):
         assay.disabled_recipes = self.disabled_backup
         assay.save()
         settings.IMPORT_FILE_GROUP = self.old_val
+        RoutingTable.clear()
 
     @patch('requests.get')
     def test_zero_fastq_files(self, mock_get_sample):
@@ -558,6 +567,24 @@ class TestImportSample(APITestCase):
         ]).count()
         self.assertEqual(count_files, 1)
 
+    @patch('notifier.tasks.send_notification.delay')
+    @patch('requests.get')
+    def test_redelivery_updates_existing_file(self, mock_get_sample, mock_send_notification):
+        existing_file = File.objects.create(
+            path="/path/to/sample/08/sampleName_002-d_IGO_igoId_002_S134_L008_R2_001.fastq.gz",
+            file_type=self.fastq,
+            file_group=self.file_group,
+            )
+        FileMetadata.objects.create(file=existing_file, version=1, metadata={})
+        mock_get_sample.return_value = MockResponse(json_data=self.data_2_fastq, status_code=200)
+        fetch_sample_metadata('igoId_002', True, 'sampleName_002', {}, redelivery=True)
+        files = FileRepository.filter(path_in=[
+            "/path/to/sample/08/sampleName_002-d_IGO_igoId_002_S134_L008_R2_001.fastq.gz",
+            "/path/to/sample/08/sampleName_002-d_IGO_igoId_002_S134_L008_R1_001.fastq.gz"
+        ])
+        self.assertEqual(files.count(), 2)
+        self.assertEqual(FileRepository.get(existing_file.id).metadata['sampleId'], 'igoId_002')
+
     @patch('runner.tasks.create_jobs_from_request.delay')
     def test_request_callback(self, mock_create_jobs_from_request):
         file_conflict = File.objects.create(
@@ -609,8 +636,8 @@ class TestImportSample(APITestCase):
 
         mock_create_jobs_from_request.assert_has_calls(calls, any_order=True)
 
-    @patch('notifier.tasks.send_notification.delay')
-    def test_request_callback_unknown_assay(self, mock_send_notification):
+    @patch('notifier.tasks.send_notifications.delay')
+    def test_request_callback_unknown_assay(self, mock_send_notifications):
         job_group = JobGroup.objects.create()
         notifier = Notifier.objects.create(default=False, notifier_type="JIRA", board="IMPORT")
         job_group_notifier = JobGroupNotifier.objects.create(job_group=job_group, notifier_type=notifier)
@@ -627,27 +654,27 @@ class TestImportSample(APITestCase):
                                                     })
         request_callback('test1', str(job_group.id), str(job_group_notifier.id))
 
-        calls = [
-            call({
+        events = [
+            {
                 'class': 'SetCIReviewEvent',
                 'job_notifier': str(job_group_notifier.id)
-            }),
-            call({
+            },
+            {
                 'class': 'SetLabelEvent',
                 'job_notifier': str(job_group_notifier.id),
                 'label': 'unrecognized_assay'
-            }),
-            call({
+            },
+            {
                 'class': 'UnknownAssayEvent',
                 'job_notifier': str(job_group_notifier.id),
                 'assay': 'UnknownAssay'
-            })
+            }
         ]
 
-        mock_send_notification.assert_has_calls(calls, any_order=True)
+        mock_send_notifications.assert_called_once_with(str(job_group_notifier.id), events)
 
-    @patch('notifier.tasks.send_notification.delay')
-    def test_request_callback_disabled_assay(self, mock_send_notification):
+    @patch('notifier.tasks.send_notifications.delay')
+    def test_request_callback_disabled_assay(self, mock_send_notifications):
         job_group = JobGroup.objects.create()
         notifier = Notifier.objects.create(default=False, notifier_type="JIRA", board="IMPORT")
         job_group_notifier = JobGroupNotifier.objects.create(job_group=job_group, notifier_type=notifier)
@@ -664,17 +691,59 @@ class TestImportSample(APITestCase):
                                                     })
         request_callback('test1', str(job_group.id), str(job_group_notifier.id))
 
-        calls = [
-            call({
+        events = [
+            {
                 'class': 'NotForCIReviewEvent',
                 'job_notifier': str(job_group_notifier.id)
-            }),
-            call({
+            },
+            {
                 'class': 'DisabledAssayEvent',
                 'job_notifier': str(job_group_notifier.id),
                 'assay': 'DisabledAssay1'
-            })
+            }
         ]
 
-        mock_send_notification.assert_has_calls(calls, any_order=True)
+        mock_send_notifications.assert_called_once_with(str(job_group_notifier.id), events)
+
 
+class TestCreateRequestJobs(TestCase):
+
+    def setUp(self):
+        RoutingTable.clear()
+        self.notifier = Notifier.objects.get(default=True)
+        self.notifier.notifier_type = "NONE"
+        self.notifier.save()
+
+    def tearDown(self):
+        RoutingTable.clear()
+
+    @patch('notifier.tasks.start_request_tickets.delay')
+    def test_create_request_jobs(self, mock_start_request_tickets):
+        existing = create_request_jobs(['10075_D'])[0][1]
+        mock_start_request_tickets.reset_mock()
+        with self.assertNumQueries(6):
+            results = create_request_jobs(['10075_D', '10075_E', '10075_F', '10075_E'])
+        self.assertEqual([(r[0], r[2]) for r in results], [('10075_D', "Job already running"),
+                                                           ('10075_E', "Job Created"),
+                                                           ('10075_F', "Job Created"),
+                                                           ('10075_E', "Job already created")])
+        jobs = [results[1][1], results[2][1]]
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertTrue(job.lock)
+            self.assertEqual(job.job_group_notifier.notifier_type, self.notifier)
+        self.assertFalse(existing.args['redelivery'])
+        mock_start_request_tickets.assert_called_once_with(
+            [(str(job.job_group_notifier_id), job.args['request_id'], False) for job in jobs])
+
+    @patch('notifier.tasks.send_notification.delay')
+    @patch('notifier.tasks.start_request_tickets.delay')
+    def test_start_request_tickets(self, mock_start_request_tickets, mock_send_notification):
+        job = create_request_jobs(['10075_D'])[0][1]
+        Job.objects.filter(id=job.id).update(status=JobStatus.COMPLETED)
+        redelivered = create_request_jobs(['10075_D'], redelivery=True)[0][1]
+        self.assertTrue(redelivered.args['redelivery'])
+        start_request_tickets(mock_start_request_tickets.call_args[0][0])
+        redelivered.refresh_from_db()
+        self.assertFalse(redelivered.lock)
+        self.assertEqual(mock_send_notification.call_count, 1)
@@ -0,0 +1,59 @@
+"""
+Tests for the recipe routing table
+"""
+from django.test import TestCase
+from beagle_etl.models import ETLConfiguration, Operator
+from beagle_etl.recipe_routing import RoutingTable, RecipeStatus
+
+
+class TestRoutingTable(TestCase):
+
+    def setUp(self):
+        RoutingTable.clear()
+        assay = ETLConfiguration.objects.first()
+        assay.all_recipes = ['IMPACT468', 'HemePACT', 'DisabledAssay', 'HoldAssay']
+        assay.disabled_recipes = ['DisabledAssay']
+        assay.hold_recipes = ['HoldAssay']
+        assay.save()
+        self.operator1 = Operator.objects.create(slug="Operator1", class_name="Operator",
+                                                 recipes=['IMPACT468', 'HemePACT'], active=True)
+        self.operator2 = Operator.objects.create(slug="Operator2", class_name="Operator",
+                                                 recipes=['HemePACT'], active=True)
+
+    def tearDown(self):
+        RoutingTable.clear()
+
+    def test_route(self):
+        table = RoutingTable.get()
+        self.assertEqual(table.route('IMPACT468').status, RecipeStatus.ENABLED)
+        self.assertEqual(table.route('IMPACT468').operators, (self.operator1,))
+        self.assertEqual(table.route('DisabledAssay').status, RecipeStatus.DISABLED)
+        self.assertEqual(table.route('Unknown').status, RecipeStatus.UNKNOWN)
+        self.assertEqual(table.status(['IMPACT468', 'DisabledAssay', 'HoldAssay']), RecipeStatus.HOLD)
+        self.assertEqual(table.status(['HoldAssay', 'Unknown']), RecipeStatus.UNKNOWN)
+        self.assertEqual(table.operators(['IMPACT468', 'HemePACT']), [self.operator1, self.operator2])
+
+    def test_table_is_reused(self):
+        table = RoutingTable.get()
+        with self.assertNumQueries(0):
+            self.assertIs(RoutingTable.get(), table)
+
+    def test_saves_invalidate_table(self):
+        version = ETLConfiguration.objects.first().version
+        RoutingTable.get()
+        Operator.objects.create(slug="Operator3", class_name="Operator", recipes=['IMPACT468'], active=True)
+        self.assertEqual(len(RoutingTable.get().route('IMPACT468').operators), 2)
+        assay = ETLConfiguration.objects.first()
+        self.assertEqual(assay.version, version + 1)
+        assay.disabled_recipes = ['IMPACT468']
+        assay.save()
+        self.assertEqual(RoutingTable.get().route('IMPACT468').status, RecipeStatus.DISABLED)
+
+    def test_stale_instance_bumps_version(self):
+        stale = ETLConfiguration.objects.first()
+        current = ETLConfiguration.objects.first()
+        current.hold_recipes = []
+        current.save()
+        stale.save()
+        self.assertEqual(stale.version, current.version + 1)
+        self.assertEqual(ETLConfiguration.objects.first().version, stale.version)
@@ -0,0 +1,144 @@
+import os
+import uuid
+from django.db import transaction
+from django.db.models import Max
+from django.utils.timezone import now
+from django.contrib.auth.models import User
+from file_system.models import File, FileMetadata, FileType
+from file_system.repository.file_repository import FileRepository
+from file_system.repository.file_query_cache import FileQueryCache
+from file_system.exceptions import FileNotFoundException
+from file_system.serializers import BatchUpdateFileSerializer
+
+
+class BatchFilePatch(object):
+    """
+    Applies a list of {"id": <file id>, "patch": {...}} partial updates as one set
+    operation: all files and their latest metadata are loaded with one query, patches
+    are validated and merged in memory, and the result is written with bulk queries
+    in a single transaction
+
+        patch = BatchFilePatch(patch_files)
+        patch.load()
+        if patch.is_valid():
+            patch.save()
+        patch.results
+
+    results holds one entry per patch, in request order
+    """
+    FILE_FIELDS = ('path', 'file_name', 'size', 'file_group', 'file_type', 'modified_date')
+
+    def __init__(self, patch_files):
+        self.patch_files = patch_files
+        self.results = [{'id': str(p.get('id'))} for p in patch_files]
+        self.file_ids = [self._file_id(p.get('id')) for p in patch_files]
+        self.latest = dict()
+        self.validated_data = list()
+
+    @staticmethod
+    def _file_id(file_id):
+        try:
+            return uuid.UUID(str(file_id))
+        except ValueError:
+            return None
+
+    def load(self):
+        """
+        Loads the files being patched with their latest metadata; raises
+        FileNotFoundException for the first id which doesn't exist
+        """
+        ids = [file_id for file_id in self.file_ids if file_id]
+        self.latest = {fm.file_id: fm for fm in FileRepository.all().filter(file_id__in=ids).select_related('file')}
+        missing = list()
+        for file_id, patch, result in zip(self.file_ids, self.patch_files, self.results):
+            if file_id not in self.latest:
+                result['status'] = 'not_found'
+                missing.append(patch.get('id'))
+        if missing:
+            raise FileNotFoundException('File {} not found'.format(missing[0]))
+
+    def is_valid(self):
+        file_type_names = set([p['patch'].get('file_type') for p in self.patch_files
+                               if isinstance(p['patch'].get('file_type'), str)])
+        file_types = {ft.name: ft for ft in FileType.objects.filter(name__in=file_type_names)}
+        valid = True
+        self.validated_data = list()
+        for patch, result in zip(self.patch_files, self.results):
+            serializer = BatchUpdateFileSerializer(data=patch['patch'], partial=True,
+                                                   context={'file_types': file_types})
+            if serializer.is_valid():
+                self.validated_data.append(serializer.validated_data)
+            else:
+                self.validated_data.append(None)
+                result['status'] = 'invalid'
+                result['errors'] = serializer.errors
+                valid = False
+        return self._validate_paths() and valid
+
+    def _validate_paths(self):
+        """
+        Checks that no two files end up with the same path, with one path__in query
+        """
+        new_paths = dict()
+        for file_id, data in zip(self.file_ids, self.validated_data):
+            if data and 'path' in data:
+                new_paths.setdefault(data['path'], set()).add(file_id)
+        owners = dict(File.objects.filter(path__in=list(new_paths)).values_list('path', 'id'))
+        valid = True
+        for file_id, data, result in zip(self.file_ids, self.validated_data, self.results):
+            if not data or 'path' not in data:
+                continue
+            path = data['path']
+            if len(new_paths[path]) > 1 or owners.get(path, file_id) != file_id:
+                result['status'] = 'invalid'
+                result.setdefault('errors', {})['path'] = ['This field must be unique.']
+                valid = False
+        return valid
+
+    def save(self):
+        """
+        Writes the patches in one transaction; the files are locked first, and their
+        latest metadata and versions are read again under the lock, so concurrent
+        patches of the same files are applied one after the other
+        """
+        user_ids = set([data['user'] for data in self.validated_data if data.get('user') is not None])
+        users = {user.id: user for user in User.objects.filter(id__in=user_ids)}
+        with transaction.atomic():
+            locked = File.objects.select_for_update().filter(id__in=list(self.latest)).order_by('id')
+            locked = {f.id: f for f in locked}
+            latest = {fm.file_id: fm for fm in FileMetadata.objects.filter(file_id__in=list(locked), latest=True)}
+            versions = dict(FileMetadata.objects.filter(file_id__in=list(locked)).values('file_id')
+                            .annotate(max_version=Max('version')).values_list('file_id', 'max_version'))
+            timestamp = now()
+            files = dict()
+            metadata = dict()
+            new_metadata = list()
+            for file_id, data, result in zip(self.file_ids, self.validated_data, self.results):
+                if file_id not in locked:
+                    raise FileNotFoundException('File {} not found'.format(file_id))
+                f = locked[file_id]
+                f.path = data.get('path', f.path)
+                f.file_name = os.path.basename(f.path)
+                f.size = data.get('size', f.size)
+                f.file_group_id = data.get('file_group_id', f.file_group_id)
+                f.file_type = data.get('file_type', f.file_type)
+                f.modified_date = timestamp
+                files[file_id] = f
+                if data.get('metadata') is not None:
+                    previous = metadata.get(file_id, latest.get(file_id))
+                    merged = dict(previous.metadata if previous else {})
+                    merged.update(data['metadata'])
+                    versions[file_id] = versions.get(file_id, -1) + 1
+                    metadata[file_id] = FileMetadata(file=f, metadata=merged, version=versions[file_id],
+                                                     latest=False, user=users.get(data.get('user')))
+                    new_metadata.append(metadata[file_id])
+                    result['version'] = versions[file_id]
+                result['status'] = 'updated'
+            for file_metadata in metadata.values():
+                file_metadata.latest = True
+            FileMetadata.objects.filter(file_id__in=list(metadata), latest=True).update(latest=False)
+            FileMetadata.objects.bulk_create(new_metadata)
+            File.objects.bulk_update(list(files.values()), self.FILE_FIELDS)
+        # bulk writes don't send the signals FileQueryCache is invalidated by
+        FileQueryCache.invalidate_active()
+        return self.results
@@ -1,9 +1,14 @@
 import re
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
+import threading
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import best_match
 from file_system.exceptions import MetadataValidationException
 
 
+WHITESPACE_REGEX = re.compile('[\t\r\n]')
+NON_ALPHANUMERIC_REGEX = re.compile('[^a-zA-Z0-9 ]')
+
+
 METADATA_SCHEMA = {
     "$id": "https://example.com/person.schema.json",
     "$schema": "http://json-schema.org/draft-07/schema#",
@@ -145,9 +150,30 @@ METADATA_SCHEMA = {
 
 
 class MetadataValidator(object):
+    """
+    Validates metadata against a JSON schema. The Draft7Validator for a schema is
+    built and the schema checked once per process, and shared by every
+    MetadataValidator using that schema
+    """
+    _validators = dict()
+    _lock = threading.Lock()
 
     def __init__(self, schema=METADATA_SCHEMA):
         self.schema = schema
+        self.validator = MetadataValidator.get_validator(schema)
+
+    @classmethod
+    def get_validator(cls, schema):
+        # Keyed by id, the schema is kept in the entry so its id can't be reused
+        entry = cls._validators.get(id(schema))
+        if entry is None:
+            with cls._lock:
+                entry = cls._validators.get(id(schema))
+                if entry is None:
+                    Draft7Validator.check_schema(schema)
+                    entry = (schema, Draft7Validator(schema))
+                    cls._validators[id(schema)] = entry
+        return entry[1]
 
     @staticmethod
     def clean(metadata):
@@ -163,19 +189,29 @@ class MetadataValidator(object):
     @staticmethod
     def clean_value(val):
         if val:
-            regex = re.compile('[\t\r\n]')
-            result = regex.sub(' ', val)
+            result = WHITESPACE_REGEX.sub(' ', val)
             result = result.strip()
-            regex = re.compile('[^a-zA-Z0-9 ]')
-            result = regex.sub('', result)
+            result = NON_ALPHANUMERIC_REGEX.sub('', result)
             return result
         return None
 
     def validate(self, data):
-        try:
-            validate(instance=data, schema=self.schema)
-        except ValidationError as e:
-            raise MetadataValidationException(e)
+        error = best_match(self.validator.iter_errors(data))
+        if error is not None:
+            raise MetadataValidationException(error)
+
+    def validate_many(self, records):
+        """
+        Validates a list of metadata records, returning a list with the error messages
+        of each record, in order; valid records have an empty list
+        """
+        return [[self.format_error(error) for error in self.validator.iter_errors(data)] for data in records]
+
+    @staticmethod
+    def format_error(error):
+        if error.absolute_path:
+            return "%s: %s" % ('.'.join(str(p) for p in error.absolute_path), error.message)
+        return error.message
 
 
 if __name__ == '__main__':
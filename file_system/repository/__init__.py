@@ -1 +1,2 @@
-from .file_repository import FileRepository
\ No newline at end of file
+from .file_repository import FileRepository
+from .file_query_cache import FileQueryCache
@@ -0,0 +1,103 @@
+import logging
+import threading
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from file_system.models import File, FileMetadata
+
+
+logger = logging.getLogger(__name__)
+
+
+class FileQueryCache(object):
+    """
+    Memoizes FileRepository.filter_cached results for the duration of a block, like a
+    request callback or an operator start, which repeat the same lookups for a request
+
+        with FileQueryCache() as cache:
+            recipes = FileRepository.filter_cached(metadata={'requestId': request_id}, values_metadata='recipe')
+            ...
+            cache.stats()
+
+    Results are keyed by the normalized filter arguments. Saving or deleting a File or
+    FileMetadata drops all cached results, as the write can move a file out of the
+    results of another request. QuerySet.update() and bulk writes send no signals, so
+    their callers must call FileQueryCache.invalidate_active() themselves. Caches are
+    per thread and can be nested; only the innermost one is used
+    """
+    _local = threading.local()
+
+    def __init__(self):
+        self.results = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        FileQueryCache._stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        FileQueryCache._stack().remove(self)
+        logger.debug("[FileQueryCache] %s", self.stats())
+
+    @classmethod
+    def _stack(cls):
+        if not hasattr(cls._local, 'stack'):
+            cls._local.stack = list()
+        return cls._local.stack
+
+    @classmethod
+    def current(cls):
+        stack = cls._stack()
+        return stack[-1] if stack else None
+
+    @staticmethod
+    def make_key(kwargs):
+        def normalize(value):
+            if isinstance(value, dict):
+                return tuple(sorted((k, normalize(v)) for k, v in value.items()))
+            if isinstance(value, (list, tuple, set)):
+                return tuple(normalize(v) for v in value)
+            return value
+        return tuple(sorted((k, normalize(v)) for k, v in kwargs.items() if v))
+
+    def get_or_load(self, kwargs, load):
+        key = self.make_key(kwargs)
+        if key in self.results:
+            self.hits += 1
+            return self.results[key][1]
+        self.misses += 1
+        request_id = (kwargs.get('metadata') or {}).get('requestId')
+        result = load()
+        self.results[key] = (request_id, result)
+        return result
+
+    def invalidate(self, request_id=None):
+        """
+        Drops the results for request_id, and the ones not filtered by a requestId; all
+        results if request_id is None
+        """
+        if request_id is None:
+            self.results.clear()
+            return
+        for key in [k for k, (rid, _) in self.results.items() if rid is None or rid == request_id]:
+            del self.results[key]
+
+    @classmethod
+    def invalidate_active(cls, request_id=None):
+        for cache in cls._stack():
+            cache.invalidate(request_id)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.results)}
+
+
+@receiver(post_save, sender=FileMetadata)
+@receiver(post_delete, sender=FileMetadata)
+def invalidate_file_metadata(sender, instance, **kwargs):
+    FileQueryCache.invalidate_active()
+
+
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+def invalidate_file(sender, instance, **kwargs):
+    FileQueryCache.invalidate_active()
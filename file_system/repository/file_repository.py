@@ -1,13 +1,16 @@
 from django.db.models import Q
 from file_system.models import FileMetadata, File
 from file_system.exceptions import FileNotFoundException, InvalidQueryException
+from file_system.repository.file_query_cache import FileQueryCache
 
 
 class FileRepository(object):
+    # Relations read by FileSerializer, joined so serializing a page doesn't query per file
+    RELATED = ('file__file_group', 'file__file_type', 'file__sample', 'user')
 
     @classmethod
     def all(cls):
-        queryset = FileMetadata.objects.filter(latest=True).all()
+        queryset = FileMetadata.objects.filter(latest=True).select_related(*cls.RELATED)
         return queryset
 
     @classmethod
@@ -17,6 +20,17 @@ class FileRepository(object):
         except FileMetadata.DoesNotExist:
             raise FileNotFoundException("File with id:%s does not exist" % str(id))
 
+    @classmethod
+    def filter_cached(cls, **kwargs):
+        """
+        Evaluated results of FileRepository.filter(**kwargs) as a list, memoized by the
+        active FileQueryCache, if any. Results must not be modified
+        """
+        cache = FileQueryCache.current()
+        if cache is None or kwargs.get('queryset') is not None or kwargs.get('q') is not None:
+            return list(cls.filter(**kwargs))
+        return cache.get_or_load(kwargs, lambda: list(cls.filter(**kwargs)))
+
     @classmethod
     def delete(self, id):
         try:
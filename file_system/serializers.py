@@ -124,10 +124,7 @@ class FileSerializer(serializers.ModelSerializer):
 
     def get_user(self, obj):
         if obj.user:
-            try:
-                return User.objects.get(id=obj.user.id).username
-            except User.DoesNotExist:
-                return None
+            return obj.user.username
         return None
 
     def get_file_name(self, obj):
@@ -199,6 +196,12 @@ class FileQuerySerializer(serializers.Serializer):
 
     metadata_distribution = serializers.CharField(required=False)
 
+    metadata_facets = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=True,
+        required=False
+    )
+
     count = serializers.BooleanField(required=False)
 
     created_date_timedelta = serializers.IntegerField(required=False)
@@ -305,6 +308,20 @@ class UpdateFileSerializer(serializers.Serializer):
         return instance
 
 
+class BatchUpdateFileSerializer(UpdateFileSerializer):
+    """
+    Validates a single patch of a batch. Path uniqueness and file types are checked
+    for the whole batch at once by BatchFilePatch, so validation doesn't query
+    """
+    path = serializers.CharField(max_length=400, required=False)
+
+    def validate_file_type(self, file_type):
+        file_types = self.context.get('file_types', {})
+        if file_type not in file_types:
+            raise serializers.ValidationError("Unknown file_type: %s" % file_type)
+        return file_types[file_type]
+
+
 class SampleSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -3,8 +3,11 @@ import uuid
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from file_system.metadata.validator import MetadataValidator
+from file_system.repository import FileRepository, FileQueryCache
 from file_system.models import Storage, StorageType, FileGroup, File, FileType, FileMetadata
 
 
@@ -237,6 +240,45 @@ class FileTest(APITestCase):
         self.assertEqual(first_file_metadata.metadata['requestId'], "Request_001")
         self.assertEqual(second_file_metadata.metadata['requestId'], "Request_002")
 
+    def test_batch_patch_file_results(self):
+        first_file = self._create_single_file('/path/to/first_file.bam', 'bam', str(self.file_group.id), 'first_request_id', 'first_sample_id')
+        second_file = self._create_single_file('/path/to/second_file.bam', 'bam', str(self.file_group.id), 'second_request_id', 'second_sample_id')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % self._generate_jwt())
+        patch_json = {
+            "patch_files": [
+                {"id": first_file.id, "patch": {"path": "/path/to/renamed_file.bam", "metadata": {"requestId": "Request_001"}}},
+                {"id": first_file.id, "patch": {"metadata": {"igoSampleId": "Sample_001"}}},
+                {"id": second_file.id, "patch": {"file_type": "fastq"}}
+            ]
+        }
+        response = self.client.post('/v0/fs/batch-patch-files', patch_json, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in response.data['results']], ['updated', 'updated', 'updated'])
+        self.assertEqual([r.get('version') for r in response.data['results']], [1, 2, None])
+        first_file.refresh_from_db()
+        self.assertEqual(first_file.path, "/path/to/renamed_file.bam")
+        self.assertEqual(first_file.file_name, "renamed_file.bam")
+        self.assertEqual(File.objects.get(id=second_file.id).file_type.name, "fastq")
+        latest = FileMetadata.objects.get(file=first_file, latest=True)
+        self.assertEqual(latest.version, 2)
+        self.assertEqual(latest.metadata, {"requestId": "Request_001", "igoSampleId": "Sample_001"})
+        self.assertEqual(FileMetadata.objects.filter(file=second_file).count(), 1)
+
+    def test_batch_patch_file_duplicate_path(self):
+        first_file = self._create_single_file('/path/to/first_file.bam', 'bam', str(self.file_group.id), 'first_request_id', 'first_sample_id')
+        second_file = self._create_single_file('/path/to/second_file.bam', 'bam', str(self.file_group.id), 'second_request_id', 'second_sample_id')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % self._generate_jwt())
+        patch_json = {
+            "patch_files": [
+                {"id": first_file.id, "patch": {"metadata": {"requestId": "Request_001"}}},
+                {"id": second_file.id, "patch": {"path": "/path/to/first_file.bam"}}
+            ]
+        }
+        response = self.client.post('/v0/fs/batch-patch-files', patch_json, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['results'][1]['errors']['path'], ['This field must be unique.'])
+        self.assertEqual(FileMetadata.objects.get(file=first_file, latest=True).metadata['requestId'], "first_request_id")
+
     def test_fail_batch_patch_file_metadata(self):
         first_file = self._create_single_file('/path/to/first_file.bam', 'bam', str(self.file_group.id), 'first_request_id', 'first_sample_id')
         second_file = self._create_single_file('/path/to/second_file.bam', 'bam', str(self.file_group.id), 'second_request_id', 'second_sample_id')
@@ -430,6 +472,80 @@ class FileTest(APITestCase):
                                    )
         self.assertEqual(response.json()['results'][0], '1')
 
+    def _list_queries(self, url):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % self._generate_jwt())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_list_files_num_queries(self):
+        """
+        Serializing a page of files shouldn't query per file: authentication, count and page
+        """
+        self._create_files('fasta', 1)
+        FileMetadata.objects.update(user=self.user)
+        self.assertEqual(self._list_queries('/v0/fs/files/'), 3)
+        self._create_files('fasta', 5)
+        FileMetadata.objects.update(user=self.user)
+        self.assertEqual(self._list_queries('/v0/fs/files/'), 3)
+        self.assertEqual(self._list_queries('/v0/fs/files/?file_type=fasta&metadata=requestId:request_1'), 3)
+
+    def test_list_file_metadata_num_queries(self):
+        _file = self._create_single_file('/path/to/sample_file.bam', 'bam', str(self.file_group.id), 'request_id',
+                                         'sample_id')
+        for i in range(3):
+            FileMetadata(file=_file, metadata={"requestId": "request_%s" % i}, user=self.user).save()
+        self.assertEqual(self._list_queries('/v0/fs/metadata/?file_id=%s' % str(_file.id)), 3)
+
+    def test_metadata_facets(self):
+        self._create_files('fasta', 2)
+        self._create_files('bam', 1)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % self._generate_jwt())
+        response = self.client.get('/v0/fs/files/?metadata_facets=requestId,igoSampleId,missingKey', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            "requestId": {"request_0": 3, "request_1": 2},
+            "igoSampleId": {"sample_0": 3, "sample_1": 2},
+            "missingKey": {}
+        })
+        response = self.client.get('/v0/fs/files/?file_type=fasta&metadata_distribution=requestId', format='json')
+        self.assertEqual(response.json(), {"request_0": 2, "request_1": 2})
+
+    def test_metadata_facets_count_files_not_values(self):
+        self._create_files('fasta', 2)
+        self._create_files('bam', 1)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % self._generate_jwt())
+        response = self.client.get('/v0/fs/files/?values_metadata=requestId&metadata_facets=requestId',
+                                   format='json')
+        self.assertEqual(response.json(), {"requestId": {"request_0": 3, "request_1": 2}})
+        response = self.client.get('/v0/fs/files/?values_metadata=requestId,igoSampleId'
+                                   '&metadata_distribution=requestId', format='json')
+        self.assertEqual(response.json(), {"request_0": 3, "request_1": 2})
+
+    def test_filter_cached(self):
+        self._create_single_file('/path/to/first_file.bam', 'bam', str(self.file_group.id), 'request_1', 'sample_1')
+        with FileQueryCache() as cache:
+            files = FileRepository.filter_cached(metadata={'requestId': 'request_1'}, file_type='bam')
+            with self.assertNumQueries(0):
+                self.assertIs(FileRepository.filter_cached(file_type='bam', metadata={'requestId': 'request_1'}),
+                              files)
+            self.assertEqual(len(files), 1)
+            self._create_single_file('/path/to/second_file.bam', 'bam', str(self.file_group.id), 'request_1',
+                                     'sample_2')
+            self.assertEqual(len(FileRepository.filter_cached(metadata={'requestId': 'request_1'}, file_type='bam')),
+                             2)
+            self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'entries': 1})
+        self.assertIsNone(FileQueryCache.current())
+
+    def test_filter_cached_invalidated_when_file_moves_request(self):
+        _file = self._create_single_file('/path/to/first_file.bam', 'bam', str(self.file_group.id), 'request_1',
+                                         'sample_1')
+        with FileQueryCache():
+            self.assertEqual(len(FileRepository.filter_cached(metadata={'requestId': 'request_1'})), 1)
+            FileMetadata(file=_file, metadata={'requestId': 'request_2'}, user=self.user).save()
+            self.assertEqual(len(FileRepository.filter_cached(metadata={'requestId': 'request_1'})), 0)
+
     def test_metadata_clean_function(self):
         test1 = "abc\tdef2"
         test2 = """
@@ -438,6 +554,19 @@ class FileTest(APITestCase):
         self.assertEqual(MetadataValidator.clean_value(test1), "abc def2")
         self.assertEqual(MetadataValidator.clean_value(test2), "abc def")
 
+    def test_metadata_validator_cached(self):
+        self.assertIs(MetadataValidator().validator, MetadataValidator().validator)
+
+    def test_metadata_validate_many(self):
+        validator = MetadataValidator()
+        errors = validator.validate_many([
+            {"requestId": "request_id", "igoSampleId": "sample_id"},
+            {"requestId": 1, "libraries": [{"libraryVolume": "10"}]}
+        ])
+        self.assertEqual(errors[0], [])
+        self.assertEqual(sorted(errors[1]), ["libraries.0.libraryVolume: '10' is not of type 'null', 'integer'",
+                                             "requestId: 1 is not of type 'string'"])
+
     def test_query_files(self):
         self._create_single_file('/path/to/file1.fastq', 'fastq', str(self.file_group.id), '1', '3')
         self._create_single_file('/path/to/file2.fastq', 'fastq', str(self.file_group.id), '1', '2')
@@ -1,7 +1,7 @@
 import uuid
 from distutils.util import strtobool
-from django.db.models import Prefetch, Count
-from django.db import transaction, IntegrityError
+from django.db.models import Prefetch
+from django.db import IntegrityError
 from rest_framework import mixins
 from rest_framework import status
 from rest_framework.response import Response
@@ -11,11 +11,13 @@ from rest_framework.permissions import IsAuthenticated
 from file_system.repository import FileRepository
 from file_system.models import File, FileMetadata
 from file_system.exceptions import FileNotFoundException
+from file_system.helper.batch_patch import BatchFilePatch
 from file_system.serializers import CreateFileSerializer, UpdateFileSerializer, FileSerializer, FileQuerySerializer, \
     BatchPatchFileSerializer
 from drf_yasg.utils import swagger_auto_schema
 from beagle.pagination import time_filter
 from beagle.common import fix_query_list
+from beagle.facets import get_facets
 from rest_framework.generics import GenericAPIView
 
 
@@ -51,7 +53,7 @@ class FileView(mixins.CreateModelMixin,
     @swagger_auto_schema(query_serializer=FileQuerySerializer)
     def list(self, request, *args, **kwargs):
         query_list_types = ['file_group', 'path', 'metadata', 'metadata_regex', 'filename', 'file_type',
-                            'values_metadata']
+                            'values_metadata', 'metadata_facets']
         fixed_query_params = fix_query_list(request.query_params, query_list_types)
         serializer = FileQuerySerializer(data=fixed_query_params)
         if serializer.is_valid():
@@ -70,6 +72,7 @@ class FileView(mixins.CreateModelMixin,
             values_metadata = fixed_query_params.get('values_metadata')
             count = fixed_query_params.get('count')
             metadata_distribution = fixed_query_params.get('metadata_distribution')
+            metadata_facets = fixed_query_params.get('metadata_facets')
             kwargs = {'queryset':queryset}
             if file_group:
                 if len(file_group) == 1:
@@ -111,32 +114,24 @@ class FileView(mixins.CreateModelMixin,
                     kwargs['file_type_in'] = file_type
                 ## TODO: Check this!
                 queryset = FileRepository.filter(queryset=queryset, file_type_in=file_type)
-            if values_metadata:
-                if len(values_metadata) == 1:
-                    kwargs['values_metadata'] = values_metadata[0]
-                else:
-                    kwargs['values_metadata_list'] = values_metadata
             try:
                 queryset = FileRepository.filter(**kwargs)
             except Exception as e:
                 return Response({'details': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            # facets count files, so they're taken before values_metadata projects the queryset
+            if metadata_facets:
+                facets = get_facets(queryset, ['metadata__%s' % key for key in metadata_facets])
+                facets_dict = {key: facets['metadata__%s' % key] for key in metadata_facets}
+                return Response(facets_dict, status=status.HTTP_200_OK)
             if metadata_distribution:
-                distribution_dict = {}
                 metadata_query = 'metadata__%s' % metadata_distribution
-                metadata_ids = queryset.values_list('id',flat=True)
-                queryset = FileRepository.all()
-                queryset = queryset.filter(id__in=metadata_ids).values(metadata_query).order_by().annotate(Count(metadata_query))
-                for single_metadata in queryset:
-                    single_metadata_name = None
-                    single_metadata_count = 0
-                    for single_key, single_value in single_metadata.items():
-                        if 'count' in single_key:
-                            single_metadata_count = single_value
-                        else:
-                            single_metadata_name = single_value
-                    if single_metadata_name is not None:
-                        distribution_dict[single_metadata_name] = single_metadata_count
+                distribution_dict = get_facets(queryset, [metadata_query])[metadata_query]
                 return Response(distribution_dict, status=status.HTTP_200_OK)
+            if values_metadata:
+                if len(values_metadata) == 1:
+                    queryset = FileRepository.filter(queryset=queryset, values_metadata=values_metadata[0])
+                else:
+                    queryset = FileRepository.filter(queryset=queryset, values_metadata_list=values_metadata)
             if count:
                 count = bool(strtobool(count))
                 if count:
@@ -207,35 +202,21 @@ class BatchPatchFiles(GenericAPIView):
     serializer_class = BatchPatchFileSerializer
 
     def post(self, request):
-        patch_files = request.data.get('patch_files', [])
-        sid = transaction.savepoint()
-        current_file_id = None
-        current_file_data = None
-        file_count = len(patch_files)
+        patch = BatchFilePatch(request.data.get('patch_files', []))
         try:
-            for single_file_patch in patch_files:
-                current_file_id = single_file_patch['id']
-                current_file_data = single_file_patch['patch']
-                f = FileRepository.get(id=current_file_id)
-                serializer = UpdateFileSerializer(f.file, data=current_file_data, partial=True)
-                if serializer.is_valid():
-                    serializer.save()
-                else:
-                    transaction.savepoint_rollback(sid)
-                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            transaction.savepoint_commit(sid)
-        except FileNotFoundException:
-            transaction.savepoint_rollback(sid)
-            error_message = 'File {} not found'.format(current_file_id)
-            return Response({'details': error_message}, status=status.HTTP_404_NOT_FOUND)
+            patch.load()
+            if not patch.is_valid():
+                return Response({'details': 'Invalid patch', 'results': patch.results},
+                                status=status.HTTP_400_BAD_REQUEST)
+            patch.save()
+        except FileNotFoundException as e:
+            return Response({'details': str(e), 'results': patch.results}, status=status.HTTP_404_NOT_FOUND)
         except IntegrityError:
-            transaction.savepoint_rollback(sid)
             error_message = 'Integrity error'
             return Response({'details':error_message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
-            transaction.savepoint_rollback(sid)
             error_message = 'An unexpected error occured: '+repr(e)
             return Response({'details':error_message}, status=status.HTTP_400_BAD_REQUEST)
 
-        success_message = 'Successfully updated {} files'.format(file_count)
-        return Response(success_message, status=status.HTTP_200_OK)
+        success_message = 'Successfully updated {} files'.format(len(patch.results))
+        return Response({'details': success_message, 'results': patch.results}, status=status.HTTP_200_OK)
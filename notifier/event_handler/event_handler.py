@@ -15,9 +15,20 @@ class EventHandler(object):
     def process(self, event):
         self.logger.debug("Event received")
         e = Event.from_dict(event)
+        self._process_event(e)
+        self.logger.debug("Event processed")
+
+    def process_batch(self, events):
+        """
+        Process list of events sent for the same job_notifier. Handlers which can merge
+        events into fewer notifier calls should override this.
+        """
+        for event in events:
+            self.process(event)
+
+    def _process_event(self, e):
         try:
             self.logger.info("[%s]: %s", e.get_type(), str(e))
             return getattr(self, self.events[e.get_type()])(e)
         except Exception as ex:
             self.logger.info("Failed to process event: %s with error %s", str(e), str(ex))
-        self.logger.debug("Event processed")
@@ -1,5 +1,8 @@
 import os
+import hashlib
+from collections import OrderedDict
 from django.conf import settings
+from ..event import Event
 from ..event_handler import EventHandler
 from file_system.models import FileGroup, File, FileMetadata, FileType
 from notifier.models import JobGroup, JobGroupNotifier
@@ -7,6 +10,14 @@ from notifier.jira.jira_client import JiraClient
 
 
 class JiraEventHandler(EventHandler):
+    COMMENT_SEPARATOR = "\n----\n"
+    COMMENT_METHODS = ('process_etl_jobs_links_event', 'process_operator_run_event', 'process_run_completed',
+                       'process_run_started_event', 'process_operator_request_event', 'process_etl_job_failed_event',
+                       'process_operator_error_event', 'process_assay_event', 'process_external_email_event',
+                       'process_only_normal_samples_event', 'process_custom_capture_cc_event',
+                       'process_redelivery_update_event', 'process_set_run_ticket_in_import_event')
+    LABEL_METHODS = ('process_etl_set_recipe_event', 'process_redelivery_event', 'process_set_label_event')
+    DESCRIPTION_METHODS = ('process_import_event', 'process_operator_start_event')
 
     def __init__(self, project):
         super().__init__()
@@ -22,13 +33,81 @@ class JiraEventHandler(EventHandler):
         self.logger.debug("Starting JIRA Ticket with ID %s" % jira_id)
         return jira_id
 
+    def process_batch(self, events):
+        """
+        Coalesce events for a single ticket. Consecutive comments are posted as one comment,
+        labels are merged into one update, and description changes are written once.
+        Other events are processed in order; pending comments, labels and description are
+        written before them. A failed update is logged and skipped, like a failed event
+        """
+        if not events:
+            return
+        try:
+            job_notifier = JobGroupNotifier.objects.get(id=events[0]['job_notifier'])
+        except JobGroupNotifier.DoesNotExist:
+            return super().process_batch(events)
+        jira_id = job_notifier.jira_id
+        comments = []
+        labels = []
+        description = None
+        description_changed = False
+        for event in events:
+            e = Event.from_dict(dict(event))
+            method = self.events.get(e.get_type())
+            if method in self.COMMENT_METHODS:
+                comments.append(str(e))
+            elif method in self.LABEL_METHODS:
+                labels.append(str(e))
+            elif method in self.DESCRIPTION_METHODS:
+                description = str(e)
+                description_changed = True
+            elif method == 'process_add_pipeline_to_description_event':
+                if description is None:
+                    description = self._guard(jira_id, self._get_description, jira_id)
+                    if description is None:
+                        continue
+                if not str(e) in description:
+                    description += str(e)
+                    description_changed = True
+            else:
+                self._flush(job_notifier, comments, labels, description if description_changed else None)
+                comments, labels, description, description_changed = [], [], None, False
+                self._process_event(e)
+                job_notifier.refresh_from_db()
+        self._flush(job_notifier, comments, labels, description if description_changed else None)
+
+    def _flush(self, job_notifier, comments, labels, description):
+        jira_id = job_notifier.jira_id
+        if comments:
+            self._guard(jira_id, self.client.comment, jira_id, self.COMMENT_SEPARATOR.join(comments))
+        if labels:
+            self._guard(jira_id, self._add_labels, job_notifier, labels)
+        if description is not None:
+            self._guard(jira_id, self._update_description, job_notifier, description)
+
+    def _guard(self, jira_id, method, *args):
+        try:
+            return method(*args)
+        except Exception as ex:
+            self.logger.info("Failed to update ticket %s with error %s", jira_id, str(ex))
+
+    def _get_description(self, jira_id):
+        """
+        Current description of the ticket, read before appending to it so changes made
+        by other workers or in Jira aren't overwritten; None if the ticket can't be read
+        """
+        ticket = self.client.get_ticket(jira_id)
+        if ticket.status_code != 200:
+            return None
+        return ticket.json().get('fields', {}).get('description') or ""
+
     def process_import_event(self, event):
-        job_group = JobGroupNotifier.objects.get(id=event.job_notifier)
-        self.client.update_ticket_description(job_group.jira_id, str(event))
+        job_notifier = JobGroupNotifier.objects.get(id=event.job_notifier)
+        self._update_description(job_notifier, str(event))
 
     def process_operator_start_event(self, event):
-        job_group = JobGroupNotifier.objects.get(id=event.job_notifier)
-        self.client.update_ticket_description(job_group.jira_id, str(event))
+        job_notifier = JobGroupNotifier.objects.get(id=event.job_notifier)
+        self._update_description(job_notifier, str(event))
 
     def process_etl_jobs_links_event(self, event):
         self._add_comment_event(event)
@@ -80,37 +159,79 @@ class JiraEventHandler(EventHandler):
 
     def process_add_pipeline_to_description_event(self, event):
         job_notifier = JobGroupNotifier.objects.get(id=event.job_notifier)
-        description = self.client.get_ticket_description(job_notifier.jira_id)
-        if not str(event) in description:
+        description = self._get_description(job_notifier.jira_id)
+        if description is not None and not str(event) in description:
             description += str(event)
-            self.client.update_ticket_description(job_notifier.jira_id, description)
+            self._update_description(job_notifier, description)
 
     def process_set_pipeline_field_event(self, event):
+        """
+        Sets the pipeline field if it's empty; once it's known to be set, the ticket
+        isn't read again
+        """
         job_notifier = JobGroupNotifier.objects.get(id=event.job_notifier)
-        pipeline = self.client.get_ticket(job_notifier.jira_id).json().get('fields', {}).get(settings.JIRA_PIPELINE_FIELD_ID)
+        if job_notifier.jira_pipeline:
+            return
+        ticket = self.client.get_ticket(job_notifier.jira_id)
+        if ticket.status_code != 200:
+            self.logger.info("Failed to read ticket %s with status %s", job_notifier.jira_id, ticket.status_code)
+            return
+        pipeline = ticket.json().get('fields', {}).get(settings.JIRA_PIPELINE_FIELD_ID)
         if not pipeline:
-            self.client.update_pipeline(job_notifier.jira_id, str(event))
+            pipeline = str(event)
+            if not self._is_success(self.client.update_pipeline(job_notifier.jira_id, pipeline)):
+                return
+        self._remember(job_notifier, jira_pipeline=str(pipeline))
 
-    def process_transition_event(self, event):
+    def process_transition_event(self, event, attempt=0):
         job_notifier = JobGroupNotifier.objects.get(id=event.job_notifier)
+        if attempt == 0 and job_notifier.jira_status == str(event):
+            return
         response = self.client.get_status_transitions(job_notifier.jira_id)
         for transition in response.json().get('transitions', []):
             if transition.get('name') == str(event):
                 self.client.update_status(job_notifier.jira_id, transition['id'])
-                self._check_transition(job_notifier.jira_id, str(event), event)
+                self._check_transition(job_notifier, str(event), event, attempt)
                 self.logger.debug("Transition to state %s", transition.get('name'))
                 break
 
-    def _check_transition(self, jira_id, expected_status, event):
+    def _check_transition(self, job_notifier, expected_status, event, attempt=0):
+        jira_id = job_notifier.jira_id
         response = self.client.get_ticket(jira_id)
-        status = response.json()['fields']['status']['name']
+        status = ((response.json().get('fields') or {}).get('status') or {}).get('name')
+        if status:
+            self._remember(job_notifier, jira_status=status)
         if status == expected_status:
             return
-        self.process_transition_event(event)
+        if attempt + 1 >= settings.JIRA_MAX_TRANSITION_ATTEMPTS:
+            self.logger.error("Ticket %s not transitioned to %s after %s attempts", jira_id, expected_status,
+                              attempt + 1)
+            return
+        self.process_transition_event(event, attempt + 1)
 
     def process_upload_attachment_event(self, event):
         job_notifier = JobGroupNotifier.objects.get(id=event.job_notifier)
-        self.client.add_attachment(job_notifier.jira_id, event.file_name, event.get_content(), download=event.download)
+        path = event.get_path()
+        if not path:
+            self.client.add_attachment(job_notifier.jira_id, event.file_name, event.get_content(),
+                                       download=event.download)
+            return
+        size = os.path.getsize(path)
+        if size > settings.NOTIFIER_ATTACHMENT_MAX_SIZE:
+            self._link_file(job_notifier.jira_id, event.file_name, path, size)
+        else:
+            self.client.add_attachment_from_path(job_notifier.jira_id, event.file_name, path, download=event.download)
+
+    def _link_file(self, jira_id, file_name, path, size):
+        f = File.objects.filter(path=path).first()
+        if not f:
+            f = self._register_as_file(path, {"jiraId": jira_id}, file_type=None)
+        comment = "File {file_name} ({size} bytes) is too large to attach.\nPath: {path}\n".format(file_name=file_name,
+                                                                                                 size=size,
+                                                                                                 path=path)
+        if f:
+            comment += "Link: %s%s%s/\n" % (settings.BEAGLE_URL, '/v0/fs/files/', str(f.id))
+        self.client.comment(jira_id, comment)
 
     def process_local_store_file_event(self, event):
         print("Started processing")
@@ -126,13 +247,13 @@ class JiraEventHandler(EventHandler):
             f.write(event.get_content())
         self._register_as_file(file_path, metadata)
 
-    def _register_as_file(self, path, metadata):
+    def _register_as_file(self, path, metadata, file_type='json'):
         print("Registering file")
         try:
             file_group = FileGroup.objects.get(id=settings.NOTIFIER_FILE_GROUP)
         except FileGroup.DoesNotExist:
             return
-        file_type_obj = FileType.objects.filter(name='json').first()
+        file_type_obj = FileType.objects.filter(name=file_type).first() if file_type else None
         try:
             f = File.objects.create(file_name=os.path.basename(path),
                                     path=path,
@@ -141,6 +262,7 @@ class JiraEventHandler(EventHandler):
             f.save()
             fm = FileMetadata(file=f, metadata=metadata)
             fm.save()
+            return f
         except Exception as e:
             self.logger.error("Failed to create file %s. Error %s" % (path, str(e)))
 
@@ -150,9 +272,38 @@ class JiraEventHandler(EventHandler):
 
     def _set_label(self, event):
         job_notifier = JobGroupNotifier.objects.get(id=event.job_notifier)
-        ticket = self.client.get_ticket(job_notifier.jira_id)
-        if ticket.status_code != 200:
+        self._add_labels(job_notifier, [str(event)])
+
+    def _add_labels(self, job_notifier, labels):
+        """
+        Adds the labels not added before with Jira's "add" operation, which keeps the
+        labels already on the ticket without reading them first
+        """
+        labels = [label for label in OrderedDict.fromkeys(labels) if label not in job_notifier.jira_labels]
+        if not labels:
+            return
+        if self._is_success(self.client.add_labels(job_notifier.jira_id, labels)):
+            self._remember(job_notifier, jira_labels=job_notifier.jira_labels + labels)
+
+    def _update_description(self, job_notifier, description):
+        """
+        Writes the description, unless it's the one last written to the ticket
+        """
+        description_hash = hashlib.sha1(description.encode('utf-8')).hexdigest()
+        if description_hash == job_notifier.jira_description_hash:
             return
-        labels = ticket.json()['fields'].get('labels', [])
-        labels.append(str(event))
-        self.client.update_labels(job_notifier.jira_id, labels)
+        if self._is_success(self.client.update_ticket_description(job_notifier.jira_id, description)):
+            self._remember(job_notifier, jira_description_hash=description_hash)
+
+    @staticmethod
+    def _is_success(response):
+        return 200 <= response.status_code < 300
+
+    @staticmethod
+    def _remember(job_notifier, **state):
+        """
+        Stores ticket state on the JobGroupNotifier, shared by all workers
+        """
+        JobGroupNotifier.objects.filter(id=job_notifier.id).update(**state)
+        for field, value in state.items():
+            setattr(job_notifier, field, value)
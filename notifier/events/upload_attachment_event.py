@@ -18,6 +18,11 @@ class UploadAttachmentEvent(Event):
     def get_method(cls):
         return "process_upload_attachment_event"
 
+    def get_path(self):
+        if os.path.isfile(self.content):
+            return self.content
+        return None
+
     def get_content(self):
         if os.path.exists(self.content):
             f = open(self.content, 'rb')
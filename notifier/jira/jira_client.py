@@ -1,12 +1,37 @@
 import json
 import enum
+import time
+import logging
+import threading
 import requests
 from urllib.parse import urljoin
 from django.conf import settings
 from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from notifier.jira.rate_limiter import TokenBucket
+from notifier.jira.multipart_stream import MultipartFileStream
 
 
 class JiraClient(object):
+    logger = logging.getLogger(__name__)
+
+    RETRY_STATUS_CODES = (429, 502, 503, 504)
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+    _sessions = dict()
+    _rate_limiter = None
+    _lock = threading.Lock()
+    metrics = {
+        "calls": 0,
+        "failed": 0,
+        "retries": 0,
+        "throttled": 0,
+        "throttle_wait": 0.0,
+        "latency_total": 0.0,
+        "latency_max": 0.0,
+    }
+
     class JiraEndpoints(enum.Enum):
         SEARCH = "/rest/api/2/search"
         CREATE = "/rest/api/2/issue"
@@ -21,6 +46,49 @@ class JiraClient(object):
         self.password = password
         self.url = url
         self.project = project
+        self.session = self._get_session(url, username, password)
+        self.rate_limiter = self._get_rate_limiter()
+
+    @classmethod
+    def _get_session(cls, url, username, password):
+        """
+        Keep-alive session shared by all clients for the same Jira instance and user
+        """
+        key = (url, username)
+        with cls._lock:
+            session = cls._sessions.get(key)
+            if not session:
+                session = requests.Session()
+                session.auth = HTTPBasicAuth(username, password)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.JIRA_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                cls._sessions[key] = session
+            return session
+
+    @classmethod
+    def _get_rate_limiter(cls):
+        with cls._lock:
+            if not cls._rate_limiter:
+                cls._rate_limiter = TokenBucket(settings.JIRA_RATE_LIMIT, settings.JIRA_RATE_BURST)
+            return cls._rate_limiter
+
+    @classmethod
+    def get_metrics(cls):
+        with cls._lock:
+            metrics = dict(cls.metrics)
+        metrics['latency_avg'] = metrics['latency_total'] / metrics['calls'] if metrics['calls'] else 0.0
+        return metrics
+
+    @classmethod
+    def _record(cls, **kwargs):
+        with cls._lock:
+            for k, v in kwargs.items():
+                if k == 'latency':
+                    cls.metrics['latency_total'] += v
+                    cls.metrics['latency_max'] = max(cls.metrics['latency_max'], v)
+                else:
+                    cls.metrics[k] += v
 
     def search_tickets(self, project_id):
         """
@@ -81,6 +149,11 @@ class JiraClient(object):
         body = {"fields": {"labels": labels}}
         return self._put(update_url, body)
 
+    def add_labels(self, ticket_id, labels):
+        update_url = self.JiraEndpoints.UPDATE.value % ticket_id
+        body = {"update": {"labels": [{"add": label} for label in labels]}}
+        return self._put(update_url, body)
+
     def update_status(self, ticket_id, status_id):
         update_status_url = self.JiraEndpoints.TRANSITION.value % ticket_id
         body = {"transition": {"id": status_id}}
@@ -124,43 +197,115 @@ class JiraClient(object):
         response = self._post(attachment_url, {}, files=files, headers=headers)
         return response
 
+    def add_attachment_from_path(self, ticket_id, file_name, path, download=False):
+        """
+        Upload file from disk as streamed multipart body, without loading it into memory
+        """
+        attachment_url = self.JiraEndpoints.ATTACHMENT.value % ticket_id
+        content_type = 'application/octet-stream' if download else 'text/plain'
+        stream = MultipartFileStream(path, file_name, content_type=content_type)
+        headers = {
+            "X-Atlassian-Token": "nocheck",
+            "content-type": stream.content_type
+        }
+        return self._request('POST', attachment_url, data=stream, headers=headers)
+
     @staticmethod
     def parse_ticket_id(ticket_body):
         return ticket_body['key']
 
     def _get(self, url, params={}, headers={}):
-        default_headers = {'content-type': 'application/json'}
-        headers.update(default_headers)
-        response = requests.get(urljoin(self.url, url),
-                                auth=HTTPBasicAuth(self.username, self.password),
-                                params=params,
-                                headers=headers)
-        return response
+        headers = dict(headers)
+        headers.update({'content-type': 'application/json'})
+        return self._request('GET', url, params=params, headers=headers)
 
     def _post(self, url, body, params={}, headers={}, files={}):
+        headers = dict(headers)
         if files:
-            response = requests.post(urljoin(self.url, url),
-                                     auth=HTTPBasicAuth(self.username, self.password),
-                                     params=params,
-                                     headers=headers,
-                                     files=files)
-            return response
-        else:
-            default_headers = {'content-type': 'application/json'}
-            headers.update(default_headers)
-            response = requests.post(urljoin(self.url, url),
-                                     auth=HTTPBasicAuth(self.username, self.password),
-                                     data=json.dumps(body),
-                                     params=params,
-                                     headers=headers)
-            return response
+            return self._request('POST', url, params=params, headers=headers, files=files)
+        headers.update({'content-type': 'application/json'})
+        return self._request('POST', url, data=json.dumps(body), params=params, headers=headers)
 
     def _put(self, url, body, params={}, headers={}):
-        default_headers = {'content-type': 'application/json'}
-        headers.update(default_headers)
-        response = requests.put(urljoin(self.url, url),
-                                auth=HTTPBasicAuth(self.username, self.password),
-                                data=json.dumps(body),
-                                params=params,
-                                headers=headers)
+        headers = dict(headers)
+        headers.update({'content-type': 'application/json'})
+        return self._request('PUT', url, data=json.dumps(body), params=params, headers=headers)
+
+    def _request(self, method, url, **kwargs):
+        """
+        Send request through the shared session. Calls are rate limited, and retried with
+        exponential backoff on connection errors and on throttling or unavailable responses.
+        Retry-After header is honoured when Jira sends it.
+
+        A POST (new ticket, comment, transition, attachment) which may have reached Jira is
+        not sent again, so it is only retried when throttled, or when the connection failed
+        before the request was sent
+        """
+        idempotent = method in self.IDEMPOTENT_METHODS
+        full_url = urljoin(self.url, url)
+        response = None
+        for attempt in range(settings.JIRA_MAX_RETRIES + 1):
+            self._record(throttle_wait=self.rate_limiter.acquire())
+            self._rewind_files(kwargs.get('files'))
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, full_url, timeout=settings.JIRA_TIMEOUT, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(calls=1, latency=time.monotonic() - start)
+                if attempt == settings.JIRA_MAX_RETRIES or not (idempotent or self._not_sent(e)):
+                    self._record(failed=1)
+                    self.logger.error("Jira %s %s failed after %s attempts: %s", method, full_url, attempt + 1, str(e))
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self._record(calls=1, latency=time.monotonic() - start)
+                if response.status_code not in self.RETRY_STATUS_CODES or \
+                        not (idempotent or response.status_code == 429):
+                    if response.status_code >= 400:
+                        self._record(failed=1)
+                        self.logger.error("Jira %s %s returned %s: %s", method, full_url, response.status_code,
+                                          response.text)
+                    return response
+                if response.status_code == 429:
+                    self._record(throttled=1)
+                if attempt == settings.JIRA_MAX_RETRIES:
+                    break
+                delay = self._retry_after(response, attempt)
+            self._record(retries=1)
+            self.logger.info("Retrying Jira %s %s in %.1fs", method, full_url, delay)
+            time.sleep(delay)
+        self._record(failed=1)
+        self.logger.error("Jira %s %s failed after %s attempts with status %s", method, full_url,
+                          settings.JIRA_MAX_RETRIES + 1, response.status_code)
         return response
+
+    @staticmethod
+    def _not_sent(error):
+        """
+        True if the request failed while connecting, before anything was sent to Jira
+        """
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.Timeout):
+            return False
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    @staticmethod
+    def _backoff(attempt):
+        return min(settings.JIRA_BACKOFF_MAX, settings.JIRA_BACKOFF_FACTOR * (2 ** attempt))
+
+    @staticmethod
+    def _retry_after(response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        try:
+            return min(settings.JIRA_BACKOFF_MAX, float(retry_after))
+        except (TypeError, ValueError):
+            return JiraClient._backoff(attempt)
+
+    @staticmethod
+    def _rewind_files(files):
+        for value in (files or {}).values():
+            content = value[1] if isinstance(value, tuple) else value
+            if hasattr(content, 'seek'):
+                content.seek(0)
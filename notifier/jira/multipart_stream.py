@@ -0,0 +1,41 @@
+import os
+import uuid
+
+
+class MultipartFileStream(object):
+    """
+    multipart/form-data body for a single file, read from disk in chunks while it is sent.
+    Length is known upfront, so requests sends it with Content-Length instead of chunked
+    encoding. The stream can be iterated again, which allows retries.
+    """
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path, file_name, content_type='application/octet-stream', field_name='file',
+                 chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        self.head = ('--{boundary}\r\n'
+                     'Content-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'
+                     'Content-Type: {content_type}\r\n\r\n').format(boundary=self.boundary,
+                                                                    field_name=field_name,
+                                                                    file_name=file_name.replace('"', '%22'),
+                                                                    content_type=content_type).encode('utf-8')
+        self.tail = ('\r\n--%s--\r\n' % self.boundary).encode('utf-8')
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    def __len__(self):
+        return len(self.head) + os.path.getsize(self.path) + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.tail
@@ -0,0 +1,36 @@
+import time
+import threading
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket. Tokens are refilled continuously at `rate` per second,
+    up to `capacity`. `acquire` blocks until a token is available and returns the
+    time spent waiting.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def acquire(self):
+        waited = 0.0
+        if self.rate <= 0:
+            return waited
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
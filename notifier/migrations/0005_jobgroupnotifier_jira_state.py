@@ -0,0 +1,34 @@
+# Generated by Django 2.2.11 on 2026-10-19 21:40
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifier', '0004_remove_notifier_operator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobgroupnotifier',
+            name='jira_description_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobgroupnotifier',
+            name='jira_labels',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=255), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='jobgroupnotifier',
+            name='jira_pipeline',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobgroupnotifier',
+            name='jira_status',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.contrib.postgres.fields import ArrayField
 
 
 class BaseModel(models.Model):
@@ -26,5 +27,10 @@ class JobGroupNotifier(BaseModel):
     jira_id = models.CharField(max_length=20, blank=True, null=True)
     job_group = models.ForeignKey(JobGroup, null=False, blank=False, on_delete=models.CASCADE)
     notifier_type = models.ForeignKey(Notifier, null=False, blank=False, on_delete=models.CASCADE)
+    # ticket state as last written or read by the notifier, used to skip redundant Jira calls
+    jira_labels = ArrayField(models.CharField(max_length=255), default=list, blank=True)
+    jira_description_hash = models.CharField(max_length=40, blank=True, null=True)
+    jira_pipeline = models.TextField(blank=True, null=True)
+    jira_status = models.CharField(max_length=100, blank=True, null=True)
 
 
@@ -0,0 +1,62 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+
+class NotificationBuffer(object):
+    """
+    Collects notification events per job_notifier and sends each group as a single
+    send_notifications task, so the event handler can coalesce them.
+
+    Usage:
+        with NotificationBuffer():
+            notify(SetLabelEvent(job_notifier, 'label').to_dict())
+            notify(OperatorRequestEvent(job_notifier, 'message').to_dict())
+
+    Buffers are re-entrant, a nested buffer joins the outer one. Events are flushed
+    when the outermost buffer exits, or as soon as the oldest buffered event is older
+    than the window.
+    """
+    logger = logging.getLogger(__name__)
+
+    _local = threading.local()
+
+    def __init__(self, window=None):
+        self.window = window if window is not None else settings.NOTIFIER_BUFFER_WINDOW
+        self.events = OrderedDict()
+        self.started = None
+        self._outer = None
+
+    @classmethod
+    def current(cls):
+        return getattr(cls._local, 'buffer', None)
+
+    def __enter__(self):
+        self._outer = NotificationBuffer.current()
+        if not self._outer:
+            NotificationBuffer._local.buffer = self
+        return NotificationBuffer.current()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self._outer:
+            try:
+                self.flush()
+            finally:
+                NotificationBuffer._local.buffer = None
+        return False
+
+    def add(self, event):
+        if self.started is None:
+            self.started = time.monotonic()
+        self.events.setdefault(event.get('job_notifier'), []).append(event)
+        if time.monotonic() - self.started >= self.window:
+            self.flush()
+
+    def flush(self):
+        from notifier.tasks import send_notifications
+        events, self.events, self.started = self.events, OrderedDict(), None
+        for job_notifier, batch in events.items():
+            self.logger.debug("Sending %s buffered events for %s", len(batch), job_notifier)
+            send_notifications.delay(job_notifier, batch)
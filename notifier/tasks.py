@@ -1,7 +1,12 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from celery import shared_task
 from django.conf import settings
+from django.db import connection
+from beagle_etl.models import Job
 from notifier.models import JobGroupNotifier, Notifier
+from notifier.events import RedeliveryEvent
+from notifier.notification_buffer import NotificationBuffer
 from notifier.event_handler.jira_event_handler.jira_event_handler import JiraEventHandler
 from notifier.event_handler.noop_event_handler.noop_event_handler import NoOpEventHandler
 
@@ -21,25 +26,68 @@ def event_handler(job_group_notifier):
         raise Exception("This shouldn't happen")
 
 
+def get_notifier(operator=None):
+    notifier = Notifier.objects.get(default=True)
+    try:
+        if operator:
+            notifier = Notifier.objects.filter(operator__id=operator.id).first()
+    except Notifier.DoesNotExist:
+        pass
+    return notifier
+
+
+def start_ticket(job_group_notifier, request_id):
+    eh = event_handler(job_group_notifier.id)
+    job_group_notifier.jira_id = eh.start(request_id)
+    job_group_notifier.save(update_fields=['jira_id'])
+
+
 def notifier_start(job_group, request_id, operator=None):
     if settings.NOTIFIER_ACTIVE:
-        notifier = Notifier.objects.get(default=True)
-        try:
-            if operator:
-                notifier = Notifier.objects.filter(operator__id=operator.id).first()
-        except Notifier.DoesNotExist:
-            pass
         job_group_notifier = JobGroupNotifier.objects.create(job_group=job_group,
-                                                             notifier_type=notifier)
-        eh = event_handler(job_group_notifier.id)
-        notifier_id = eh.start(request_id)
-        job_group_notifier.jira_id = notifier_id
-        job_group_notifier.save()
+                                                             notifier_type=get_notifier(operator))
+        start_ticket(job_group_notifier, request_id)
         return str(job_group_notifier.id)
     logger.info("Notifier Inactive")
     return None
 
 
+@shared_task
+def start_request_tickets(tickets):
+    """
+    Creates the tickets of request jobs created in bulk, NOTIFIER_TICKET_CONCURRENCY at
+    a time. tickets is a list of (job_group_notifier_id, request_id, redelivered); the
+    request jobs of a group are created locked, and are unlocked once its ticket exists
+    """
+    workers = min(settings.NOTIFIER_TICKET_CONCURRENCY, len(tickets))
+    if workers <= 1:
+        for ticket in tickets:
+            _start_request_ticket(*ticket)
+        return
+
+    def start(ticket):
+        try:
+            _start_request_ticket(*ticket)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(start, tickets))
+
+
+def _start_request_ticket(job_group_notifier_id, request_id, redelivered):
+    try:
+        job_group_notifier = JobGroupNotifier.objects.get(id=job_group_notifier_id)
+        if not job_group_notifier.jira_id:
+            start_ticket(job_group_notifier, request_id)
+        if redelivered:
+            send_notification.delay(RedeliveryEvent(job_group_notifier_id).to_dict())
+    except Exception as e:
+        logger.error("Failed to create ticket for request %s: %s", request_id, str(e))
+    finally:
+        Job.objects.filter(job_group_notifier_id=job_group_notifier_id, lock=True).update(lock=False)
+
+
 @shared_task
 def send_notification(event):
     if settings.NOTIFIER_ACTIVE:
@@ -49,3 +97,21 @@ def send_notification(event):
     else:
         logger.info("Notifier Inactive")
 
+
+
+@shared_task
+def send_notifications(job_notifier, events):
+    if settings.NOTIFIER_ACTIVE:
+        logger.info("Processing %s events for %s", len(events), job_notifier)
+        eh = event_handler(job_notifier)
+        eh.process_batch(events)
+    else:
+        logger.info("Notifier Inactive")
+
+
+def notify(event):
+    buffer = NotificationBuffer.current()
+    if buffer:
+        buffer.add(event)
+    else:
+        send_notification.delay(event)
@@ -1,8 +1,27 @@
 import uuid
+import tempfile
+import requests
+from mock import patch
 from rest_framework import status
 from rest_framework.test import APITestCase
+from django.test import override_settings
 from django.contrib.auth.models import User
-from notifier.models import JobGroup
+from notifier.models import JobGroup, JobGroupNotifier, Notifier
+from notifier.events import SetLabelEvent, OperatorRequestEvent, UploadAttachmentEvent, SetPipelineFieldEvent, \
+    AddPipelineToDescriptionEvent, ETLImportCompleteEvent
+from notifier.tasks import notify
+from notifier.notification_buffer import NotificationBuffer
+from notifier.jira.jira_client import JiraClient
+from notifier.event_handler.jira_event_handler.jira_event_handler import JiraEventHandler
+
+
+class MockResponse:
+    def __init__(self, json_data, status_code):
+        self.json_data = json_data
+        self.status_code = status_code
+
+    def json(self):
+        return self.json_data
 
 
 class JobGroupAPITest(APITestCase):
@@ -59,3 +78,178 @@ class JobGroupAPITest(APITestCase):
                                     },
                                     format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class JiraEventHandlerBatchTest(APITestCase):
+
+    def setUp(self):
+        self.job_group = JobGroup.objects.create()
+        self.notifier = Notifier.objects.create(default=True, notifier_type="JIRA", board="TEST")
+        self.job_group_notifier = JobGroupNotifier.objects.create(job_group=self.job_group,
+                                                                  notifier_type=self.notifier,
+                                                                  jira_id='TEST-1')
+        self.job_notifier_id = str(self.job_group_notifier.id)
+
+    @patch('notifier.jira.jira_client.JiraClient.add_labels')
+    @patch('notifier.jira.jira_client.JiraClient.get_ticket')
+    @patch('notifier.jira.jira_client.JiraClient.comment')
+    def test_process_batch_merges_comments_and_labels(self, mock_comment, mock_get_ticket, mock_add_labels):
+        mock_add_labels.return_value = MockResponse({}, 204)
+        events = [
+            SetLabelEvent(self.job_notifier_id, 'label1').to_dict(),
+            OperatorRequestEvent(self.job_notifier_id, 'message1').to_dict(),
+            OperatorRequestEvent(self.job_notifier_id, 'message2').to_dict(),
+            SetLabelEvent(self.job_notifier_id, 'label2').to_dict(),
+        ]
+        JiraEventHandler(self.notifier.board).process_batch(events)
+        mock_comment.assert_called_once_with('TEST-1', 'message1%smessage2' % JiraEventHandler.COMMENT_SEPARATOR)
+        mock_get_ticket.assert_not_called()
+        mock_add_labels.assert_called_once_with('TEST-1', ['label1', 'label2'])
+
+    @patch('notifier.jira.jira_client.JiraClient.update_pipeline')
+    @patch('notifier.jira.jira_client.JiraClient.add_labels')
+    @patch('notifier.jira.jira_client.JiraClient.get_ticket')
+    @patch('notifier.jira.jira_client.JiraClient.comment')
+    def test_process_batch_flushes_before_other_events(self, mock_comment, mock_get_ticket, mock_add_labels,
+                                                       mock_update_pipeline):
+        calls = []
+        mock_get_ticket.return_value = MockResponse({'fields': {'labels': []}}, 200)
+        mock_comment.side_effect = requests.ConnectionError("Jira unavailable")
+        mock_add_labels.side_effect = lambda jira_id, labels: calls.append(('labels', list(labels))) or \
+            MockResponse({}, 204)
+        mock_update_pipeline.side_effect = lambda jira_id, pipeline: calls.append(('pipeline', pipeline)) or \
+            MockResponse({}, 204)
+        events = [
+            SetLabelEvent(self.job_notifier_id, 'label1').to_dict(),
+            OperatorRequestEvent(self.job_notifier_id, 'message1').to_dict(),
+            SetPipelineFieldEvent(self.job_notifier_id, 'argos').to_dict(),
+            SetLabelEvent(self.job_notifier_id, 'label2').to_dict(),
+        ]
+        JiraEventHandler(self.notifier.board).process_batch(events)
+        mock_comment.assert_called_once_with('TEST-1', 'message1')
+        self.assertEqual([call[0] for call in calls], ['labels', 'pipeline', 'labels'])
+
+    @patch('notifier.jira.jira_client.JiraClient.update_ticket_description')
+    @patch('notifier.jira.jira_client.JiraClient.get_ticket')
+    def test_add_pipeline_to_description_reads_ticket(self, mock_get_ticket, mock_update_ticket_description):
+        mock_update_ticket_description.return_value = MockResponse({}, 204)
+        event_handler = JiraEventHandler(self.notifier.board)
+        mock_get_ticket.return_value = MockResponse({'fields': {'description': 'import\n'}}, 200)
+        event_handler.process(AddPipelineToDescriptionEvent(self.job_notifier_id, 'argos', '1.0.0', 'link').to_dict())
+        mock_get_ticket.return_value = MockResponse({'fields': {'description': 'import\nedited in Jira\n'}}, 200)
+        event_handler.process(AddPipelineToDescriptionEvent(self.job_notifier_id, 'helix', '1.0.0', 'link').to_dict())
+        self.assertEqual(mock_get_ticket.call_count, 2)
+        description = mock_update_ticket_description.call_args[0][1]
+        self.assertTrue(description.startswith('import\nedited in Jira\n'))
+        event_handler.process(AddPipelineToDescriptionEvent(self.job_notifier_id, 'helix', '1.0.0', 'link').to_dict())
+        self.assertEqual(mock_update_ticket_description.call_count, 2)
+
+    @patch('notifier.jira.jira_client.JiraClient.add_labels')
+    def test_labels_added_once(self, mock_add_labels):
+        mock_add_labels.return_value = MockResponse({}, 204)
+        event_handler = JiraEventHandler(self.notifier.board)
+        event_handler.process(SetLabelEvent(self.job_notifier_id, 'label1').to_dict())
+        event_handler.process_batch([SetLabelEvent(self.job_notifier_id, 'label1').to_dict(),
+                                     SetLabelEvent(self.job_notifier_id, 'label2').to_dict()])
+        self.assertEqual(mock_add_labels.call_args_list, [(('TEST-1', ['label1']),), (('TEST-1', ['label2']),)])
+        self.assertEqual(JobGroupNotifier.objects.get(id=self.job_notifier_id).jira_labels, ['label1', 'label2'])
+
+    @patch('notifier.jira.jira_client.JiraClient.update_pipeline')
+    @patch('notifier.jira.jira_client.JiraClient.get_ticket')
+    def test_pipeline_field_set_once(self, mock_get_ticket, mock_update_pipeline):
+        mock_update_pipeline.return_value = MockResponse({}, 204)
+        event_handler = JiraEventHandler(self.notifier.board)
+        mock_get_ticket.return_value = MockResponse({}, 404)
+        event_handler.process(SetPipelineFieldEvent(self.job_notifier_id, 'argos').to_dict())
+        mock_update_pipeline.assert_not_called()
+        mock_get_ticket.return_value = MockResponse({'fields': {}}, 200)
+        event_handler.process(SetPipelineFieldEvent(self.job_notifier_id, 'argos').to_dict())
+        event_handler.process(SetPipelineFieldEvent(self.job_notifier_id, 'helix').to_dict())
+        self.assertEqual(mock_get_ticket.call_count, 2)
+        mock_update_pipeline.assert_called_once_with('TEST-1', 'argos')
+
+    @override_settings(JIRA_MAX_TRANSITION_ATTEMPTS=3)
+    @patch('notifier.jira.jira_client.JiraClient.update_status')
+    @patch('notifier.jira.jira_client.JiraClient.get_ticket')
+    @patch('notifier.jira.jira_client.JiraClient.get_status_transitions')
+    def test_transition_attempts_limited(self, mock_get_status_transitions, mock_get_ticket, mock_update_status):
+        mock_get_status_transitions.return_value = MockResponse({'transitions': [{'id': '1', 'name': 'Import Complete'}]},
+                                                                200)
+        mock_get_ticket.return_value = MockResponse({'fields': {'status': {'name': 'Open'}}}, 200)
+        event_handler = JiraEventHandler(self.notifier.board)
+        event_handler.process(ETLImportCompleteEvent(self.job_notifier_id).to_dict())
+        self.assertEqual(mock_update_status.call_count, 3)
+        mock_get_ticket.return_value = MockResponse({'fields': {'status': {'name': 'Import Complete'}}}, 200)
+        event_handler.process(ETLImportCompleteEvent(self.job_notifier_id).to_dict())
+        self.assertEqual(mock_update_status.call_count, 4)
+        event_handler.process(ETLImportCompleteEvent(self.job_notifier_id).to_dict())
+        self.assertEqual(mock_update_status.call_count, 4)
+        self.assertEqual(mock_get_status_transitions.call_count, 4)
+
+    @patch('notifier.jira.jira_client.JiraClient.add_attachment_from_path')
+    @patch('notifier.jira.jira_client.JiraClient.comment')
+    def test_upload_attachment_over_size_limit(self, mock_comment, mock_add_attachment_from_path):
+        with tempfile.NamedTemporaryFile(suffix='.txt') as f:
+            f.write(b'x' * 100)
+            f.flush()
+            with override_settings(NOTIFIER_ATTACHMENT_MAX_SIZE=10):
+                JiraEventHandler(self.notifier.board).process(
+                    UploadAttachmentEvent(self.job_notifier_id, 'large.txt', f.name).to_dict())
+            mock_add_attachment_from_path.assert_not_called()
+            self.assertIn(f.name, mock_comment.call_args[0][1])
+            with override_settings(NOTIFIER_ATTACHMENT_MAX_SIZE=1000):
+                JiraEventHandler(self.notifier.board).process(
+                    UploadAttachmentEvent(self.job_notifier_id, 'small.txt', f.name).to_dict())
+            mock_add_attachment_from_path.assert_called_once_with('TEST-1', 'small.txt', f.name, download=False)
+
+    @patch('notifier.tasks.send_notifications.delay')
+    def test_notification_buffer_groups_by_job_notifier(self, mock_send_notifications):
+        events = [
+            SetLabelEvent(self.job_notifier_id, 'label1').to_dict(),
+            OperatorRequestEvent(self.job_notifier_id, 'message1').to_dict(),
+        ]
+        with NotificationBuffer():
+            for event in events:
+                notify(event)
+            mock_send_notifications.assert_not_called()
+        mock_send_notifications.assert_called_once_with(self.job_notifier_id, events)
+
+
+class JiraClientTest(APITestCase):
+
+    @patch('requests.Session.request')
+    def test_retry_after_throttling(self, mock_request):
+        throttled = MockResponse({}, 429)
+        throttled.headers = {'Retry-After': '0'}
+        created = MockResponse({'key': 'TEST-1'}, 201)
+        mock_request.side_effect = [throttled, created]
+        client = JiraClient('http://jira.test', 'username', 'password', 'TEST')
+        throttled_before = JiraClient.get_metrics()['throttled']
+        response = client.create_ticket('summary', None, '')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertEqual(JiraClient.get_metrics()['throttled'], throttled_before + 1)
+
+    @patch('requests.Session.request')
+    def test_post_not_retried_when_it_may_have_been_sent(self, mock_request):
+        unavailable = MockResponse({}, 503)
+        unavailable.text = "Service Unavailable"
+        mock_request.side_effect = [unavailable]
+        client = JiraClient('http://jira.test', 'username', 'password', 'TEST')
+        response = client.comment('TEST-1', 'comment')
+        self.assertEqual(response.status_code, 503)
+        mock_request.side_effect = requests.ReadTimeout()
+        with self.assertRaises(requests.ReadTimeout):
+            client.create_ticket('summary', None, '')
+        self.assertEqual(mock_request.call_count, 2)
+
+    @override_settings(JIRA_BACKOFF_FACTOR=0)
+    @patch('requests.Session.request')
+    def test_idempotent_request_retried_when_unavailable(self, mock_request):
+        unavailable = MockResponse({}, 503)
+        unavailable.headers = {}
+        mock_request.side_effect = [unavailable, requests.ReadTimeout(), MockResponse({}, 204)]
+        client = JiraClient('http://jira.test', 'username', 'password', 'TEST')
+        response = client.update_labels('TEST-1', ['label1'])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(mock_request.call_count, 3)
@@ -13,7 +13,7 @@ from notifier.events import InputCreationFailedEvent
 from notifier.tasks import send_notification
 
 import json
-from jinja2 import Template
+from runner.operator import reference_cache
 
 REQUIRED_META_FIELDS = [
     "cmoSampleName",
@@ -28,6 +28,7 @@ REQUIRED_INPUT_FIELDS = [
 
 ADAPTER = "GATCGGAAGAGC"
 ADAPTER2 = "AGATCGGAAGAGC"
+TEMPLATE_PATH = "runner/operator/access/v1_0_0/legacy/input_template.json.jinja2"
 SAMPLE_GROUP_SIZE = 20
 
 """
@@ -92,8 +93,7 @@ def generate_title_file_content(sample_group):
     return title_file_content.strip()
 
 def construct_sample_inputs(samples, request_id, group_id):
-    with open('runner/operator/access/v1_0_0/legacy/input_template.json.jinja2') as file:
-        template = Template(file.read())
+    template = reference_cache.load_template(TEMPLATE_PATH)
 
     sample_inputs = list()
     errors = 0
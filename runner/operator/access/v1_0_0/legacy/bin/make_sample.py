@@ -1,6 +1,7 @@
 import sys,os
 import json
 from pprint import pprint
+from runner.operator.helper import parse_fastq_name
 
 
 def format_sample_name(sample_name):
@@ -120,7 +121,7 @@ def check_samples(samples):
         r1 = samples[rg_id]['R1']
         r2 = samples[rg_id]['R2']
 
-        expected_r2 = 'R2'.join(r1.rsplit('R1', 1))
+        expected_r2 = parse_fastq_name(r1).mate
         if expected_r2 != r2:
             print("Mismatched fastqs! Check data:")
             print("R1: %s" % r1)
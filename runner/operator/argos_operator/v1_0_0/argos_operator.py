@@ -9,7 +9,7 @@ from .bin.make_sample import build_sample
 from notifier.events import UploadAttachmentEvent, OperatorRequestEvent, CantDoEvent, SetLabelEvent
 from notifier.tasks import send_notification
 from notifier.helper import generate_sample_data_content
-from runner.run.processors.file_processor import FileProcessor
+from runner.operator.helper import get_sample_mapping, group_files_by_sample
 from file_system.repository.file_repository import FileRepository
 from .bin.make_sample import format_sample_name
 
@@ -32,33 +32,14 @@ class ArgosOperator(Operator):
             send_notification.delay(all_normals_event)
             return argos_jobs
 
-        data = list()
-        for f in files:
-            sample = dict()
-            sample['id'] = f.file.id
-            sample['path'] = f.file.path
-            sample['file_name'] = f.file.file_name
-            sample['metadata'] = f.metadata
-            data.append(sample)
-
-        files = list()
         samples = list()
-        # group by igoId
-        igo_id_group = dict()
-        for sample in data:
-            igo_id = sample['metadata']['sampleId']
-            if igo_id not in igo_id_group:
-                igo_id_group[igo_id] = list()
-            igo_id_group[igo_id].append(sample)
-
-        for igo_id in igo_id_group:
-            samples.append(build_sample(igo_id_group[igo_id]))
+        for sample_files in group_files_by_sample(files):
+            samples.append(build_sample(sample_files))
 
         argos_inputs, error_samples = construct_argos_jobs(samples)
         number_of_inputs = len(argos_inputs)
 
         sample_pairing = ""
-        sample_mapping = ""
         pipeline = self.get_pipeline_id()
 
         try:
@@ -66,65 +47,11 @@ class ArgosOperator(Operator):
         except Pipeline.DoesNotExist:
             pass
 
+        sample_mapping, files = get_sample_mapping([job['pair'] for job in argos_inputs])
+
         for i, job in enumerate(argos_inputs):
             tumor_sample_name = job['pair'][0]['ID']
-            for p in job['pair'][0]['R1']:
-                filepath = FileProcessor.parse_path_from_uri(p['location'])
-                if filepath not in files:
-                    sample_mapping += "\t".join(
-                        [tumor_sample_name, filepath]) + "\n"
-                    files.append(filepath)
-            for p in job['pair'][0]['R2']:
-                filepath = FileProcessor.parse_path_from_uri(p['location'])
-                if filepath not in files:
-                    sample_mapping += "\t".join(
-                        [tumor_sample_name, filepath]) + "\n"
-                    files.append(filepath)
-            for p in job['pair'][0]['zR1']:
-                filepath = FileProcessor.parse_path_from_uri(p['location'])
-                if filepath not in files:
-                    sample_mapping += "\t".join(
-                        [tumor_sample_name, filepath]) + "\n"
-                    files.append(filepath)
-            for p in job['pair'][0]['zR2']:
-                filepath = FileProcessor.parse_path_from_uri(p['location'])
-                if filepath not in files:
-                    sample_mapping += "\t".join(
-                        [tumor_sample_name, filepath]) + "\n"
-                    files.append(filepath)
-
             normal_sample_name = job['pair'][1]['ID']
-            for p in job['pair'][1]['R1']:
-                filepath = FileProcessor.parse_path_from_uri(p['location'])
-                if filepath not in files:
-                    sample_mapping += "\t".join(
-                        [normal_sample_name, filepath]) + "\n"
-                    files.append(filepath)
-            for p in job['pair'][1]['R2']:
-                filepath = FileProcessor.parse_path_from_uri(p['location'])
-                if filepath not in files:
-                    sample_mapping += "\t".join(
-                        [normal_sample_name, filepath]) + "\n"
-                    files.append(filepath)
-            for p in job['pair'][1]['zR1']:
-                filepath = FileProcessor.parse_path_from_uri(p['location'])
-                if filepath not in files:
-                    sample_mapping += "\t".join(
-                        [normal_sample_name, filepath]) + "\n"
-                    files.append(filepath)
-            for p in job['pair'][1]['zR2']:
-                filepath = FileProcessor.parse_path_from_uri(p['location'])
-                if filepath not in files:
-                    sample_mapping += "\t".join(
-                        [normal_sample_name, filepath]) + "\n"
-                    files.append(filepath)
-
-            for p in job['pair'][1]['bam']:
-                filepath = FileProcessor.parse_path_from_uri(p['location'])
-                if filepath not in files:
-                    sample_mapping += "\t".join(
-                        [normal_sample_name, filepath]) + "\n"
-                    files.append(filepath)
 
             name = "ARGOS %s, %i of %i" % (self.request_id, i + 1, number_of_inputs)
             assay = job['assay']
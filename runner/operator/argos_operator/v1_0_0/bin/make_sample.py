@@ -3,7 +3,7 @@ This constructs a sample dictionary from the metadata in the Voyager/Beagle data
 """
 import logging
 import re
-from runner.operator.helper import format_sample_name
+from runner.operator.helper import format_sample_name, parse_fastq_name
 
 LOGGER = logging.getLogger(__name__)
 
@@ -51,7 +51,7 @@ def check_samples(samples):
         num_fastqs = len(r1)
 
         for index,fastq in enumerate(r1):
-            expected_r2 = 'R2'.join(fastq.rsplit('R1', 1))
+            expected_r2 = parse_fastq_name(fastq).mate
             if expected_r2 != r2[index]:
                 LOGGER.error("Mismatched fastqs! Check data:")
                 LOGGER.error("R1: %s" % fastq)
@@ -6,9 +6,9 @@ For example, get all samples by a patient ID or pooled normals based on the bait
 and preservation type
 """
 import logging
-import os
 from file_system.models import File, FileMetadata
 from file_system.repository.file_repository import FileRepository
+from runner.operator.helper import group_files_by_sample, parse_fastq_name
 from django.db.models import Prefetch, Q
 from django.conf import settings
 from .make_sample import build_sample, remove_with_caveats, format_sample_name
@@ -21,26 +21,9 @@ def get_samples_from_patient_id(patient_id):
     Retrieves samples from the database based on the patient_id
     """
     files = FileRepository.filter(metadata={"patientId": patient_id})
-    data = list()
-    for current_file in files:
-        sample = dict()
-        sample['id'] = current_file.file.id
-        sample['path'] = current_file.file.path
-        sample['file_name'] = current_file.file.file_name
-        sample['metadata'] = current_file.metadata
-        data.append(sample)
-
     samples = list()
-    # group by igoId
-    igo_id_group = dict()
-    for sample in data:
-        igo_id = sample['metadata']['sampleId']
-        if igo_id not in igo_id_group:
-            igo_id_group[igo_id] = list()
-        igo_id_group[igo_id].append(sample)
-
-    for igo_id in igo_id_group:
-        samples.append(build_sample(igo_id_group[igo_id]))
+    for sample_files in group_files_by_sample(files):
+        samples.append(build_sample(sample_files))
     samples, bad_samples = remove_with_caveats(samples)
     number_of_bad_samples = len(bad_samples)
     if number_of_bad_samples > 0:
@@ -149,8 +132,9 @@ def get_pooled_normals(run_ids, preservation_types, bait_set):
             # because rgid depends on flowCellId and barcodeIndex, we will
             # spoof barcodeIndex so that pairing can work properly; see
             # build_sample in runner.operator.argos_operator.bin
-            metadata['R'] = get_r_orientation(pooled_normal.file.file_name)
-            metadata['barcodeIndex'] = spoof_barcode(sample['file_name'], metadata['R'])
+            fastq_name = parse_fastq_name(pooled_normal.file.file_name)
+            metadata['R'] = fastq_name.read or 'ERROR'
+            metadata['barcodeIndex'] = fastq_name.barcode
             metadata['flowCellId'] = 'PN_FCID'
             metadata['tumorOrNormal'] = 'Normal'
             metadata['patientId'] = 'PN_PATIENT_ID'
@@ -234,43 +218,6 @@ def build_dmp_query(patient_id, bait_set):
     return query
 
 
-def get_r_orientation(fastq_filename):
-    """
-    Retrieve R orientation of fastq filename
-    """
-    reversed_filename = ''.join(reversed(fastq_filename))
-    r1_idx = reversed_filename.find('1R')
-    r2_idx = reversed_filename.find('2R')
-    if r1_idx == -1 and r2_idx == -1:
-        return "ERROR"
-    elif r1_idx > 0 and r2_idx == -1:
-        return "R1"
-    elif r2_idx > 0 and r1_idx == -1:
-        return 'R2'
-    elif r1_idx > 0 and r2_idx > 0:
-        if r1_idx < r2_idx:
-            return 'R1'
-        return 'R2'
-    return 'ERROR'
-
-
-def spoof_barcode(sample_file_name, r_orientation):
-    """
-    Spoof barcode by removing 'R1' or 'R2' from the filename; paired fastqs
-    are assumed to have only these two values as different
-
-    We are also assuming there are no periods in the file names other than extensions
-    """
-    reversed_str = ''.join(reversed(sample_file_name))
-    if r_orientation == 'R1':
-        reversed_str = reversed_str.replace('1R', '')
-    else:
-        reversed_str = reversed_str.replace('2R', '')
-    reversed_str = ''.join(reversed(reversed_str))
-    spoofed_barcode = reversed_str.split(os.extsep)[0]
-    return spoofed_barcode
-
-
 def init_metadata():
     """
     Build a fastq dictionary containing expected metadata for a sample
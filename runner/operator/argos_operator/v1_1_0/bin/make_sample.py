@@ -3,10 +3,13 @@ This constructs a sample dictionary from the metadata in the Voyager/Beagle data
 """
 import logging
 import re
-from runner.operator.helper import format_sample_name
+from datetime import datetime as dt
+from runner.operator.helper import format_sample_name, parse_fastq_name
 
 LOGGER = logging.getLogger(__name__)
 
+RUN_DATE_FORMATS = ('%y-%m-%d', '%Y-%m-%d')
+
 
 
 def remove_with_caveats(samples):
@@ -51,7 +54,7 @@ def check_samples(samples):
         num_fastqs = len(r1)
 
         for index,fastq in enumerate(r1):
-            expected_r2 = 'R2'.join(fastq.rsplit('R1', 1))
+            expected_r2 = parse_fastq_name(fastq).mate
             if expected_r2 != r2[index]:
                 LOGGER.error("Mismatched fastqs! Check data:")
                 LOGGER.error("R1: %s" % fastq)
@@ -95,6 +98,33 @@ def check_and_return_single_values(data):
     return data
 
 
+def parse_run_date(run_date):
+    """
+    Parse a runDate value into an ISO formatted date string, which compares in date order
+
+    Returns None if the value can't be parsed
+    """
+    if not run_date:
+        return None
+    for date_format in RUN_DATE_FORMATS:
+        try:
+            return dt.strptime(run_date, date_format).strftime('%Y-%m-%d')
+        except (TypeError, ValueError):
+            continue
+    LOGGER.error("Could not parse run date %s", run_date)
+    return None
+
+
+def get_run_date_range(run_dates):
+    """
+    Returns (earliest, latest) parsed run dates, or (None, None) if there are none
+    """
+    parsed = [d for d in (parse_run_date(run_date) for run_date in run_dates) if d]
+    if not parsed:
+        return None, None
+    return min(parsed), max(parsed)
+
+
 def build_sample(data, ignore_sample_formatting=False):
     """
     Given some data - which is a list of samples originally from the LIMS, split up into one file
@@ -218,5 +248,6 @@ def build_sample(data, ignore_sample_formatting=False):
             else:
                 result[key].append(sample[key])
     result = check_and_return_single_values(result)
+    result['run_date_min'], result['run_date_max'] = get_run_date_range(result['run_date'])
 
     return result
@@ -11,8 +11,8 @@ It performs the following:
 Normals will have to have the same patient and bait set in order to be considered "viable"
 """
 import logging
-from datetime import datetime as dt
-from .retrieve_samples_by_query import get_samples_from_patient_id, get_pooled_normals, get_dmp_normal
+from .make_sample import get_run_date_range
+from .retrieve_samples_by_query import get_samples_from_patient_ids, get_dmp_normals, PooledNormalResolver
 LOGGER = logging.getLogger(__name__)
 
 
@@ -29,19 +29,29 @@ def get_by_tumor_type(data, tumor_type):
     return samples
 
 
-def compare_dates(normal, viable_normal, date_string):
+def compare_dates(normal, viable_normal):
     """
     Compares dates between two normals; returns the most recent
+
+    normal is more recent if any of its run dates is later than any run date of viable_normal
     """
-    for run_date in normal['run_date']:
-        normal_date = dt.strptime(run_date, date_string)
-        for vrun_date in viable_normal['run_date']:
-            vnormal_date = dt.strptime(vrun_date, date_string)
-            if vnormal_date < normal_date:
-                viable_normal = normal
+    normal_max = get_run_dates(normal)[1]
+    viable_min = get_run_dates(viable_normal)[0]
+    if normal_max and viable_min and viable_min < normal_max:
+        return normal
     return viable_normal
 
 
+def get_run_dates(sample):
+    """
+    (earliest, latest) run date of a sample; pre-parsed by build_sample, or parsed here for
+    samples built elsewhere
+    """
+    if 'run_date_min' in sample:
+        return sample['run_date_min'], sample['run_date_max']
+    return get_run_date_range(sample['run_date'])
+
+
 def get_viable_normal(normals, patient_id, bait_set):
     """
     From a set of normals, return the ones that have matching patient_id, bait_set,
@@ -49,23 +59,47 @@ def get_viable_normal(normals, patient_id, bait_set):
 
     Does not check for Pooled Normals; that's done separately
     """
-    viable_normal = dict()
+    key = get_pairing_key({'patient_id': patient_id, 'bait_set': bait_set})
+    return build_normal_index(normals).get(key, dict())
+
+
+def get_pairing_key(sample):
+    """
+    (patient_id, bait_set) of a sample; lists, left by build_sample when values conflict,
+    are converted to tuples so the key stays hashable
+    """
+    patient_id = sample['patient_id']
+    bait_set = sample['bait_set']
+    if isinstance(patient_id, list):
+        patient_id = tuple(patient_id)
+    if isinstance(bait_set, list):
+        bait_set = tuple(bait_set)
+    return patient_id, bait_set
+
+
+def build_normal_index(normals):
+    """
+    Index normals by (patient_id, bait_set); each key holds the normal get_viable_normal
+    would return for that patient and bait set
+    """
+    normal_index = dict()
     for normal in normals:
-        if normal['patient_id'] == patient_id and normal['bait_set'] == bait_set:
-            if viable_normal:
-                try:
-                    viable_normal = compare_dates(normal, viable_normal, '%y-%m-%d')
-                except ValueError:
-                    LOGGER.debug("Trying different date parser")
-                    viable_normal = compare_dates(normal, viable_normal, '%Y-%m-%d')
-            else:
-                viable_normal = normal
-    return viable_normal
+        key = get_pairing_key(normal)
+        viable_normal = normal_index.get(key)
+        if viable_normal:
+            normal_index[key] = compare_dates(normal, viable_normal)
+        else:
+            normal_index[key] = normal
+    return normal_index
 
 
 def compile_pairs(samples, pairing_info=None):
     """
     Creates pairs of tumors and normals from a list of samples
+
+    Normals are resolved in batches, in order of priority: normals in the request,
+    normals of the same patients in other requests (one query), DMP normals (one query),
+    and pooled normals (loaded once for the run ids of all tumors, resolved in memory)
     """
     tumors = get_by_tumor_type(samples, "Tumor")
     normals = get_by_tumor_type(samples, "Normal")
@@ -80,79 +114,69 @@ def compile_pairs(samples, pairing_info=None):
         LOGGER.error("No tumor samples found; pairing will not be performed.")
         LOGGER.error("Returning an empty list of pairs.")
 
-    for tumor in tumors:
-        LOGGER.info("Pairing tumor sample %s", tumor['sample_id'])
-        if pairing_info:
+    if pairing_info:
+        normals_by_sm = dict()
+        for normal in normals:
+            normals_by_sm.setdefault(normal['SM'], normal)
+        for tumor in tumors:
+            LOGGER.info("Pairing tumor sample %s", tumor['sample_id'])
             for pair in pairing_info['pairs']:
                 if tumor['SM'] == pair['tumor']:
-                    for normal in normals:
-                        if normal['SM'] == pair['normal']:
-                            pairs['tumor'].append(tumor)
-                            pairs['normal'].append(normal)
-                            break
-        else:
-            patient_id = tumor['patient_id']
-            if patient_id:
-                bait_set = tumor['bait_set']
-                run_ids = tumor['run_id']
-                preservation_types = tumor['preservation_type']
-                normal = get_viable_normal(normals, patient_id, bait_set)
-                if normal:
-                    LOGGER.info("Pairing %s (%s) with %s (%s)",
-                                tumor['sample_id'],
-                                tumor['SM'],
-                                normal['sample_id'],
-                                normal['SM'])
-                    pairs['tumor'].append(tumor)
-                    pairs['normal'].append(normal)
-                else:
-                    LOGGER.info("Missing normal for sample %s (%s); querying patient %s",
-                                tumor['sample_id'],
-                                tumor['SM'],
-                                patient_id)
-                    patient_samples = get_samples_from_patient_id(patient_id)
-                    new_normals = get_by_tumor_type(patient_samples, "Normal")
-                    new_normal = get_viable_normal(new_normals, patient_id, bait_set)
-                    if new_normal:
-                        LOGGER.info("Pairing %s (%s) with %s (%s)",
-                                    tumor['sample_id'],
-                                    tumor['SM'],
-                                    new_normal['sample_id'],
-                                    new_normal['SM'])
+                    normal = normals_by_sm.get(pair['normal'])
+                    if normal:
                         pairs['tumor'].append(tumor)
-                        pairs['normal'].append(new_normal)
-                    else:
-                        LOGGER.info("No normal found for patient %s; checking for DMP Normal", patient_id)
-                        dmp_normal = get_dmp_normal(patient_id, bait_set)
-                        if dmp_normal:
-                            LOGGER.info("Pairing %s (%s) with %s (%s)",
-                                        tumor['sample_id'],
-                                        tumor['SM'],
-                                        dmp_normal['sample_id'],
-                                        dmp_normal['SM'])
-                            pairs['tumor'].append(tumor)
-                            pairs['normal'].append(dmp_normal)
-                        else:
-                            pooled_normal = get_pooled_normals(run_ids, preservation_types, bait_set)
-                            LOGGER.info("No DMP Normal found for patient %s; checking for Pooled Normal",
-                                        patient_id)
-                            if pooled_normal:
-                                LOGGER.info("Pairing %s (%s) with %s (%s)",
-                                            tumor['sample_id'],
-                                            tumor['SM'],
-                                            pooled_normal['sample_id'],
-                                            pooled_normal['SM'])
-                                pairs['tumor'].append(tumor)
-                                pairs['normal'].append(pooled_normal)
-                            else:
-                                LOGGER.error("No normal found for %s (%s), patient %s",
-                                             tumor['sample_id'],
-                                             tumor['SM'],
-                                             patient_id)
+                        pairs['normal'].append(normal)
+        return pairs
+
+    keys = set(get_pairing_key(tumor) for tumor in tumors if tumor['patient_id'])
+    request_normals = build_normal_index(normals)
+    missing = [key for key in keys if key not in request_normals]
+
+    patient_normals = dict()
+    if missing:
+        LOGGER.info("Missing normal for patients %s; querying other requests", ", ".join(set(k[0] for k in missing)))
+        patient_samples = get_samples_from_patient_ids([key[0] for key in missing])
+        for patient_id in patient_samples:
+            patient_normals.update(build_normal_index(get_by_tumor_type(patient_samples[patient_id], "Normal")))
+        missing = [key for key in missing if key not in patient_normals]
+
+    dmp_normals = dict()
+    if missing:
+        LOGGER.info("No normal found for patients %s; checking for DMP Normal", ", ".join(set(k[0] for k in missing)))
+        dmp_normals = get_dmp_normals(missing)
+
+    pooled_normals = None
+    for tumor in tumors:
+        LOGGER.info("Pairing tumor sample %s", tumor['sample_id'])
+        patient_id = tumor['patient_id']
+        if patient_id:
+            key = get_pairing_key(tumor)
+            normal = request_normals.get(key) or patient_normals.get(key) or dmp_normals.get(key)
+            if not normal:
+                LOGGER.info("No DMP Normal found for patient %s; checking for Pooled Normal", patient_id)
+                if pooled_normals is None:
+                    pooled_normals = PooledNormalResolver(run_id for t in tumors for run_id in t['run_id'])
+                normal = pooled_normals.get(tumor['run_id'], tumor['preservation_type'], tumor['bait_set'])
+            if normal:
+                LOGGER.info("Pairing %s (%s) with %s (%s)",
+                            tumor['sample_id'],
+                            tumor['SM'],
+                            normal['sample_id'],
+                            normal['SM'])
+                pairs['tumor'].append(tumor)
+                pairs['normal'].append(normal)
             else:
-                LOGGER.error("NoPatientIdError: No patient_id found for %s (%s); skipping.",
+                LOGGER.error("No normal found for %s (%s), patient %s",
                              tumor['sample_id'],
-                             tumor['SM'])
+                             tumor['SM'],
+                             patient_id)
+        else:
+            LOGGER.error("NoPatientIdError: No patient_id found for %s (%s); skipping.",
+                         tumor['sample_id'],
+                         tumor['SM'])
+    if pooled_normals is not None:
+        LOGGER.info("Pooled normal lookups: %(hits)s hits, %(misses)s misses, %(candidates)s candidates",
+                    pooled_normals.stats())
     return pairs
 
 
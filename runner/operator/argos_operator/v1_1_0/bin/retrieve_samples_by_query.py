@@ -6,9 +6,9 @@ For example, get all samples by a patient ID or pooled normals based on the bait
 and preservation type
 """
 import logging
-import os
 from file_system.models import File, FileMetadata
 from file_system.repository.file_repository import FileRepository
+from runner.operator.helper import group_files_by_sample, parse_fastq_name
 from django.db.models import Prefetch, Q
 from django.conf import settings
 from .make_sample import build_sample, remove_with_caveats, format_sample_name
@@ -21,26 +21,9 @@ def get_samples_from_patient_id(patient_id):
     Retrieves samples from the database based on the patient_id
     """
     files = FileRepository.filter(metadata={"patientId": patient_id}, filter_redact=True)
-    data = list()
-    for current_file in files:
-        sample = dict()
-        sample['id'] = current_file.file.id
-        sample['path'] = current_file.file.path
-        sample['file_name'] = current_file.file.file_name
-        sample['metadata'] = current_file.metadata
-        data.append(sample)
-
     samples = list()
-    # group by igoId
-    igo_id_group = dict()
-    for sample in data:
-        igo_id = sample['metadata']['sampleId']
-        if igo_id not in igo_id_group:
-            igo_id_group[igo_id] = list()
-        igo_id_group[igo_id].append(sample)
-
-    for igo_id in igo_id_group:
-        samples.append(build_sample(igo_id_group[igo_id]))
+    for sample_files in group_files_by_sample(files):
+        samples.append(build_sample(sample_files))
     samples, bad_samples = remove_with_caveats(samples)
     number_of_bad_samples = len(bad_samples)
     if number_of_bad_samples > 0:
@@ -49,6 +32,57 @@ def get_samples_from_patient_id(patient_id):
     return samples
 
 
+def get_samples_from_patient_ids(patient_ids):
+    """
+    Retrieves samples from the database for several patients with one query
+
+    Returns dict of patient_id -> list of samples, same as calling
+    get_samples_from_patient_id for each patient
+    """
+    patient_ids = [patient_id for patient_id in set(patient_ids) if patient_id]
+    if not patient_ids:
+        return dict()
+    q = build_patient_id_query(patient_ids) & Q(file__sample__redact=False)
+    files = FileRepository.filter(q=q).select_related('file')
+
+    # group by patientId, then by igoId
+    patient_groups = dict()
+    for current_file in files:
+        sample = dict()
+        sample['id'] = current_file.file.id
+        sample['path'] = current_file.file.path
+        sample['file_name'] = current_file.file.file_name
+        sample['metadata'] = current_file.metadata
+        igo_id_group = patient_groups.setdefault(current_file.metadata['patientId'], dict())
+        igo_id_group.setdefault(current_file.metadata['sampleId'], list()).append(sample)
+
+    patient_samples = dict()
+    for patient_id, igo_id_group in patient_groups.items():
+        samples = list()
+        for igo_id in igo_id_group:
+            samples.append(build_sample(igo_id_group[igo_id]))
+        samples, bad_samples = remove_with_caveats(samples)
+        number_of_bad_samples = len(bad_samples)
+        if number_of_bad_samples > 0:
+            LOGGER.warning('Some samples for patient query %s have invalid %i values',
+                           patient_id, number_of_bad_samples)
+        patient_samples[patient_id] = samples
+    return patient_samples
+
+
+def build_patient_id_query(data):
+    """
+    Build complex Q object patient id query from given data
+
+    Only does OR queries, same as build_run_id_query
+    """
+    data_query_set = [Q(metadata__patientId=value) for value in set(data)]
+    query = data_query_set.pop()
+    for item in data_query_set:
+        query |= item
+    return query
+
+
 def get_descriptor(bait_set, pooled_normals):
     """
     Need descriptor to match pooled normal "recipe", which might need to be re-labeled as bait_set
@@ -84,56 +118,112 @@ def build_preservation_query(data):
 
     Main logic: if FFPE in data, return FFPE query; else, return FROZEN query
     """
+    value = get_pooled_normal_preservation(data)
+    # case-insensitive matching
+    query = Q(metadata__preservation__iexact=value)
+    return query
+
+
+def get_pooled_normal_preservation(data):
+    """
+    FFPE if FFPE is in any of the preservation types, else FROZEN
+    """
     preservations_lower_case = set([x.lower() for x in data])
     value = "FROZEN"
     if "ffpe" in preservations_lower_case:
         value = "FFPE"
-    # case-insensitive matching
-    query = Q(metadata__preservation__iexact=value)
-    return query
+    return value
 
 
 def get_pooled_normals(run_ids, preservation_types, bait_set):
     """
     From a list of run_ids, preservation types, and bait sets, get all potential pooled normals
     """
-    pooled_normals = FileRepository.all()
-
-    query = Q(file__file_group=settings.POOLED_NORMAL_FILE_GROUP)
-    run_id_query = build_run_id_query(run_ids)
-    preservation_query = build_preservation_query(preservation_types)
-
-    q = query & run_id_query & preservation_query
-
-    pooled_normals = FileRepository.filter(queryset=pooled_normals, q=q)
-
-    descriptor = get_descriptor(bait_set, pooled_normals)
-
-    if descriptor: # From returned pooled normals, we found the bait set/recipe we're looking for
-        pooled_normals = FileRepository.filter(queryset=pooled_normals, metadata={'recipe': descriptor})
-
-        # sample_name is FROZENPOOLEDNORMAL unless FFPE is in any of the preservation types
-        # in preservation_types
-        preservations_lower_case = set([x.lower() for x in preservation_types])
-        run_ids_suffix_list = [i for i in run_ids if i] # remove empty or false string values
-        run_ids_suffix = "_".join(run_ids_suffix_list)
-        sample_name = "FROZENPOOLEDNORMAL_" + run_ids_suffix
-        if "ffpe" in preservations_lower_case:
-            sample_name = "FFPEPOOLEDNORMAL_" + run_ids_suffix
-    elif "impact505" in bait_set.lower():
-        # We didn't find a pooled normal for IMPACT505; return "static" FROZEN or FFPE pool normal
-        preservations_lower_case = set([x.lower() for x in preservation_types])
-        sample_name = "FROZENPOOLEDNORMAL_IMPACT505_V1"
-        if "ffpe" in preservations_lower_case:
-            sample_name = "FFPEPOOLEDNORMAL_IMPACT505_V1"
-        q = query & Q(metadata__sampleName=sample_name)
-        pooled_normals = FileRepository.filter(queryset=pooled_normals, q=q)
-        if not pooled_normals:
-            LOGGER.error("Could not find IMPACT505 pooled normal to pair %s", sample_name)
+    return PooledNormalResolver(run_ids).get(run_ids, preservation_types, bait_set)
+
+
+class PooledNormalResolver(object):
+    """
+    Resolves pooled normals for the tumors of one operator run
+
+    Candidate pooled normals from POOLED_NORMAL_FILE_GROUP are loaded once for all run ids,
+    and every (run ids, preservation types, bait set) combination is resolved in memory
+    and memoized; hits and misses count the lookups answered from and added to the memo
+    """
+
+    def __init__(self, run_ids=()):
+        self.candidates = list()
+        self.loaded_run_ids = set()
+        self.pooled_normals = dict()
+        self.hits = 0
+        self.misses = 0
+        self.load(run_ids)
+
+    def load(self, run_ids):
+        """
+        Load candidate pooled normals for the run ids that weren't loaded yet
+        """
+        run_ids = set(run_ids) - self.loaded_run_ids
+        if not run_ids:
+            return
+        q = Q(file__file_group=settings.POOLED_NORMAL_FILE_GROUP) & build_run_id_query(run_ids)
+        self.candidates.extend(FileRepository.filter(q=q).select_related('file'))
+        self.loaded_run_ids.update(run_ids)
+
+    def get(self, run_ids, preservation_types, bait_set):
+        key = (tuple(run_ids), tuple(preservation_types), bait_set)
+        if key in self.pooled_normals:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.pooled_normals[key] = self._resolve(run_ids, preservation_types, bait_set)
+        return self.pooled_normals[key]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'candidates': len(self.candidates)}
+
+    def _resolve(self, run_ids, preservation_types, bait_set):
+        self.load(run_ids)
+        preservation = get_pooled_normal_preservation(preservation_types).lower()
+        pooled_normals = [pooled_normal for pooled_normal in self.candidates
+                          if pooled_normal.metadata.get('runId') in run_ids
+                          and str(pooled_normal.metadata.get('preservation')).lower() == preservation]
+
+        descriptor = get_descriptor(bait_set, pooled_normals)
+
+        if descriptor: # From returned pooled normals, we found the bait set/recipe we're looking for
+            pooled_normals = [pooled_normal for pooled_normal in pooled_normals
+                              if pooled_normal.metadata.get('recipe') == descriptor]
+
+            # sample_name is FROZENPOOLEDNORMAL unless FFPE is in any of the preservation types
+            # in preservation_types
+            preservations_lower_case = set([x.lower() for x in preservation_types])
+            run_ids_suffix_list = [i for i in run_ids if i] # remove empty or false string values
+            run_ids_suffix = "_".join(run_ids_suffix_list)
+            sample_name = "FROZENPOOLEDNORMAL_" + run_ids_suffix
+            if "ffpe" in preservations_lower_case:
+                sample_name = "FFPEPOOLEDNORMAL_" + run_ids_suffix
+        elif "impact505" in bait_set.lower():
+            # We didn't find a pooled normal for IMPACT505; return "static" FROZEN or FFPE pool normal
+            preservations_lower_case = set([x.lower() for x in preservation_types])
+            sample_name = "FROZENPOOLEDNORMAL_IMPACT505_V1"
+            if "ffpe" in preservations_lower_case:
+                sample_name = "FFPEPOOLEDNORMAL_IMPACT505_V1"
+            q = Q(file__file_group=settings.POOLED_NORMAL_FILE_GROUP) & Q(metadata__sampleName=sample_name)
+            pooled_normals = list(FileRepository.filter(q=q).select_related('file'))
+            if not pooled_normals:
+                LOGGER.error("Could not find IMPACT505 pooled normal to pair %s", sample_name)
+                return None
+        else:
             return None
-    else:
-        return None
 
+        return build_pooled_normal(pooled_normals, sample_name, descriptor, run_ids, preservation_types)
+
+
+def build_pooled_normal(pooled_normals, sample_name, descriptor, run_ids, preservation_types):
+    """
+    Build a single sample from pooled normal fastqs
+    """
     specimen_type = 'Pooled Normal'
 
     sample_files = list()
@@ -158,8 +248,9 @@ def get_pooled_normals(run_ids, preservation_types, bait_set):
             # because rgid depends on flowCellId and barcodeIndex, we will
             # spoof barcodeIndex so that pairing can work properly; see
             # build_sample in runner.operator.argos_operator.bin
-            metadata['R'] = get_r_orientation(pooled_normal.file.file_name)
-            metadata['barcodeIndex'] = spoof_barcode(sample['file_name'], metadata['R'])
+            fastq_name = parse_fastq_name(pooled_normal.file.file_name)
+            metadata['R'] = fastq_name.read or 'ERROR'
+            metadata['barcodeIndex'] = fastq_name.barcode
             metadata['flowCellId'] = 'PN_FCID'
             metadata['tumorOrNormal'] = 'Normal'
             metadata['patientId'] = 'PN_PATIENT_ID'
@@ -188,6 +279,42 @@ def get_dmp_normal(patient_id, bait_set):
     return None
 
 
+def get_dmp_normals(patient_bait_sets):
+    """
+    From a list of (patient_id, bait_set) tuples, get matching dmp bam normals with one query
+
+    Returns dict of (patient_id, bait_set) -> built sample, for the pairs where a
+    dmp bam normal was found; same as calling get_dmp_normal for each pair
+    """
+    patient_bait_sets = set(patient_bait_sets)
+    if not patient_bait_sets:
+        return dict()
+    assays = set(get_dmp_assay(bait_set) for _, bait_set in patient_bait_sets)
+    patients = set(patient_id.lstrip('C-') for patient_id, _ in patient_bait_sets)
+    assay_query = Q()
+    for value in assays:
+        assay_query |= Q(metadata__cmo_assay=value)
+    patient_query = Q()
+    for value in patients:
+        patient_query |= Q(metadata__patient__cmo=value)
+    query = assay_query & patient_query & Q(metadata__type='N')
+
+    dmp_bams = dict()
+    for dmp_bam in FileRepository.filter(q=query).select_related('file', 'file__file_type').order_by(
+            'file__file_name'):
+        key = (dmp_bam.metadata.get('patient', {}).get('cmo'), dmp_bam.metadata.get('cmo_assay'))
+        if key not in dmp_bams:
+            dmp_bams[key] = dmp_bam
+
+    dmp_normals = dict()
+    for patient_id, bait_set in patient_bait_sets:
+        dmp_bam = dmp_bams.get((patient_id.lstrip('C-'), get_dmp_assay(bait_set)))
+        if dmp_bam:
+            sample = build_dmp_sample(dmp_bam, patient_id, bait_set)
+            dmp_normals[(patient_id, bait_set)] = build_sample([sample], ignore_sample_formatting=True)
+    return dmp_normals
+
+
 def build_dmp_sample(dmp_bam, patient_id, bait_set):
     dmp_metadata = dmp_bam.metadata
     specimen_type = "DMP Normal"
@@ -232,15 +359,7 @@ def build_dmp_query(patient_id, bait_set):
 
     Patient ID in DMP also doesn't contain C-, so this removes that prefix
     """
-    value = ""
-    if "impact341" in bait_set.lower():
-        value = "IMPACT341"
-    if "impact410" in bait_set.lower():
-        value = "IMPACT410"
-    if "impact468" in bait_set.lower():
-        value = "IMPACT468"
-    if "hemepact_v4" in bait_set.lower():
-        value = "HEMEPACT"
+    value = get_dmp_assay(bait_set)
     assay = Q(metadata__cmo_assay=value)
     patient = Q(metadata__patient__cmo=patient_id.lstrip('C-'))
     normal = Q(metadata__type='N')
@@ -248,41 +367,20 @@ def build_dmp_query(patient_id, bait_set):
     return query
 
 
-def get_r_orientation(fastq_filename):
+def get_dmp_assay(bait_set):
     """
-    Retrieve R orientation of fastq filename
+    Translate bait set from file groups/LIMS to the assay name used in DMP
     """
-    reversed_filename = ''.join(reversed(fastq_filename))
-    r1_idx = reversed_filename.find('1R')
-    r2_idx = reversed_filename.find('2R')
-    if r1_idx == -1 and r2_idx == -1:
-        return "ERROR"
-    elif r1_idx > 0 and r2_idx == -1:
-        return "R1"
-    elif r2_idx > 0 and r1_idx == -1:
-        return 'R2'
-    elif r1_idx > 0 and r2_idx > 0:
-        if r1_idx < r2_idx:
-            return 'R1'
-        return 'R2'
-    return 'ERROR'
-
-
-def spoof_barcode(sample_file_name, r_orientation):
-    """
-    Spoof barcode by removing 'R1' or 'R2' from the filename; paired fastqs
-    are assumed to have only these two values as different
-
-    We are also assuming there are no periods in the file names other than extensions
-    """
-    reversed_str = ''.join(reversed(sample_file_name))
-    if r_orientation == 'R1':
-        reversed_str = reversed_str.replace('1R', '')
-    else:
-        reversed_str = reversed_str.replace('2R', '')
-    reversed_str = ''.join(reversed(reversed_str))
-    spoofed_barcode = reversed_str.split(os.extsep)[0]
-    return spoofed_barcode
+    value = ""
+    if "impact341" in bait_set.lower():
+        value = "IMPACT341"
+    if "impact410" in bait_set.lower():
+        value = "IMPACT410"
+    if "impact468" in bait_set.lower():
+        value = "IMPACT468"
+    if "hemepact_v4" in bait_set.lower():
+        value = "HEMEPACT"
+    return value
 
 
 def init_metadata():
@@ -5,8 +5,8 @@ to the pipeline executor
 import logging
 import os
 import sys
-import json
-from runner.models import Port
+from runner.operator import reference_cache
+from runner.operator.helper import get_run_ports, list_run_ports, get_target_assay
 WORKDIR = os.path.dirname(os.path.abspath(__file__))
 LOGGER = logging.getLogger(__name__)
 
@@ -15,8 +15,7 @@ def load_references():
     """
     Loads QC reference data from the resources JSON
     """
-    data = json.load(open(os.path.join(WORKDIR, 'reference_jsons/qc_resources.json'), 'rb'))
-    return data
+    return reference_cache.load_json(os.path.join(WORKDIR, 'reference_jsons/qc_resources.json'))
 
 
 def get_baits_and_targets(assay, qc_resources):
@@ -24,23 +23,7 @@ def get_baits_and_targets(assay, qc_resources):
     From value in assay, retrieve target files (mainly fp_genotypes) from qc_resources
     """
     targets = qc_resources['targets']
-
-    target_assay = assay
-
-    if assay.find("IMPACT505") > -1:
-        target_assay = "IMPACT505_b37"
-    if assay.find("IMPACT410") > -1:
-        target_assay = "IMPACT410_b37"
-    if assay.find("IMPACT468") > -1:
-        target_assay = "IMPACT468_b37"
-    if assay.find("IMPACT341") > -1:
-        target_assay = "IMPACT341_b37"
-    if assay.find("IDT_Exome_v1_FP") > -1:
-        target_assay = "IDT_Exome_v1_FP_b37"
-    if assay.find("IMPACT468+08390") > -1:
-        target_assay = "IMPACT468_08390"
-    if assay.find("IMPACT468+Poirier_RB1_intron_V2") > -1:
-        target_assay = "IMPACT468_08050"
+    target_assay = get_target_assay(assay)
 
     if target_assay in targets:
         return {"class": "File", 'location': str(targets[target_assay]['fp_genotypes'])}
@@ -127,8 +110,9 @@ def construct_argos_qc_input(run_id_list):
     for key in single_keys:
         input_json[key] = ""
 
+    run_ports = get_run_ports(run_id_list)
     for single_run_id in run_id_list:
-        port_list = Port.objects.filter(run=single_run_id)
+        port_list = list_run_ports(run_ports[str(single_run_id)])
         for single_port in port_list:
             name = single_port.name
             value = single_port.value
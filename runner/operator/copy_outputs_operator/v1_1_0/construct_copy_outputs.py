@@ -3,8 +3,9 @@ import sys
 import argparse
 import json
 from pprint import pprint
-from runner.models import Port, Run
+from runner.models import Run
 from runner.run.processors.file_processor import FileProcessor
+from runner.operator.helper import get_run_ports, list_run_ports
 from notifier.helper import generate_sample_data_content
 
 
@@ -85,9 +86,10 @@ def construct_copy_outputs_input(run_id_list):
     input_json = {}
     output_description = get_argos_output_description()
     project_prefix = set()
+    run_ports = get_run_ports(run_id_list)
 
     for single_run_id in run_id_list:
-        port_list = Port.objects.filter(run=single_run_id)
+        port_list = list_run_ports(run_ports[str(single_run_id)])
         for single_port in port_list:
             if single_port.name == "project_prefix":
                 project_prefix.add(single_port.value)
@@ -120,9 +122,11 @@ def generate_sample_pairing_and_mapping_files(run_ids):
     if runs:
         pipeline = runs[0].app
 
+    pair_ports = get_run_ports([r.id for r in runs], names=['pair'])
+
     for r in runs:
         request_id_set.add(r.tags['requestId'])
-        inp_port = Port.objects.filter(run_id=r.id, name='pair').first()
+        inp_port = pair_ports[str(r.id)]['pair'][0]
         tumor_sample_name = inp_port.db_value[0]['ID']
         for p in inp_port.db_value[0]['R1']:
             sample_mapping += "\t".join(
@@ -5,8 +5,9 @@ to the pipeline executor
 import logging
 import os
 import sys
-import json
 from runner.models import Port,Run
+from runner.operator import reference_cache
+from runner.operator.helper import get_run_ports, list_run_ports, get_target_assay
 from runner.run.processors.file_processor import FileProcessor
 from file_system.repository.file_repository import FileRepository
 from notifier.helper import generate_sample_data_content
@@ -21,8 +22,7 @@ def load_references():
     """
     Loads reference data from the resources JSON
     """
-    data = json.load(open(os.path.join(WORKDIR, 'reference_jsons/helix_filters_resources.json'), 'rb'))
-    return data
+    return reference_cache.load_json(os.path.join(WORKDIR, 'reference_jsons/helix_filters_resources.json'))
 
 
 def get_baits_and_targets(assay, helix_filters_resources):
@@ -30,23 +30,7 @@ def get_baits_and_targets(assay, helix_filters_resources):
     From value in assay, retrieve target files from helix_filters_resources
     """
     targets = helix_filters_resources['targets']
-
-    target_assay = assay
-
-    if assay.find("IMPACT505") > -1:
-        target_assay = "IMPACT505_b37"
-    if assay.find("IMPACT410") > -1:
-        target_assay = "IMPACT410_b37"
-    if assay.find("IMPACT468") > -1:
-        target_assay = "IMPACT468_b37"
-    if assay.find("IMPACT341") > -1:
-        target_assay = "IMPACT341_b37"
-    if assay.find("IDT_Exome_v1_FP") > -1:
-        target_assay = "IDT_Exome_v1_FP_b37"
-    if assay.find("IMPACT468+08390") > -1:
-        target_assay = "IMPACT468_08390"
-    if assay.find("IMPACT468+Poirier_RB1_intron_V2") > -1:
-        target_assay = "IMPACT468_08050"
+    target_assay = get_target_assay(assay)
 
     if target_assay in targets:
         return {"class": "File", 'location': str(targets[target_assay]['targets_list'])}
@@ -128,8 +112,9 @@ def construct_helix_filters_input(argos_run_id_list):
     for key in list_keys:
         input_json[key] = list()
 
+    run_ports = get_run_ports(argos_run_id_list)
     for single_run_id in argos_run_id_list:
-        port_list = Port.objects.filter(run=single_run_id)
+        port_list = list_run_ports(run_ports[str(single_run_id)])
         pair_info = {}
         for single_port in port_list:
             name = single_port.name
@@ -197,13 +182,14 @@ def create_data_clinical_file(run_id_list):
     pipeline_names = set()
     pipeline_githubs = set()
     pipeline_versions = set()
+    pair_ports = get_run_ports(run_id_list, names=['pair'])
     for run_id in run_id_list:
         argos_run = Run.objects.get(id=run_id)
         pipeline = argos_run.app
         pipeline_names.add(pipeline.name)
         pipeline_githubs.add(pipeline.github)
         pipeline_versions.add(pipeline.version)
-        files = files + get_files_from_run(argos_run)
+        files = files + get_files_from_run(argos_run, pair_ports[str(run_id)]['pair'][0])
     data_clinical_content = generate_sample_data_content(files,
             pipeline_name=','.join(pipeline_names),
             pipeline_github=','.join(pipeline_githubs),
@@ -216,9 +202,10 @@ def create_data_clinical_file(run_id_list):
             }
 
 
-def get_files_from_run(r):
+def get_files_from_run(r, inp_port=None):
     files = list()
-    inp_port = Port.objects.filter(run_id=r.id, name='pair').first()
+    if inp_port is None:
+        inp_port = Port.objects.filter(run_id=r.id, name='pair').first()
     for p in inp_port.db_value[0]['R1']:
         files.append(FileProcessor.get_file_path(p['location']))
     for p in inp_port.db_value[0]['R2']:
@@ -1,10 +1,35 @@
+import os
 import re
 import logging
+from functools import lru_cache
+from itertools import groupby
+from collections import OrderedDict, namedtuple
+from django.db.models.query import QuerySet
 from file_system.repository.file_repository import FileRepository
+from runner.models import Port
+from runner.run.processors.file_processor import FileProcessor
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Reference target keys by the substring of the assay that selects them; when several
+# match, the last one wins, so more specific assays are listed after their base assay
+ASSAY_TARGETS = (
+    ("IMPACT505", "IMPACT505_b37"),
+    ("IMPACT410", "IMPACT410_b37"),
+    ("IMPACT468", "IMPACT468_b37"),
+    ("IMPACT341", "IMPACT341_b37"),
+    ("IDT_Exome_v1_FP", "IDT_Exome_v1_FP_b37"),
+    ("IMPACT468+08390", "IMPACT468_08390"),
+    ("IMPACT468+Poirier_RB1_intron_V2", "IMPACT468_08050"),
+)
+
+# Illumina fastq names, <sample>_S<n>_L<lane>_R<read>_001.fastq.gz; the read is the last
+# R1/R2 of the name which isn't at its very end, sample and lane are optional
+FASTQ_NAME_REGEX = re.compile(r'^(?:(?P<sample>.+?)_S\d+_)?(?:L(?P<lane>\d{3})_)?.*(?P<read>R[12])(?=.)')
+
+FastqName = namedtuple('FastqName', ['read', 'lane', 'sample', 'barcode', 'mate'])
+
 
 def format_sample_name(sample_name, specimen_type, ignore_sample_formatting=False):
     """
@@ -40,6 +65,132 @@ def format_sample_name(sample_name, specimen_type, ignore_sample_formatting=Fals
         return sample_name
 
 
+def group_files_by_sample(files):
+    """
+    Yields the files of each sample, grouped by sampleId, as lists of dicts with
+    id, path, file_name and metadata; the input build_sample expects
+
+    FileMetadata querysets are streamed ordered by sampleId, with their File joined,
+    so only one sample is held in memory at a time. Other iterables of FileMetadata
+    are grouped in the order samples first appear
+    """
+    if isinstance(files, QuerySet):
+        rows = files.select_related('file').order_by('metadata__sampleId').iterator()
+        for _, group in groupby(rows, key=lambda f: f.metadata['sampleId']):
+            yield [get_sample_file(f) for f in group]
+    else:
+        igo_id_group = OrderedDict()
+        for f in files:
+            igo_id_group.setdefault(f.metadata['sampleId'], list()).append(get_sample_file(f))
+        for group in igo_id_group.values():
+            yield group
+
+
+def get_sample_file(file_metadata):
+    sample = dict()
+    sample['id'] = file_metadata.file.id
+    sample['path'] = file_metadata.file.path
+    sample['file_name'] = file_metadata.file.file_name
+    sample['metadata'] = file_metadata.metadata
+    return sample
+
+
+def get_run_ports(run_ids, names=None):
+    """
+    Loads the ports of all runs in run_ids with one query
+
+    Returns an OrderedDict of run id (as str, in the order of run_ids) to an OrderedDict
+    of port name to the list of that run's ports with the name, in creation order.
+    names optionally restricts the port names loaded; runs without ports map to an
+    empty dict
+    """
+    run_ports = OrderedDict((str(run_id), OrderedDict()) for run_id in run_ids)
+    ports = Port.objects.filter(run_id__in=list(run_ports))
+    if names is not None:
+        ports = ports.filter(name__in=names)
+    for port in ports.order_by('created_date'):
+        run_ports[str(port.run_id)].setdefault(port.name, list()).append(port)
+    return run_ports
+
+
+def list_run_ports(ports_by_name):
+    """
+    Flattens one run's entry from get_run_ports back into a list of its ports
+    """
+    return [port for ports in ports_by_name.values() for port in ports]
+
+
+def get_sample_mapping(pairs, unique_lines=False):
+    """
+    Builds sample_mapping.txt content for a list of (tumor, normal) pairs, and the
+    list of file paths in the order they were first seen
+
+    Tumor R1, R2, zR1, zR2 and normal R1, R2, zR1, zR2, bam files are mapped to the
+    sample ID. By default a line is written the first time a file is seen.
+
+    With unique_lines, every distinct line is written once, and a normal R2 seen for
+    the first time is written a second time; this is what Argos v1.1.0 has always
+    written, so the file is kept as is
+    """
+    lines = list()
+    written = set()
+    files = OrderedDict()
+    for tumor, normal in pairs:
+        for sample, fields, repeated_field in ((tumor, ('R1', 'R2', 'zR1', 'zR2'), None),
+                                               (normal, ('R1', 'R2', 'zR1', 'zR2', 'bam'), 'R2')):
+            sample_name = sample['ID']
+            for field in fields:
+                for p in sample[field]:
+                    filepath = FileProcessor.parse_path_from_uri(p['location'])
+                    line = "\t".join([sample_name, filepath]) + "\n"
+                    new_file = filepath not in files
+                    if unique_lines:
+                        if line not in written:
+                            written.add(line)
+                            lines.append(line)
+                        if new_file and field == repeated_field:
+                            lines.append(line)
+                    elif new_file:
+                        lines.append(line)
+                    if new_file:
+                        files[filepath] = None
+    return "".join(lines), list(files)
+
+
+@lru_cache(maxsize=None)
+def get_target_assay(assay):
+    """
+    Returns the reference target key for assay, or assay itself if no target matches
+    """
+    for name, target_assay in reversed(ASSAY_TARGETS):
+        if name in assay:
+            return target_assay
+    return assay
+
+
+@lru_cache(maxsize=65536)
+def parse_fastq_name(path):
+    """
+    Parses the file name of a fastq path into FastqName(read, lane, sample, barcode, mate)
+
+        parse_fastq_name('/igo/delivery/P-01_IGO_12345_1_S12_L002_R1_001.fastq.gz')
+        FastqName(read='R1', lane='002', sample='P-01_IGO_12345_1', barcode='P-01_IGO_12345_1_S12_L002__001',
+                  mate='/igo/delivery/P-01_IGO_12345_1_S12_L002_R2_001.fastq.gz')
+
+    barcode is the name without the read and extensions, the same for both reads of a
+    pair, and mate the path of the other read. Fields which aren't in the name are None
+    """
+    dirname, file_name = os.path.split(path)
+    match = FASTQ_NAME_REGEX.match(file_name)
+    if not match:
+        return FastqName(None, None, None, file_name.split(os.extsep)[0], None)
+    start, end = match.span('read')
+    read = match.group('read')
+    mate = file_name[:start] + ('R2' if read == 'R1' else 'R1') + file_name[end:]
+    return FastqName(read, match.group('lane'), match.group('sample'),
+                     (file_name[:start] + file_name[end:]).split(os.extsep)[0], os.path.join(dirname, mate))
+
+
 def format_patient_id(patient_id):
     return patient_id
 
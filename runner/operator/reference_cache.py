@@ -0,0 +1,64 @@
+"""
+Process-level cache for the reference files operators read while building inputs
+
+Reference JSONs and input templates are loaded once per process and reused until
+the file's modification time changes, so edits to a deployed reference file are
+picked up without a restart.
+"""
+import os
+import json
+import logging
+import threading
+from jinja2 import Template
+
+LOGGER = logging.getLogger(__name__)
+
+_cache = dict()
+_lock = threading.Lock()
+
+
+def _load(path, loader):
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, loader)
+    entry = _cache.get(key)
+    if entry and entry[0] == mtime:
+        return entry[1]
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == mtime:
+            return entry[1]
+        LOGGER.debug("Loading reference file %s", path)
+        value = loader(path)
+        _cache[key] = (mtime, value)
+        return value
+
+
+def _read_json(path):
+    with open(path, 'rb') as f:
+        return json.load(f)
+
+
+def _read_template(path):
+    with open(path) as f:
+        return Template(f.read())
+
+
+def load_json(path):
+    """
+    Returns the parsed content of the JSON file at path. The same object is returned
+    to every caller, so it must not be modified
+    """
+    return _load(path, _read_json)
+
+
+def load_template(path):
+    """
+    Returns the jinja2 Template compiled from the file at path
+    """
+    return _load(path, _read_template)
+
+
+def clear():
+    with _lock:
+        _cache.clear()
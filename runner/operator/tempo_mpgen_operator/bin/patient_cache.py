@@ -0,0 +1,121 @@
+import os
+import glob
+import json
+import stat
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+class PatientCache:
+    """
+    On-disk cache of what the TempoMPGen operator outputs for each patient: its mapping,
+    pairing, tracker, unpaired and conflict rows and its serialized patient data
+
+    Each entry is a JSON document keyed by the patient id and a fingerprint of the
+    patient's files and historical pairing, so a patient has to be rebuilt and paired
+    again only when one of those changes. VERSION is part of the fingerprint; bump it
+    when the rows or the patient data written for a patient change.
+
+    Entries are written atomically, so concurrent operator runs can share the directory.
+    The directory must be private to the user running the operator; otherwise the cache
+    is disabled.
+    """
+    VERSION = 2
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        self.enabled = self._is_private()
+        if not self.enabled:
+            logger.warning("Patient cache %s is writable by other users, not using it", self.cache_dir)
+
+    def _is_private(self):
+        st = os.stat(self.cache_dir)
+        return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+    @classmethod
+    def fingerprint(cls, patient_id, files_digest, pairing):
+        """
+        files_digest is a digest of the ids, modified dates and paths of the patient's
+        files; pairing is a list of (tumor, normal) cmoSampleName tuples for the samples
+        of the patient
+        """
+        sha = hashlib.sha1()
+        sha.update(repr((cls.VERSION, patient_id, files_digest, sorted(pairing))).encode('utf-8'))
+        return sha.hexdigest()
+
+    def _patient_key(self, patient_id):
+        return hashlib.sha1(patient_id.encode('utf-8')).hexdigest()
+
+    def _path(self, patient_id, fingerprint):
+        return os.path.join(self.cache_dir, "%s.%s.json" % (self._patient_key(patient_id), fingerprint))
+
+    def get(self, patient_id, fingerprint):
+        """
+        Returns the cached entry of the patient, or None if it's missing
+        """
+        if not self.enabled:
+            self.misses += 1
+            return None
+        path = self._path(patient_id, fingerprint)
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+            if data.get('version') != self.VERSION or data.get('patient_id') != patient_id:
+                raise ValueError("entry is for version %s of %s" % (data.get('version'), data.get('patient_id')))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning("Could not load cached patient %s from %s: %s", patient_id, path, e)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data['entry']
+
+    def set(self, patient_id, fingerprint, entry):
+        """
+        Caches entry, a JSON serializable dict, and removes the older entries of the patient
+        """
+        if not self.enabled:
+            return
+        path = self._path(patient_id, fingerprint)
+        data = {'version': self.VERSION, 'patient_id': patient_id, 'entry': entry}
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(data, fh, separators=(',', ':'), default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning("Could not cache patient %s: %s", patient_id, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        for stale in glob.glob(os.path.join(self.cache_dir, "%s.*.json" % self._patient_key(patient_id))):
+            if stale != path:
+                self._remove(stale)
+
+    def evict(self, patient_ids):
+        """
+        Removes the entries of patients not in patient_ids; returns the number removed
+        """
+        if not self.enabled:
+            return 0
+        keep = set(self._patient_key(patient_id) for patient_id in patient_ids)
+        evicted = 0
+        for path in glob.glob(os.path.join(self.cache_dir, "*.json")):
+            if os.path.basename(path).split('.', 1)[0] not in keep:
+                evicted += self._remove(path)
+        return evicted
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            return 0
+        return 1
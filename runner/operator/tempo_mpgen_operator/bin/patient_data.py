@@ -0,0 +1,184 @@
+"""
+Versioned serialization of TempoMPGen patient, sample and pairing data
+
+Patients are written as NDJSON, one patient per line, with a JSON index next to it
+holding the byte offset and length of every patient's line. Reading only needs the
+standard library, so downstream steps can use PatientDataReader without importing
+beagle; patients are loaded lazily, one line at a time.
+
+patients_data.ndjson
+    {"version": 1, "patient_id": ..., "samples": {...}, "pairs": [...], ...}
+
+patients_data.ndjson.idx
+    {"format": "tempo_mpgen_patients", "version": 1, "count": N,
+     "patients": {"<patient_id>": [offset, length], ...}}
+
+patients_data_pickle
+    pickled dict of patient_id -> Patient, for pipeline versions which read pickle_data;
+    assembled from per patient pickles by write_pickled_patients
+"""
+import os
+import json
+import pickle
+
+FORMAT = "tempo_mpgen_patients"
+VERSION = 1
+INDEX_SUFFIX = ".idx"
+
+
+def sample_to_dict(sample):
+    """
+    Serializable representation of a TempoSample
+    """
+    return {
+        'sample_name': sample.sample_name,
+        'cmo_sample_name': sample.cmo_sample_name,
+        'patient_id': sample.patient_id,
+        'sample_class': sample.sample_class,
+        'specimen_type': sample.specimen_type,
+        'bait_set': sample.bait_set,
+        'run_mode': sample.run_mode,
+        'conflict': sample.conflict,
+        'conflict_fields': sample.conflict_fields,
+        'metadata': sample.metadata,
+        'fastqs': {
+            'paired': sample.fastqs.paired,
+            'r1': [f.path for f in sample.fastqs.r1],
+            'r2': [f.path for f in sample.fastqs.r2]
+        }
+    }
+
+
+def patient_to_dict(patient_id, patient):
+    """
+    Serializable representation of a Patient; samples are stored once and referenced by
+    sample name from the tumor/normal/conflict lists and pairs
+    """
+    samples = dict()
+    for sample_name in patient._samples:
+        samples[sample_name] = sample_to_dict(patient._samples[sample_name])
+    return {
+        'version': VERSION,
+        'patient_id': patient_id,
+        'samples': samples,
+        'tumor_samples': list(patient.tumor_samples),
+        'normal_samples': list(patient.normal_samples),
+        'conflict_samples': list(patient.conflict_samples),
+        'unpaired_samples': [sample.sample_name for sample in patient.unpaired_samples],
+        'pairs': [{'tumor': tumor.sample_name, 'normal': normal.sample_name}
+                  for tumor, normal in patient.sample_pairing]
+    }
+
+
+def write_patients(patients, path):
+    """
+    Writes patients (dict of patient_id -> Patient) to path, and its index to path + .idx
+    """
+    return write_records((patient_to_dict(patient_id, patients[patient_id]) for patient_id in patients), path)
+
+
+def write_records(records, path):
+    """
+    Writes records, as returned by patient_to_dict, to path, and its index to path + .idx
+    """
+    index = dict()
+    offset = 0
+    with open(path, 'wb') as fh:
+        for data in records:
+            line = (json.dumps(data, separators=(',', ':'), default=str) + "\n").encode('utf-8')
+            fh.write(line)
+            index[data['patient_id']] = [offset, len(line)]
+            offset += len(line)
+    with open(path + INDEX_SUFFIX, 'w') as fh:
+        json.dump({'format': FORMAT, 'version': VERSION, 'count': len(index), 'patients': index}, fh)
+    return path, path + INDEX_SUFFIX
+
+
+def write_pickled_patients(pickled_patients, path):
+    """
+    Writes the pickle of a dict of patient_id -> Patient to path, from (patient_id, pickle)
+    pairs where each pickle is pickle.dumps(patient, protocol=2)
+
+    The dict is framed around the pickled patients, which are copied without being
+    unpickled; each pickle only refers to the objects it stores itself, so reusing memo
+    indexes across patients is safe
+    """
+    with open(path, 'wb') as fh:
+        # PROTO 2, EMPTY_DICT, MARK
+        fh.write(b'\x80\x02}(')
+        for patient_id, pickled in pickled_patients:
+            fh.write(_pickle_body(pickle.dumps(patient_id, protocol=2)))
+            fh.write(_pickle_body(pickled))
+        # SETITEMS, STOP
+        fh.write(b'u.')
+    return path
+
+
+def _pickle_body(pickled):
+    if pickled[:2] != b'\x80\x02' or pickled[-1:] != b'.':
+        raise ValueError("Expected a protocol 2 pickle")
+    return pickled[2:-1]
+
+
+class PatientDataReader:
+    """
+    Lazy reader for patient data written by write_patients
+
+        reader = PatientDataReader("patients_data.ndjson")
+        for patient_id in reader.patient_ids():
+            patient = reader.get(patient_id)
+
+    Without an index file, the index is built by reading the file once
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            if os.path.exists(self.index_path):
+                with open(self.index_path) as fh:
+                    data = json.load(fh)
+                if data.get('format') != FORMAT:
+                    raise ValueError("%s is not a TempoMPGen patient data index" % self.index_path)
+                if data.get('version') != VERSION:
+                    raise ValueError("Unsupported TempoMPGen patient data version %s" % data.get('version'))
+                self._index = data['patients']
+            else:
+                self._index = dict()
+                offset = 0
+                with open(self.path, 'rb') as fh:
+                    for line in fh:
+                        self._index[json.loads(line)['patient_id']] = [offset, len(line)]
+                        offset += len(line)
+        return self._index
+
+    def patient_ids(self):
+        return list(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, patient_id):
+        return patient_id in self.index
+
+    def get(self, patient_id):
+        """
+        Returns the patient dict for patient_id, or None if it's not in the file
+        """
+        entry = self.index.get(patient_id)
+        if not entry:
+            return None
+        offset, length = entry
+        with open(self.path, 'rb') as fh:
+            fh.seek(offset)
+            return json.loads(fh.read(length))
+
+    def __iter__(self):
+        with open(self.path, 'rb') as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
@@ -113,20 +113,17 @@ class Patient:
         except:
             return None
 
-    def create_mapping_string(self):
-        s = ""
+    def get_mapping_rows(self):
         seen = set()
         for pair in self.sample_pairing:
             tumor_sample = pair[0]
             normal_sample = pair[1]
-            s +=  self.get_mapping_string(tumor_sample)
+            yield from self.get_sample_mapping_rows(tumor_sample)
             if normal_sample not in seen:
-                s +=  self.get_mapping_string(normal_sample)
+                yield from self.get_sample_mapping_rows(normal_sample)
                 seen.add(normal_sample)
-        return s
 
-    def get_mapping_string(self, sample):
-        s = ""
+    def get_sample_mapping_rows(self, sample):
         target = sample.bait_set
         fastqs = sample.fastqs
         cmo_sample_name = sample.cmo_sample_name
@@ -135,26 +132,19 @@ class Patient:
             for i in range(0, num_fq_pairs):
                 r1 = fastqs.r1[i].path
                 r2 = fastqs.r2[i].path
-                s += "%s\t%s\t%s\t%s\t%i\n" % (cmo_sample_name, target, r1, r2, num_fq_pairs)
-        return s
-
-    def create_pairing_string(self):
-        pairing = ""
-        if self.sample_pairing:
-            for pair in self.sample_pairing:
-                tumor = pair[0].cmo_sample_name
-                normal = pair[1].cmo_sample_name
-                pairing += "%s\t%s\n" % (normal, tumor)
-        return pairing
+                yield [cmo_sample_name, target, r1, r2, num_fq_pairs]
 
+    def get_pairing_rows(self):
+        for pair in self.sample_pairing:
+            tumor = pair[0].cmo_sample_name
+            normal = pair[1].cmo_sample_name
+            yield [normal, tumor]
 
-    def create_unpaired_string(self, fields):
-        s = ""
+    def get_unpaired_rows(self, fields):
         for sample in self.unpaired_samples:
             data = [ ";".join(list(set(sample.metadata[field]))).strip() for field in fields ] # hack; probably need better way to map fields to unpaired txt file
             possible_reason = self._get_possible_reason(sample)
-            s += "\n" + "\t".join(data) + "\t" + possible_reason
-        return s
+            yield data + [possible_reason]
 
     def _get_possible_reason(self, sample):
         num_normals = len(self.normal_samples)
@@ -183,8 +173,7 @@ class Patient:
                 return "Sample run date first half of 2017; normal may have been sequenced in 2016?"
         return ""
 
-    def create_conflict_string(self, fields):
-        s = ""
+    def get_conflict_rows(self, fields):
         for sample_name in self.conflict_samples:
             sample = self.conflict_samples[sample_name]
             data = [ ";".join(list(set(sample.metadata[field]))).strip() for field in fields ] # hack; probably need better way to map fields to unpaired txt file
@@ -195,5 +184,4 @@ class Patient:
                     conflicts.append("no sample class")
             multiple_values = [ "" + field + "[" + ";".join(list(set(sample.metadata[field]))).strip() + "]" for field in sample.conflict_fields ]
             conflicts = conflicts + multiple_values
-            s += "\n" + "\t".join(data) + "\t" + ";".join(conflicts)
-        return s
+            yield data + [";".join(conflicts)]
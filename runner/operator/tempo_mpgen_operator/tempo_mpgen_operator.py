@@ -1,14 +1,22 @@
 import uuid
 import re
 import os
+import base64
+import pickle
 import logging
-from django.db.models import Q
+from django.db.models import Q, Func, Value, CharField, TextField
+from django.db.models.functions import Cast, Concat
+from django.contrib.postgres.aggregates import ArrayAgg, StringAgg
+from django.contrib.postgres.fields.jsonb import KeyTextTransform
 from file_system.models import File, FileGroup, FileType
 from rest_framework import serializers
 from runner.operator.operator import Operator
 from runner.serializers import APIRunCreateSerializer
 import runner.operator.tempo_mpgen_operator.bin.tempo_sample as sample_obj
 import runner.operator.tempo_mpgen_operator.bin.tempo_patient as patient_obj
+from runner.operator.tempo_mpgen_operator.bin.patient_cache import PatientCache
+from runner.operator.tempo_mpgen_operator.bin.patient_data import patient_to_dict, write_records, \
+    write_pickled_patients
 from notifier.events import OperatorRequestEvent
 from notifier.models import JobGroup
 from notifier.tasks import send_notification
@@ -18,8 +26,8 @@ from runner.models import Pipeline
 from django.conf import settings
 import json
 import csv
+import shutil
 from pathlib import Path
-import pickle
 import uuid
 from beagle import __version__
 from datetime import datetime
@@ -30,6 +38,14 @@ PAIRING_FILE_LOCATION = os.path.join(WORKDIR,'reference_jsons/pairing.tsv') # us
 logger = logging.getLogger(__name__)
 
 class TempoMPGenOperator(Operator):
+    PATIENT_CHUNK_SIZE = 500
+    SAMPLE_FIELDS = ['cmoSampleName', 'patientId', 'sampleId', 'specimenType', 'runMode', 'sampleClass', 'baitSet',
+                     'runDate']
+    TRACKER_KEY_ORDER = ["investigatorSampleId", "externalSampleId", "sampleClass", "baitSet", "requestId"]
+    TRACKER_EXTRA_KEYS = ["tumorOrNormal", "species", "recipe", "specimenType", "sampleId", "patientId",
+                          "investigatorName", "investigatorEmail", "piEmail", "labHeadName", "labHeadEmail",
+                          "preservation", "dataAnalystName", "dataAnalystEmail", "projectManagerName", "sampleName"]
+
     def build_recipe_query(self):
         """
         Build complex Q object assay query from given data
@@ -112,26 +128,7 @@ class TempoMPGenOperator(Operator):
                     tumor_id = tumor_samples[i]
                     normal_id = normal_samples[i]
                     pre_pairing[tumor_id] = normal_id
-        patient_ids = set()
-        patient_files = dict()
-        no_patient_samples = list()
-        for entry in tempo_files:
-            patient_id = entry.metadata['patientId']
-            if patient_id:
-                patient_ids.add(patient_id)
-                if patient_id not in patient_files:
-                    patient_files[patient_id] = list()
-                patient_files[patient_id].append(entry)
-            else:
-                no_patient_samples.append(entry)
-
-        self.patients = dict()
-        self.non_cmo_patients = dict()
-        for patient_id in patient_files:
-            if "C-" in patient_id[:2]:
-                self.patients[patient_id] = patient_obj.Patient(patient_id, patient_files[patient_id], pre_pairing)
-            else:
-                self.non_cmo_patients[patient_id] = patient_obj.Patient(patient_id, patient_files[patient_id])
+        self.patients = self.get_patients(tempo_files, pre_pairing)
 
         input_json = dict()
         # output these strings to file
@@ -141,13 +138,23 @@ class TempoMPGenOperator(Operator):
         input_json['pairing_data'] = self.create_pairing_file()
         input_json['tracker_data'] = self.create_tracker_file()
 
-        pickle_file = os.path.join(self.OUTPUT_DIR, "patients_data_pickle")
-        fh = open(pickle_file, 'wb')
-        pickle.dump(self.patients, fh)
+        pickle_file = write_pickled_patients(((patient_id, base64.b64decode(entry['pickle']))
+                                              for patient_id, entry in self.patients.items()),
+                                             os.path.join(self.OUTPUT_DIR, "patients_data_pickle"))
         os.chmod(pickle_file, 0o777)
         self.register_tmp_file(pickle_file)
 
+        patients_file, index_file = write_records((entry['record'] for entry in self.patients.values()),
+                                                  os.path.join(self.OUTPUT_DIR, "patients_data.ndjson"))
+        for output in (patients_file, index_file):
+            os.chmod(output, 0o777)
+            self.register_tmp_file(output)
+
+        # pipeline versions which unpickle pickle_data keep working; newer ones read
+        # patients_data, with its index as a secondary file
         input_json['pickle_data'] = { 'class': 'File', 'location': "juno://" + pickle_file }
+        input_json['patients_data'] = {'class': 'File', 'location': "juno://" + patients_file,
+                                       'secondaryFiles': [{'class': 'File', 'location': "juno://" + index_file}]}
 
         beagle_version = __version__
         run_date = datetime.now().strftime("%Y%m%d_%H:%M:%f")
@@ -175,6 +182,89 @@ class TempoMPGenOperator(Operator):
         return tempo_mpgen_outputs_job
 
 
+    def get_patients(self, tempo_files, pre_pairing):
+        """
+        Returns the entry (see build_patient_entry) of every CMO patient in tempo_files,
+        by patient id
+
+        Entries are cached by a fingerprint of the patient's files and historical pairing;
+        only patients whose fingerprint changed since the last run have their metadata
+        loaded, and are built and paired again
+        """
+        entries = dict()
+        patient_cache = PatientCache(settings.TEMPO_MPGEN_CACHE_DIR)
+        rebuild = dict()
+        for patient_id, files_digest, cmo_sample_names in self.get_patient_digests(tempo_files):
+            pairing = self.get_patient_pairing(cmo_sample_names, pre_pairing)
+            fingerprint = PatientCache.fingerprint(patient_id, files_digest, pairing.items())
+            entry = patient_cache.get(patient_id, fingerprint)
+            if entry is None:
+                rebuild[patient_id] = (fingerprint, pairing)
+            else:
+                entries[patient_id] = entry
+
+        patient_ids = list(rebuild)
+        patient_files = dict()
+        for i in range(0, len(patient_ids), self.PATIENT_CHUNK_SIZE):
+            query = Q()
+            for patient_id in patient_ids[i:i + self.PATIENT_CHUNK_SIZE]:
+                query |= Q(metadata__patientId=patient_id)
+            for entry in tempo_files.filter(query).select_related('file'):
+                patient_files.setdefault(entry.metadata['patientId'], list()).append(entry)
+        for patient_id, (fingerprint, pairing) in rebuild.items():
+            patient = patient_obj.Patient(patient_id, patient_files.get(patient_id, []), pairing)
+            entries[patient_id] = self.build_patient_entry(patient_id, patient)
+            patient_cache.set(patient_id, fingerprint, entries[patient_id])
+        evicted = patient_cache.evict(entries)
+        logger.info("TempoMPGen patients: %i unchanged, %i rebuilt, %i evicted from cache",
+                    len(entries) - len(rebuild), len(rebuild), evicted)
+        return {patient_id: entries[patient_id] for patient_id in sorted(entries)}
+
+
+    def get_patient_digests(self, tempo_files):
+        """
+        For each CMO patient, the patient id, an MD5 of the ids, modified dates and paths
+        of its files and the cmoSampleNames of its files; computed by the database, one
+        row per patient, so unchanged patients are recognized without loading their files
+        """
+        file_key = Concat(Cast('id', TextField()), Value('|'), Cast('modified_date', TextField()), Value('|'),
+                          'file__path', output_field=TextField())
+        return tempo_files.filter(metadata__patientId__startswith="C-").order_by() \
+            .annotate(patient_id=KeyTextTransform('patientId', 'metadata')) \
+            .values('patient_id') \
+            .annotate(files_digest=Func(StringAgg(file_key, delimiter=',', ordering=('id',)), function='MD5',
+                                        output_field=CharField()),
+                      cmo_sample_names=ArrayAgg(KeyTextTransform('cmoSampleName', 'metadata'), distinct=True)) \
+            .values_list('patient_id', 'files_digest', 'cmo_sample_names')
+
+
+    def get_patient_pairing(self, cmo_sample_names, pre_pairing):
+        """
+        Historical pairing for the tumors of a patient, by cmoSampleName
+        """
+        pairing = dict()
+        for cmo_sample_name in cmo_sample_names:
+            if isinstance(cmo_sample_name, str) and cmo_sample_name in pre_pairing:
+                pairing[cmo_sample_name] = pre_pairing[cmo_sample_name]
+        return pairing
+
+
+    def build_patient_entry(self, patient_id, patient):
+        """
+        Everything written for a patient: its rows of the mapping, pairing, tracker,
+        unpaired and conflict files, its patients_data record and its pickle
+        """
+        return {
+            'mapping': list(patient.get_mapping_rows()),
+            'pairing': list(patient.get_pairing_rows()),
+            'tracker': list(self.get_patient_tracker_rows(patient)),
+            'unpaired': list(patient.get_unpaired_rows(self.SAMPLE_FIELDS)),
+            'conflict': list(patient.get_conflict_rows(self.SAMPLE_FIELDS)),
+            'record': patient_to_dict(patient_id, patient),
+            'pickle': base64.b64encode(pickle.dumps(patient, protocol=2)).decode('ascii')
+        }
+
+
     def load_pairing_file(self, tsv_file):
         pairing = dict()
         with open(tsv_file, 'r') as pairing_file:
@@ -193,30 +283,33 @@ class TempoMPGenOperator(Operator):
         return pairing
 
 
-    def write_to_file(self,fname,s):
+    def write_to_file(self, fname, header, rows):
         """
-        Writes file to temporary location, then registers it to the temp file group
-        Also uploads it to notifier if there is a job group id
+        Streams the header and rows as a tab-delimited file to temporary location, then
+        registers it to the temp file group
+        Also uploads it to notifier if there is a job group id; the notifier reads the file
+        from its path, so the content isn't sent through the queue
         """
         output = os.path.join(self.OUTPUT_DIR, fname)
-        with open(output, "w+") as fh:
-            fh.write(s)
+        with open(output, "w", newline='') as fh:
+            writer = csv.writer(fh, delimiter='\t', lineterminator='\n', quoting=csv.QUOTE_NONE,
+                                quotechar=None, escapechar='\\')
+            writer.writerow(header)
+            writer.writerows(rows)
         os.chmod(output, 0o777)
         self.register_tmp_file(output)
         if self.job_group_notifier_id:
-            upload_file_event = UploadAttachmentEvent(self.job_group_notifier_id, fname, s).to_dict()
+            upload_file_event = UploadAttachmentEvent(self.job_group_notifier_id, fname, output).to_dict()
             send_notification.delay(upload_file_event)
         return { 'class': 'File', 'location': "juno://" + output }
 
 
-    def write_historical_pairing_file(self,pairing_file_str):
+    def write_historical_pairing_file(self, pairing_file):
         """
-        Writes file to temporary location, then registers it to the temp file group
-        Also uploads it to notifier if there is a job group id
+        Copies the pairing file to the historical pairing location
         """
         output = PAIRING_FILE_LOCATION
-        with open(output, "w+") as fh:
-            fh.write(pairing_file_str)
+        shutil.copyfile(pairing_file, output)
         os.chmod(output, 0o777)
 
 
@@ -236,13 +329,8 @@ class TempoMPGenOperator(Operator):
 
 
     def create_unpaired_txt_file(self):
-        # Add runDate
-        fields = [ 'cmoSampleName', 'patientId', 'sampleId', 'specimenType', 'runMode', 'sampleClass', 'baitSet', 'runDate' ]
-        unpaired_string = "\t".join(fields) + "\tPossible Reason?"
-        for patient_id in self.patients:
-            patient = self.patients[patient_id]
-            unpaired_string += patient.create_unpaired_string(fields)
-        return self.write_to_file('sample_unpaired.txt', unpaired_string)
+        rows = (row for entry in self.patients.values() for row in entry['unpaired'])
+        return self.write_to_file('sample_unpaired.txt', self.SAMPLE_FIELDS + ["Possible Reason?"], rows)
 
 
     def send_message(self, msg):
@@ -274,28 +362,21 @@ class TempoMPGenOperator(Operator):
 
 
     def create_mapping_file(self):
-        mapping_string = "SAMPLE\tTARGET\tFASTQ_PE1\tFASTQ_PE2\tNUM_OF_PAIRS\n"
-        for patient_id in self.patients:
-            patient = self.patients[patient_id]
-            mapping_string += patient.create_mapping_string()
-        return self.write_to_file('sample_mapping.txt', mapping_string)
+        header = ["SAMPLE", "TARGET", "FASTQ_PE1", "FASTQ_PE2", "NUM_OF_PAIRS"]
+        rows = (row for entry in self.patients.values() for row in entry['mapping'])
+        return self.write_to_file('sample_mapping.txt', header, rows)
 
 
-    def create_conflict_samples_txt_file(self):       
-        fields = [ 'cmoSampleName', 'patientId', 'sampleId', 'specimenType', 'runMode', 'sampleClass', 'baitSet', 'runDate' ]
-        conflict_string = "\t".join(fields) + "\t" + "Conflict Reason"
-        for patient_id in self.patients:
-            patient = self.patients[patient_id]
-            conflict_string += patient.create_conflict_string(fields)
-        return self.write_to_file('sample_conflict.txt', conflict_string)
+    def create_conflict_samples_txt_file(self):
+        rows = (row for entry in self.patients.values() for row in entry['conflict'])
+        return self.write_to_file('sample_conflict.txt', self.SAMPLE_FIELDS + ["Conflict Reason"], rows)
 
 
     def create_pairing_file(self):
-        pairing_string = "NORMAL_ID\tTUMOR_ID\n"
-        for patient_id in self.patients:
-            pairing_string += self.patients[patient_id].create_pairing_string()
-        self.write_historical_pairing_file(pairing_string)
-        return self.write_to_file('sample_pairing.txt', pairing_string)
+        rows = (row for entry in self.patients.values() for row in entry['pairing'])
+        pairing_file = self.write_to_file('sample_pairing.txt', ["NORMAL_ID", "TUMOR_ID"], rows)
+        self.write_historical_pairing_file(os.path.join(self.OUTPUT_DIR, 'sample_pairing.txt'))
+        return pairing_file
 
 
     def exclude_requests(self,l):
@@ -314,59 +395,49 @@ class TempoMPGenOperator(Operator):
 
     def create_tracker_file(self):
         """
-        Creates the string for tracker
+        Creates the tracker file
 
-        String is tab-delimited; special consideration taken so that the first two columns
+        File is tab-delimited; special consideration taken so that the first two columns
         is the Tumor/Normal pairing (if the row Sample is a tumor) or 
         Normal/"N/A" (if row sample is a normal)
 
-        The rest of the columns follow the metadata field names in the order set in lists key_order and extra_keys
+        The rest of the columns follow the metadata field names in the order set in lists TRACKER_KEY_ORDER
+        and TRACKER_EXTRA_KEYS
 
-        key_order has specifically formatted header values, as defined by the PMs, so they needed to be separate;
-        extra_keys values are the metadata field names in the database, used as headers
+        TRACKER_KEY_ORDER has specifically formatted header values, as defined by the PMs, so they needed to be
+        separate; TRACKER_EXTRA_KEYS values are the metadata field names in the database, used as headers
         """
-        tracker = ""
-        key_order = [ "investigatorSampleId", "externalSampleId", "sampleClass" ]
-        key_order += [ "baitSet", "requestId" ]
-        extra_keys = [ "tumorOrNormal", "species", "recipe", "specimenType", "sampleId", "patientId" ]
-        extra_keys += [ "investigatorName", "investigatorEmail", "piEmail", "labHeadName", "labHeadEmail", "preservation" ]
-        extra_keys += [ "dataAnalystName", "dataAnalystEmail", "projectManagerName", "sampleName" ]
+        header = [ "CMO_Sample_ID", "Matching_normal", "Collaborator_ID_(or_DMP_Sample_ID)",
+                   "Historical_Investigator_ID_(for_CCS_use)", "Sample_Class_(T/N)",
+                   "Bait_set_(Agilent/_IDT/WGS)", "IGO_Request_ID_(Project_ID)" ] + self.TRACKER_EXTRA_KEYS
+        return self.write_to_file('sample_tracker.txt', header, self.get_tracker_rows())
+
 
+    def get_tracker_rows(self):
+        """
+        Tracker rows of all patients; a normal paired in several patients is listed once
+        """
+        seen = set()
+        for entry in self.patients.values():
+            for row in entry['tracker']:
+                if row[1] == "N/A":
+                    if row[0] in seen:
+                        continue
+                    seen.add(row[0])
+                yield row
 
-        tracker = "CMO_Sample_ID\tMatching_normal\tCollaborator_ID_(or_DMP_Sample_ID)\tHistorical_Investigator_ID_(for_CCS_use)\tSample_Class_(T/N)\tBait_set_(Agilent/_IDT/WGS)\tIGO_Request_ID_(Project_ID)\t"
-        for key in extra_keys:
-            tracker += key + "\t"
-        tracker = tracker.strip() + "\n"
 
+    def get_patient_tracker_rows(self, patient):
+        keys = self.TRACKER_KEY_ORDER + self.TRACKER_EXTRA_KEYS
         seen = set()
+        for pair in patient.sample_pairing:
+            normal = pair[1]
+            tumor = pair[0]
+            n_meta = normal.dedupe_metadata_values()
+            t_meta = tumor.dedupe_metadata_values()
+
+            yield [tumor.cmo_sample_name, normal.cmo_sample_name] + [t_meta[key] for key in keys]
 
-        for patient_id in self.patients:
-            patient = self.patients[patient_id]
-            for pair in patient.sample_pairing:
-                normal = pair[1]
-                tumor = pair[0]
-                n_meta = normal.dedupe_metadata_values()
-                t_meta = tumor.dedupe_metadata_values()
-
-                running = list()
-                running.append(tumor.cmo_sample_name)
-                running.append(normal.cmo_sample_name)
-
-                for key in key_order:
-                    running.append(t_meta[key])
-                for key in extra_keys:
-                    running.append(t_meta[key])
-
-                tracker += "\t".join(running) + "\n"
-
-                if normal.cmo_sample_name not in seen:
-                    seen.add(normal.cmo_sample_name)
-                    running_normal = list()
-                    running_normal.append(normal.cmo_sample_name)
-                    running_normal.append("N/A")
-                    for key in key_order:
-                        running_normal.append(n_meta[key])
-                    for key in extra_keys:
-                        running_normal.append(n_meta[key])
-                    tracker += "\t".join(running_normal) + "\n"
-        return self.write_to_file('sample_tracker.txt', tracker)
+            if normal.cmo_sample_name not in seen:
+                seen.add(normal.cmo_sample_name)
+                yield [normal.cmo_sample_name, "N/A"] + [n_meta[key] for key in keys]
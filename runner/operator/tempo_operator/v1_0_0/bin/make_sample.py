@@ -1,5 +1,6 @@
 import logging
 import re
+from runner.operator.helper import parse_fastq_name
 logger = logging.getLogger(__name__)
 
 
@@ -46,7 +47,7 @@ def check_samples(samples):
         r1 = samples[rg_id]['R1']
         r2 = samples[rg_id]['R2']
 
-        expected_r2 = 'R2'.join(r1.rsplit('R1', 1))
+        expected_r2 = parse_fastq_name(r1).mate
         if expected_r2 != r2:
             logging.error("Mismatched fastqs! Check data:")
             logging.error("R1: %s" % r1)
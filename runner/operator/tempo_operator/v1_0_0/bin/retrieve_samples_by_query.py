@@ -1,6 +1,7 @@
 from django.db.models import Prefetch
 from file_system.models import File, FileMetadata
 from file_system.repository.file_repository import FileRepository
+from runner.operator.helper import group_files_by_sample
 from .make_sample import build_sample, remove_with_caveats
 import logging
 logger = logging.getLogger(__name__)
@@ -9,26 +10,9 @@ logger = logging.getLogger(__name__)
 def get_samples_from_patient_id(patient_id):
     files = FileRepository.filter(metadata={'patientId': patient_id})
 
-    data = list()
-    for f in files:
-        sample = dict()
-        sample['id'] = f.file.id
-        sample['path'] = f.file.path
-        sample['file_name'] = f.file.file_name
-        sample['metadata'] = f.metadata
-        data.append(sample)
-
     samples = list()
-    # group by igoId
-    igo_id_group = dict()
-    for sample in data:
-        igo_id = sample['metadata']['sampleId']
-        if igo_id not in igo_id_group:
-            igo_id_group[igo_id] = list()
-        igo_id_group[igo_id].append(sample)
-
-    for igo_id in igo_id_group:
-        samples.append(build_sample(igo_id_group[igo_id]))
+    for sample_files in group_files_by_sample(files):
+        samples.append(build_sample(sample_files))
     samples, bad_samples = remove_with_caveats(samples)
     if len(bad_samples) > 0:
         logger.warning('Some samples for patient query %s have invalid %i values' % (patient_id, len(bad_samples)))
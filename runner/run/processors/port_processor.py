@@ -226,5 +226,6 @@ class PortProcessor(object):
         if job_group:
             event = UploadAttachmentEvent(str(job_group.id), file_name, path, download=True)
             send_notification.delay(event.to_dict())
-        logger.info("Can't upload file:%s. JobGroup not specified", path)
+        else:
+            logger.info("Can't upload file:%s. JobGroup not specified", path)
         return val
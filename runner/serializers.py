@@ -1,4 +1,5 @@
 import os
+import uuid
 import datetime
 from django.conf import settings
 from rest_framework import serializers
@@ -72,6 +73,12 @@ class RunApiListSerializer(serializers.Serializer):
 
     run_distribution = serializers.CharField(required=False)
 
+    run_facets = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=True,
+        required=False
+    )
+
     run = serializers.ListField(
         child=serializers.CharField(validators=[ValidateDict]),
         allow_empty=True,
@@ -319,6 +326,65 @@ class APIRunCreateSerializer(serializers.Serializer):
         run.save()
         return run
 
+    @classmethod
+    def bulk_create(cls, run_serializers, **kwargs):
+        """
+        Creates the runs of a list of validated serializers, like calling save(**kwargs)
+        on each of them. Pipelines, operator runs, job groups and job group notifiers are
+        looked up once for all runs, and the runs are inserted with one query
+        """
+        data = list()
+        for serializer in run_serializers:
+            validated_data = dict(serializer.validated_data, **kwargs)
+            for key in ('app', 'operator_run_id', 'job_group_id', 'job_group_notifier_id'):
+                if validated_data.get(key):
+                    validated_data[key] = uuid.UUID(str(validated_data[key]))
+            data.append(validated_data)
+        pipelines = Pipeline.objects.select_related('operator').in_bulk(set([d.get('app') for d in data]))
+        operator_runs = OperatorRun.objects.in_bulk(set([d['operator_run_id'] for d in data
+                                                         if d.get('operator_run_id')]))
+        job_group_ids = set([d['job_group_id'] for d in data if d.get('job_group_id')])
+        job_groups = JobGroup.objects.in_bulk(job_group_ids)
+        job_group_notifiers = JobGroupNotifier.objects.in_bulk(set([d['job_group_notifier_id'] for d in data
+                                                                    if d.get('job_group_notifier_id')]))
+        notifier_ids = set([p.operator.notifier_id for p in pipelines.values() if p.operator])
+        operator_notifiers = dict()
+        for job_group_notifier in JobGroupNotifier.objects.filter(job_group_id__in=job_group_ids,
+                                                                  notifier_type_id__in=notifier_ids):
+            operator_notifiers[(job_group_notifier.job_group_id, job_group_notifier.notifier_type_id)] = \
+                job_group_notifier
+
+        create_date = datetime.datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
+        runs = list()
+        for serializer, validated_data in zip(run_serializers, data):
+            pipeline = pipelines.get(validated_data.get('app'))
+            if not pipeline:
+                raise serializers.ValidationError("Unknown pipeline: %s" % validated_data.get('app'))
+            name = "Run %s: %s" % (pipeline.name, create_date)
+            if validated_data.get('name'):
+                name = validated_data.get('name') + ' (' + create_date + ')'
+            run = Run(name=name,
+                      app=pipeline,
+                      status=RunStatus.CREATING,
+                      job_statuses=dict(),
+                      output_metadata=validated_data.get('output_metadata', {}),
+                      tags=validated_data.get('tags'),
+                      resume=validated_data.get('resume'),
+                      operator_run=operator_runs.get(validated_data.get('operator_run_id')),
+                      job_group=job_groups.get(validated_data.get('job_group_id')),
+                      job_group_notifier=job_group_notifiers.get(validated_data.get('job_group_notifier_id')),
+                      notify_for_outputs=validated_data.get('notify_for_outputs', []))
+            # bulk_create doesn't call Run.save, which sets the default output directory
+            run.output_directory = validated_data.get('output_directory') or \
+                os.path.join(pipeline.output_directory, str(run.id))
+            if pipeline.operator:
+                run.job_group_notifier = operator_notifiers.get((validated_data.get('job_group_id'),
+                                                                 pipeline.operator.notifier_id),
+                                                                run.job_group_notifier)
+            serializer.instance = run
+            runs.append(run)
+        return Run.objects.bulk_create(runs)
+
 
 class RequestIdOperatorSerializer(serializers.Serializer):
     request_ids = serializers.ListField(
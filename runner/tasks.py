@@ -3,20 +3,21 @@ import logging
 import requests
 import datetime
 from urllib.parse import urljoin
-from celery import shared_task
+from celery import shared_task, group
 from django.conf import settings
-from django.db.models import Count
 from runner.run.objects.run_object import RunObject
 from .models import Run, RunStatus, PortType, OperatorRun, TriggerAggregateConditionType, TriggerRunType, Pipeline
 from notifier.events import RunFinishedEvent, OperatorRequestEvent, OperatorRunEvent, SetCIReviewEvent, \
     SetPipelineCompletedEvent, AddPipelineToDescriptionEvent, SetPipelineFieldEvent, OperatorStartEvent, SetLabelEvent, SetRunTicketInImportEvent
-from notifier.tasks import send_notification, notifier_start
+from notifier.tasks import send_notification, notifier_start, notify
+from notifier.notification_buffer import NotificationBuffer
 from runner.operator import OperatorFactory
 from beagle_etl.jobs import TYPES
 from beagle_etl.models import Operator, Job
 from runner.exceptions import RunCreateException
+from runner.serializers import APIRunCreateSerializer
 from notifier.models import JobGroup, JobGroupNotifier
-from file_system.repository import FileRepository
+from file_system.repository import FileRepository, FileQueryCache
 
 
 logger = logging.getLogger(__name__)
@@ -28,6 +29,11 @@ def create_jobs_from_operator(operator, job_group_id=None, job_group_notifier_id
 
 
 def create_operator_run_from_jobs(operator, jobs, job_group_id=None, job_group_notifier_id=None):
+    with NotificationBuffer():
+        _create_operator_run_from_jobs(operator, jobs, job_group_id, job_group_notifier_id)
+
+
+def _create_operator_run_from_jobs(operator, jobs, job_group_id=None, job_group_notifier_id=None):
     jg = None
     jgn = None
     try:
@@ -64,15 +70,17 @@ def create_operator_run_from_jobs(operator, jobs, job_group_id=None, job_group_n
     pipeline_description_event = AddPipelineToDescriptionEvent(job_group_notifier_id, pipeline_name,
                                                                pipeline_version,
                                                                pipeline_link).to_dict()
-    send_notification.delay(pipeline_description_event)
+    notify(pipeline_description_event)
 
     set_pipeline_field = SetPipelineFieldEvent(job_group_notifier_id, pipeline_name).to_dict()
-    send_notification.delay(set_pipeline_field)
-
-    for job in valid_jobs:
-        logger.info("Creating Run object")
-        run = job[0].save(operator_run_id=operator_run.id, job_group_id=job_group_id,
-                          job_group_notifier_id=job_group_notifier_id)
+    notify(set_pipeline_field)
+
+    logger.info("Creating %s Run objects", len(valid_jobs))
+    runs = APIRunCreateSerializer.bulk_create([job[0] for job in valid_jobs], operator_run_id=operator_run.id,
+                                              job_group_id=job_group_id,
+                                              job_group_notifier_id=job_group_notifier_id)
+    run_tasks = []
+    for run, job in zip(runs, valid_jobs):
         logger.info("Run object created with id: %s" % str(run.id))
         run_ids.append({"run_id": str(run.id), 'tags': run.tags, 'output_directory': run.output_directory})
         output_directory = run.output_directory
@@ -81,7 +89,8 @@ def create_operator_run_from_jobs(operator, jobs, job_group_id=None, job_group_n
             error_message = dict(details="Pipeline [ id: %s ] was not found.".format(pipeline_id))
             fail_job(run.id, error_message)
         else:
-            create_run_task.delay(str(run.id), job[1], output_directory)
+            run_tasks.append((str(run.id), job[1], output_directory))
+    dispatch_run_tasks(operator_run, run_tasks)
 
     if job_group_id:
         event = OperatorRunEvent(job_group_notifier_id,
@@ -90,14 +99,27 @@ def create_operator_run_from_jobs(operator, jobs, job_group_id=None, job_group_n
                                  pipeline_link,
                                  run_ids,
                                  str(operator_run.id)).to_dict()
-        send_notification.delay(event)
+        notify(event)
 
     for job in invalid_jobs:
         # TODO: Report this to JIRA ticket also
         logger.error("Job invalid: %s" % str(job[0].errors))
 
-    operator_run.status = RunStatus.RUNNING
-    operator_run.save()
+    OperatorRun.objects.filter(id=operator_run.id, status=RunStatus.CREATING).update(status=RunStatus.RUNNING)
+
+
+def dispatch_run_tasks(operator_run, run_tasks):
+    """
+    Sends create_run_task for (run_id, inputs, output_directory) tuples as Celery groups
+    of RUN_DISPATCH_CHUNK_SIZE tasks; the operator run is RUNNING once the first group
+    is sent
+    """
+    chunk_size = settings.RUN_DISPATCH_CHUNK_SIZE
+    for i in range(0, len(run_tasks), chunk_size):
+        chunk = run_tasks[i:i + chunk_size]
+        group([create_run_task.s(*run_task) for run_task in chunk]).apply_async()
+        logger.info("Dispatched %s runs of operator run %s", i + len(chunk), operator_run.id)
+        OperatorRun.objects.filter(id=operator_run.id, status=RunStatus.CREATING).update(status=RunStatus.RUNNING)
 
 
 @shared_task
@@ -121,11 +143,12 @@ def create_jobs_from_request(request_id, operator_id, job_group_id, job_group_no
                                             request_id=request_id,
                                             pipeline=pipeline)
 
-    _set_link_to_run_ticket(request_id, job_group_notifier_id)
+    with NotificationBuffer(), FileQueryCache():
+        _set_link_to_run_ticket(request_id, job_group_notifier_id)
 
-    generate_description(job_group_id, job_group_notifier_id, request_id)
-    generate_label(job_group_notifier_id, request_id)
-    create_jobs_from_operator(operator, job_group_id, job_group_notifier_id)
+        generate_description(job_group_id, job_group_notifier_id, request_id)
+        generate_label(job_group_notifier_id, request_id)
+        create_jobs_from_operator(operator, job_group_id, job_group_notifier_id)
 
 
 def _set_link_to_run_ticket(request_id, job_group_notifier_id):
@@ -145,7 +168,7 @@ def _set_link_to_run_ticket(request_id, job_group_notifier_id):
         logger.error("Could not find Import JIRA ticket")
         return
     event = SetRunTicketInImportEvent(job_notifier=str(job_group_notifier_job.id), run_jira_id=new_jira.jira_id).to_dict()
-    send_notification.delay(event)
+    notify(event)
 
 
 def _generate_summary(req):
@@ -155,9 +178,9 @@ def _generate_summary(req):
 
 
 def generate_description(job_group, job_group_notifier, request):
-    files = FileRepository.filter(metadata={'requestId': request, 'igocomplete': True})
+    files = FileRepository.filter_cached(metadata={'requestId': request, 'igocomplete': True})
     if files:
-        data = files.first().metadata
+        data = files[0].metadata
         request_id = data['requestId']
         recipe = data['recipe']
         a_name = data['dataAnalystName']
@@ -168,22 +191,22 @@ def generate_description(job_group, job_group_notifier, request):
         l_email = data['labHeadEmail']
         p_email = data['piEmail']
         pm_name = data['projectManagerName']
-        num_samples = len(files.order_by().values('metadata__cmoSampleName').annotate(n=Count("pk")))
-        num_tumors = len(FileRepository.filter(queryset=files, metadata={'tumorOrNormal': 'Tumor'}).order_by().values(
-                'metadata__cmoSampleName').annotate(n=Count("pk")))
-        num_normals = len(FileRepository.filter(queryset=files, metadata={'tumorOrNormal': 'Normal'}).order_by().values(
-                'metadata__cmoSampleName').annotate(n=Count("pk")))
+        num_samples = len(set(f.metadata.get('cmoSampleName') for f in files))
+        num_tumors = len(set(f.metadata.get('cmoSampleName') for f in files
+                             if f.metadata.get('tumorOrNormal') == 'Tumor'))
+        num_normals = len(set(f.metadata.get('cmoSampleName') for f in files
+                              if f.metadata.get('tumorOrNormal') == 'Normal'))
         operator_start_event = OperatorStartEvent(job_group_notifier, job_group, request_id, num_samples, recipe, a_name, a_email, i_name, i_email, l_name, l_email, p_email, pm_name, num_tumors, num_normals).to_dict()
-        send_notification.delay(operator_start_event)
+        notify(operator_start_event)
 
 
 def generate_label(job_group_id, request):
-    files = FileRepository.filter(metadata={'requestId': request, 'igocomplete': True})
+    files = FileRepository.filter_cached(metadata={'requestId': request, 'igocomplete': True})
     if files:
-        data = files.first().metadata
+        data = files[0].metadata
         recipe = data['recipe']
         recipe_label_event = SetLabelEvent(job_group_id, recipe).to_dict()
-        send_notification.delay(recipe_label_event)
+        notify(recipe_label_event)
 
 
 @shared_task
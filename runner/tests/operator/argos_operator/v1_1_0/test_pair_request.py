@@ -0,0 +1,357 @@
+import os
+from uuid import UUID
+from mock import patch
+from django.test import TestCase
+from runner.operator.argos_operator.v1_1_0.bin.pair_request import compile_pairs, build_normal_index, get_viable_normal
+from runner.operator.argos_operator.v1_1_0.bin.make_sample import get_run_date_range
+from runner.operator.argos_operator.v1_1_0.bin.retrieve_samples_by_query import PooledNormalResolver
+from file_system.models import File, FileMetadata, FileGroup, FileType, Sample
+from django.conf import settings
+from django.core.management import call_command
+
+"""
+Order of smart pairing
+Given a single tumor sample, find
+1. a normal sample that belongs to the same patient. This should be first from the same request, then should search across other requests and projects. We can get help from the IGO PMs on which other requests/projects should be searched for a custom request.
+2. a dmp normal bam to be pulled in for that patient if it exists.
+3. a closest related normal. (No code written yet)
+4. the appropriate pooled normal. This will be frozen or FFPE depending on the data_clinical information for that sample, and need to parse by assay used (impact/hemepact).
+"""
+
+
+class TestPairRequest(TestCase):
+    # load fixtures for the test case temp db
+    fixtures = [
+        "file_system.filegroup.json",
+        "file_system.filetype.json",
+        "file_system.storage.json"
+    ]
+
+    def create_fastq_sample(self, file_group_name, sample_id, patient_id, sample_name, tumor_or_normal,
+                            request_id, run_id="JAX_0397", preservation="Frozen"):
+        """
+        Create the R1 and R2 fastqs of a sample
+        """
+        file_group = FileGroup.objects.get(name=file_group_name)
+        fastq = FileType.objects.get(name="fastq")
+        sample = None
+        if file_group_name != "Pooled Normal":
+            sample = Sample.objects.create(sample_id=sample_id)
+        for r in ("R1", "R2"):
+            file_instance = File.objects.create(
+                file_type=fastq,
+                file_group=file_group,
+                sample=sample,
+                file_name="%s_%s_001.fastq.gz" % (sample_id, r),
+                path="/%s/%s_%s_001.fastq.gz" % (request_id, sample_id, r)
+            )
+            FileMetadata.objects.create(
+                file=file_instance,
+                metadata={
+                    "R": r,
+                    "runId": run_id,
+                    "recipe": "IMPACT468",
+                    "baitSet": "IMPACT468_BAITS",
+                    "runDate": "2019-12-12",
+                    "species": "Human",
+                    "sampleId": sample_id,
+                    "libraryId": sample_id,
+                    "patientId": patient_id,
+                    "requestId": request_id,
+                    "sequencingCenter": "MSKCC",
+                    "platform": "Illumina",
+                    "flowCellId": "HCYYWBBXY",
+                    "sampleName": sample_name,
+                    "labHeadName": "John Smith",
+                    "labHeadEmail": "email@internet.com",
+                    "barcodeIndex": None,
+                    "preservation": preservation,
+                    "specimenType": "Blood" if tumor_or_normal == "Normal" else "Biopsy",
+                    "tumorOrNormal": tumor_or_normal
+                }
+            )
+
+    def create_dmp_normal(self, patient_id, external_id):
+        """
+        Create a DMP normal bam of a patient
+        """
+        file_instance = File.objects.create(
+            file_type=FileType.objects.get(name="bam"),
+            file_group=FileGroup.objects.get(name="DMP BAMs"),
+            file_name="%s.bam" % external_id,
+            path="/dmp/%s.bam" % external_id
+        )
+        FileMetadata.objects.create(
+            file=file_instance,
+            metadata={
+                "type": "N",
+                "cmo_assay": "IMPACT468",
+                "external_id": external_id,
+                "patient": {"cmo": patient_id.lstrip('C-')}
+            }
+        )
+
+    def build_tumor(self, patient_id, sample_id):
+        return {
+            "bait_set": "IMPACT468_BAITS",
+            "patient_id": patient_id,
+            "tumor_type": "Tumor",
+            "run_id": ["JAX_0397"],
+            "preservation_type": ["Frozen"],
+            "sample_id": sample_id,
+            "SM": sample_id,
+            "request_id": "10075_D_3"
+        }
+
+    def test_build_normal_index(self):
+        """
+        Test that normals are indexed by patient and bait set, keeping the most recent one
+        """
+        normals = [
+            {"patient_id": "C-1", "bait_set": "IMPACT468_BAITS", "run_date": ["2019-12-12"], "SM": "N1"},
+            {"patient_id": "C-1", "bait_set": "IMPACT468_BAITS", "run_date": ["2019-12-13"], "SM": "N2"},
+            {"patient_id": "C-1", "bait_set": "IMPACT410_BAITS", "run_date": ["2019-12-14"], "SM": "N3"},
+            {"patient_id": "C-2", "bait_set": "IMPACT468_BAITS", "run_date": ["19-12-14"], "SM": "N4"},
+        ]
+        normal_index = build_normal_index(normals)
+        self.assertEqual(normal_index[("C-1", "IMPACT468_BAITS")]['SM'], "N2")
+        self.assertEqual(normal_index[("C-1", "IMPACT410_BAITS")]['SM'], "N3")
+        self.assertEqual(normal_index[("C-2", "IMPACT468_BAITS")]['SM'], "N4")
+
+    def test_get_viable_normal_conflicting_bait_set(self):
+        """
+        Test that a normal whose bait set is a list of conflicting values is still found
+        """
+        normals = [
+            {"patient_id": "C-1", "bait_set": ["IMPACT468_BAITS", "IMPACT410_BAITS"], "run_date": ["2019-12-12"], "SM": "N1"},
+            {"patient_id": "C-1", "bait_set": "IMPACT468_BAITS", "run_date": ["2019-12-13"], "SM": "N2"},
+        ]
+        normal = get_viable_normal(normals, "C-1", ["IMPACT468_BAITS", "IMPACT410_BAITS"])
+        self.assertEqual(normal['SM'], "N1")
+        self.assertEqual(get_viable_normal(normals, "C-1", "IMPACT468_BAITS")['SM'], "N2")
+        self.assertEqual(get_viable_normal(normals, "C-2", "IMPACT468_BAITS"), dict())
+
+    def test_get_run_date_range(self):
+        """
+        Test that run dates in either year format are parsed and unparseable ones are skipped
+        """
+        self.assertEqual(get_run_date_range(["19-12-14", "2019-12-12", "", "bad date"]),
+                         ("2019-12-12", "2019-12-14"))
+        self.assertEqual(get_run_date_range([]), (None, None))
+
+    def test_batch_normals_from_other_request_and_dmp(self):
+        """
+        Test that normals in other requests and DMP normals are each found with one query
+        for all tumors, and that pooled normals aren't looked up when every tumor has a normal
+        """
+        self.create_fastq_sample("LIMS", "10075_D_2_1", "C-000001", "C-000001-N001-d", "Normal", "10075_D_2")
+        self.create_fastq_sample("LIMS", "10075_D_2_2", "C-000001", "C-000001-T001-d", "Tumor", "10075_D_2")
+        self.create_dmp_normal("C-000002", "P-0000002-N01-IM6")
+        tumors = [self.build_tumor("C-000001", "10075_D_3_1"), self.build_tumor("C-000002", "10075_D_3_2")]
+
+        with patch('runner.operator.argos_operator.v1_1_0.bin.pair_request.PooledNormalResolver',
+                   wraps=PooledNormalResolver) as resolver:
+            with self.assertNumQueries(2):
+                pairs = compile_pairs(tumors)
+            resolver.assert_not_called()
+
+        self.assertEqual(pairs['tumor'], tumors)
+        self.assertEqual(pairs['normal'][0]['sample_id'], "10075_D_2_1")
+        self.assertEqual(pairs['normal'][0]['SM'], "s_C_000001_N001_d")
+        self.assertEqual(pairs['normal'][1]['sample_id'], "P-0000002-N01-IM6")
+        self.assertEqual(pairs['normal'][1]['specimen_type'], "DMP Normal")
+        self.assertEqual(pairs['normal'][1]['bam'], ["/dmp/P-0000002-N01-IM6.bam"])
+
+    def test_batch_pooled_normal_fallback(self):
+        """
+        Test that pooled normals are loaded once, and only for tumors without a normal
+        in the request, in other requests or in the DMP data
+        """
+        self.create_dmp_normal("C-000002", "P-0000002-N01-IM6")
+        self.create_fastq_sample("Pooled Normal", "FROZENPOOLEDNORMAL", "PN_PATIENT_ID",
+                                 "FROZENPOOLEDNORMAL", "Normal", "POOLEDNORMALS")
+        tumors = [self.build_tumor("C-000002", "10075_D_3_2"),
+                  self.build_tumor("C-000003", "10075_D_3_3"),
+                  self.build_tumor("C-000004", "10075_D_3_4")]
+
+        with patch('runner.operator.argos_operator.v1_1_0.bin.pair_request.PooledNormalResolver',
+                   wraps=PooledNormalResolver) as resolver:
+            with self.assertNumQueries(3):
+                pairs = compile_pairs(tumors)
+            self.assertEqual(resolver.call_count, 1)
+
+        self.assertEqual(pairs['tumor'], tumors)
+        self.assertEqual(pairs['normal'][0]['sample_id'], "P-0000002-N01-IM6")
+        self.assertEqual(pairs['normal'][1]['SM'], "FROZENPOOLEDNORMAL_JAX_0397")
+        self.assertIs(pairs['normal'][1], pairs['normal'][2])
+
+    def test_get_pair_from_other_request(self):
+        """
+        Test that you can get the correct Normal sample for a patient when the
+        Normal sample is part of another request
+        """
+        # Load fixtures
+        # only normals
+        call_command('loaddata',
+                     os.path.join(settings.TEST_FIXTURE_DIR, "10075_D_2.file.json"),
+                     verbosity=0)
+        call_command('loaddata',
+                     os.path.join(settings.TEST_FIXTURE_DIR, "10075_D_2.filemetadata.json"),
+                     verbosity=0)
+        # only tumors
+        call_command('loaddata',
+                     os.path.join(settings.TEST_FIXTURE_DIR, "10075_D_3.file.json"),
+                     verbosity=0)
+        call_command('loaddata',
+                     os.path.join(settings.TEST_FIXTURE_DIR, "10075_D_3.filemetadata.json"),
+                     verbosity=0)
+
+        # check the total number of db entries now
+        self.assertTrue(len(File.objects.all()) == 4)
+        self.assertTrue(len(FileMetadata.objects.all()) == 4)
+
+        samples = [
+            {
+                "bait_set": "IMPACT468_BAITS",
+                "patient_id": "C-8VK0V7",
+                "tumor_type": "Tumor",
+                'run_id': ['JAX_0397'],
+                "preservation_type": ["EDTA-Streck"],
+                "sample_id": "10075_D_3_5",
+                "SM": "10075_D_3_5",
+                "request_id": "10075_D_3"
+            }
+        ]
+
+        pairs = compile_pairs(samples)
+        expected_pairs = {
+            'tumor': [
+                {
+                    'bait_set': 'IMPACT468_BAITS',
+                    'patient_id': 'C-8VK0V7',
+                    'run_id': ['JAX_0397'],
+                    "preservation_type": ["EDTA-Streck"],
+                    'tumor_type': 'Tumor',
+                    'sample_id': '10075_D_3_5',
+                    "SM": "10075_D_3_5",
+                    'request_id': '10075_D_3'
+                }
+            ],
+            'normal': [
+                {
+                    'CN': 'MSKCC',
+                    'PL': 'Illumina',
+                    'PU': ['HCYYWBBXY'],
+                    'LB': '10075_D_2_3',
+                    'tumor_type': 'Normal',
+                    'ID': ['s_C_8VK0V7_N001_d_HCYYWBBXY'],
+                    'SM': 's_C_8VK0V7_N001_d',
+                    'species': 'Human',
+                    'patient_id': 'C-8VK0V7',
+                    'bait_set': 'IMPACT468_BAITS',
+                    'sample_id': '10075_D_2_3',
+                    'run_date': ['2019-12-12'],
+                    'run_date_min': '2019-12-12',
+                    'run_date_max': '2019-12-12',
+                    'specimen_type': 'Blood',
+                    'R1': [
+                        '/ifs/archive/GCL/hiseq/FASTQ/JAX_0397_BHCYYWBBXY/Project_10075_D_2/Sample_JW_MEL_007_NORM_IGO_10075_D_2_3/JW_MEL_007_NORM_IGO_10075_D_2_3_S15_R1_001.fastq.gz'],
+                    'R2': [
+                        '/ifs/archive/GCL/hiseq/FASTQ/JAX_0397_BHCYYWBBXY/Project_10075_D_2/Sample_JW_MEL_007_NORM_IGO_10075_D_2_3/JW_MEL_007_NORM_IGO_10075_D_2_3_S15_R2_001.fastq.gz'],
+                    'R1_bid': [UUID('a46c5e6b-0793-4cd2-b5dd-92b3d71cf1ac')],
+                    'R2_bid': [UUID('c71c259a-ebc0-4490-9af1-bc99387a70d7')],
+                    'bam': [],
+                    'bam_bid': [],
+                    'request_id': '10075_D_2',
+                    'run_id': ['JAX_0397'],
+                    "preservation_type": ["EDTA-Streck"],
+                    'pi': 'John Smith',
+                    'pi_email': 'email@internet.com'}
+            ]
+        }
+
+        self.assertTrue(pairs == expected_pairs)
+
+    def test_get_most_recent_normal1(self):
+        """
+        Test that when retreiving a normal from other requests, the most recent Normal is returned
+        in the event that a patient has several normals
+        Return the Normal with the most recent run_date
+        """
+        call_command('loaddata',
+                     os.path.join(settings.TEST_FIXTURE_DIR, "10075_D_2.file.json"),
+                     verbosity=0)
+        call_command('loaddata',
+                     os.path.join(settings.TEST_FIXTURE_DIR, "10075_D_2.filemetadata.json"),
+                     verbosity=0)
+        call_command('loaddata',
+                     os.path.join(settings.TEST_FIXTURE_DIR, "10075_D_4.file.json"),
+                     verbosity=0)
+        call_command('loaddata',
+                     os.path.join(settings.TEST_FIXTURE_DIR, "10075_D_4.filemetadata.json"),
+                     verbosity=0)
+
+        # check the total number of db entries now
+        self.assertTrue(len(File.objects.all()) == 4)
+        self.assertTrue(len(FileMetadata.objects.all()) == 4)
+
+        samples = [
+            {
+                "bait_set": "IMPACT468_BAITS",
+                "patient_id": "C-8VK0V7",
+                "tumor_type": "Tumor",
+                "sample_id": "10075_D_3_5",
+                "SM": "10075_D_3_5",
+                "request_id": "10075_D_3",
+                'run_id': ['JAX_0397'],
+                "preservation_type": ["EDTA-Streck"]
+            }
+        ]
+
+        pairs = compile_pairs(samples)
+        expected_pairs = {
+            'tumor': [
+                {
+                    'bait_set': 'IMPACT468_BAITS',
+                    'patient_id': 'C-8VK0V7',
+                    'tumor_type': 'Tumor',
+                    'sample_id': '10075_D_3_5',
+                    "SM": "10075_D_3_5",
+                    'request_id': '10075_D_3',
+                    'run_id': ['JAX_0397'],
+                    "preservation_type": ["EDTA-Streck"]
+                }
+            ],
+            'normal': [
+                {
+                    'CN': 'MSKCC',
+                    'PL': 'Illumina',
+                    'PU': ['HCYYWBBXY'],
+                    'LB': '10075_D_4_3',
+                    'tumor_type': 'Normal',
+                    'ID': ['s_C_8VK0V7_N001_d_HCYYWBBXY'],
+                    'SM': 's_C_8VK0V7_N001_d',
+                    'species': 'Human',
+                    'patient_id': 'C-8VK0V7',
+                    'bait_set': 'IMPACT468_BAITS',
+                    'sample_id': '10075_D_4_3',
+                    'run_date': ['2019-12-13'],
+                    'run_date_min': '2019-12-13',
+                    'run_date_max': '2019-12-13',
+                    'specimen_type': 'Blood',
+                    'R1': [
+                        '/ifs/archive/GCL/hiseq/FASTQ/JAX_0397_BHCYYWBBXY/Project_10075_D_4/Sample_JW_MEL_007_NORM_IGO_10075_D_4_3/JW_MEL_007_NORM_IGO_10075_D_4_3_S15_R1_001.fastq.gz'],
+                    'R2': [
+                        '/ifs/archive/GCL/hiseq/FASTQ/JAX_0397_BHCYYWBBXY/Project_10075_D_4/Sample_JW_MEL_007_NORM_IGO_10075_D_4_3/JW_MEL_007_NORM_IGO_10075_D_4_3_S15_R2_001.fastq.gz'],
+                    'R1_bid': [UUID('08072445-84ff-4b43-855d-d8d2dc87e2d5')],
+                    'R2_bid': [UUID('f0d9a1e1-9414-42df-a749-08776732ee04')],
+                    'bam': [],
+                    'bam_bid': [],
+                    'request_id': '10075_D_4',
+                    'run_id': ['JAX_0397'],
+                    "preservation_type": ["EDTA-Streck"],
+                    'pi': 'John Smith', 'pi_email': 'email@internet.com'}
+            ]
+        }
+
+        self.assertTrue(pairs == expected_pairs)
@@ -0,0 +1,58 @@
+from django.test import TestCase
+from runner.operator.argos_operator.v1_1_0.bin.retrieve_samples_by_query import PooledNormalResolver
+from file_system.models import File, FileMetadata, FileGroup, FileType
+
+
+class TestPooledNormalResolver(TestCase):
+    # load fixtures for the test case temp db
+    fixtures = [
+        "file_system.filegroup.json",
+        "file_system.filetype.json",
+        "file_system.storage.json"
+    ]
+
+    def setUp(self):
+        poolednormal_filegroup_instance = FileGroup.objects.get(name="Pooled Normal")
+        fastq_filetype_instance = FileType.objects.get(name="fastq")
+        for r in ("R1", "R2"):
+            file_instance = File.objects.create(
+                file_type=fastq_filetype_instance,
+                file_group=poolednormal_filegroup_instance,
+                file_name="FROZENPOOLEDNORMAL.%s.fastq" % r,
+                path="/FROZENPOOLEDNORMAL.%s.fastq" % r
+            )
+            FileMetadata.objects.create(
+                file=file_instance,
+                metadata={
+                    "runId": "PITT_0439",
+                    "recipe": "IMPACT468",
+                    "sequencingCenter": "MSKCC",
+                    "platform": "Illumina",
+                    'baitSet': 'IMPACT468_BAITS',
+                    "preservation": "Frozen"
+                }
+            )
+
+    def test_resolve_from_memory(self):
+        """
+        Test that pooled normals are loaded once and repeated lookups are answered from memory
+        """
+        resolver = PooledNormalResolver(['PITT_0439', 'JAX_0397'])
+        with self.assertNumQueries(0):
+            pooled_normal = resolver.get(['PITT_0439'], ['Frozen'], "IMPACT468_BAITS")
+            self.assertEqual(pooled_normal['SM'], "FROZENPOOLEDNORMAL_PITT_0439")
+            self.assertEqual(len(pooled_normal['R1']), 1)
+            self.assertEqual(len(pooled_normal['R2']), 1)
+            self.assertIs(resolver.get(['PITT_0439'], ['Frozen'], "IMPACT468_BAITS"), pooled_normal)
+            self.assertIsNone(resolver.get(['PITT_0439'], ['FFPE'], "IMPACT468_BAITS"))
+            self.assertIsNone(resolver.get(['JAX_0397'], ['Frozen'], "IMPACT468_BAITS"))
+        self.assertEqual(resolver.stats(), {'hits': 1, 'misses': 3, 'candidates': 2})
+
+    def test_load_missing_run_ids(self):
+        """
+        Test that run ids which weren't preloaded are loaded on demand
+        """
+        resolver = PooledNormalResolver()
+        pooled_normal = resolver.get(['PITT_0439'], ['Frozen'], "IMPACT468_BAITS")
+        self.assertEqual(pooled_normal['SM'], "FROZENPOOLEDNORMAL_PITT_0439")
+        self.assertEqual(resolver.loaded_run_ids, {'PITT_0439'})
@@ -0,0 +1,44 @@
+import os
+import tempfile
+from django.test import SimpleTestCase
+from runner.operator.tempo_mpgen_operator.bin.patient_cache import PatientCache
+
+
+class TestPatientCache(SimpleTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = PatientCache(os.path.join(self.tmpdir.name, "cache"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_fingerprint(self):
+        fingerprint = PatientCache.fingerprint("C-1", "digest", [("s_C_1_T", "s_C_1_N")])
+        self.assertEqual(fingerprint, PatientCache.fingerprint("C-1", "digest", [("s_C_1_T", "s_C_1_N")]))
+        self.assertNotEqual(fingerprint, PatientCache.fingerprint("C-1", "other", [("s_C_1_T", "s_C_1_N")]))
+        self.assertNotEqual(fingerprint, PatientCache.fingerprint("C-1", "digest", []))
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get("C-1", "old"))
+        self.cache.set("C-1", "old", {"pairing": [["s_C_1_N", "s_C_1_T"]]})
+        self.assertEqual(self.cache.get("C-1", "old"), {"pairing": [["s_C_1_N", "s_C_1_T"]]})
+        self.cache.set("C-1", "new", {"pairing": []})
+        self.assertIsNone(self.cache.get("C-1", "old"))
+        self.assertEqual(self.cache.get("C-1", "new"), {"pairing": []})
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_evict(self):
+        self.cache.set("C-1", "fingerprint", {"pairing": []})
+        self.cache.set("C-2", "fingerprint", {"pairing": []})
+        self.assertEqual(self.cache.evict(["C-2"]), 1)
+        self.assertIsNone(self.cache.get("C-1", "fingerprint"))
+        self.assertIsNotNone(self.cache.get("C-2", "fingerprint"))
+
+    def test_shared_directory_not_used(self):
+        os.chmod(self.cache.cache_dir, 0o777)
+        cache = PatientCache(self.cache.cache_dir)
+        cache.set("C-1", "fingerprint", {"pairing": []})
+        self.assertFalse(cache.enabled)
+        self.assertEqual(os.listdir(cache.cache_dir), [])
+        self.assertIsNone(cache.get("C-1", "fingerprint"))
@@ -0,0 +1,68 @@
+import os
+import pickle
+import tempfile
+from types import SimpleNamespace
+from django.test import SimpleTestCase
+from runner.operator.tempo_mpgen_operator.bin.patient_data import write_patients, write_pickled_patients, \
+    PatientDataReader, INDEX_SUFFIX
+
+
+def build_sample(sample_name, sample_class):
+    fastqs = SimpleNamespace(paired=True,
+                             r1=[SimpleNamespace(path="/%s_R1.fastq.gz" % sample_name)],
+                             r2=[SimpleNamespace(path="/%s_R2.fastq.gz" % sample_name)])
+    return SimpleNamespace(sample_name=sample_name, cmo_sample_name="s_%s" % sample_name, patient_id="C-1",
+                           sample_class=sample_class, specimen_type="Biopsy", bait_set="idt", run_mode="NovaSeq",
+                           conflict=False, conflict_fields=[], metadata={'sampleName': [sample_name]},
+                           fastqs=fastqs)
+
+
+def build_patient(tumors, normal):
+    samples = {s.sample_name: s for s in tumors + [normal]}
+    return SimpleNamespace(_samples=samples,
+                           tumor_samples={s.sample_name: s for s in tumors},
+                           normal_samples={normal.sample_name: normal},
+                           conflict_samples={},
+                           unpaired_samples=[],
+                           sample_pairing=[[tumor, normal] for tumor in tumors])
+
+
+class TestPatientData(SimpleTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "patients_data.ndjson")
+        self.patients = {
+            "C-1": build_patient([build_sample("T1", "Tumor")], build_sample("N1", "Normal")),
+            "C-2": build_patient([build_sample("T2", "Tumor"), build_sample("T3", "Tumor")],
+                                 build_sample("N2", "Normal")),
+        }
+        write_patients(self.patients, self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read_patient(self):
+        reader = PatientDataReader(self.path)
+        self.assertEqual(reader.patient_ids(), ["C-1", "C-2"])
+        patient = reader.get("C-2")
+        self.assertEqual(patient['pairs'], [{'tumor': 'T2', 'normal': 'N2'}, {'tumor': 'T3', 'normal': 'N2'}])
+        self.assertEqual(patient['samples']['T3']['fastqs']['r2'], ["/T3_R2.fastq.gz"])
+        self.assertIsNone(reader.get("C-3"))
+
+    def test_read_without_index(self):
+        os.remove(self.path + INDEX_SUFFIX)
+        reader = PatientDataReader(self.path)
+        self.assertEqual(reader.get("C-1")['normal_samples'], ["N1"])
+        self.assertEqual([p['patient_id'] for p in reader], ["C-1", "C-2"])
+
+    def test_write_pickled_patients(self):
+        path = os.path.join(self.tmpdir.name, "patients_data_pickle")
+        write_pickled_patients(((patient_id, pickle.dumps(patient, protocol=2))
+                                for patient_id, patient in self.patients.items()), path)
+        with open(path, 'rb') as fh:
+            patients = pickle.load(fh)
+        self.assertEqual(list(patients), ["C-1", "C-2"])
+        pair = patients["C-2"].sample_pairing[1]
+        self.assertEqual((pair[0].sample_name, pair[1].sample_name), ("T3", "N2"))
+        self.assertIs(pair[1], patients["C-2"].normal_samples["N2"])
@@ -0,0 +1,146 @@
+from django.test import TestCase
+from runner.operator.helper import get_sample_mapping, group_files_by_sample, get_run_ports, list_run_ports, \
+    get_target_assay, parse_fastq_name
+from runner.models import Run, RunStatus, Pipeline, Port, PortType
+from file_system.models import File, FileMetadata, FileGroup, FileType
+from file_system.repository.file_repository import FileRepository
+
+
+def build_pair_sample(sample_id, **files):
+    sample = {'ID': sample_id}
+    for field in ('R1', 'R2', 'zR1', 'zR2', 'bam'):
+        sample[field] = [{'location': 'juno://%s' % path} for path in files.get(field, [])]
+    return sample
+
+
+class TestSampleMapping(TestCase):
+
+    def setUp(self):
+        normal = build_pair_sample('s_N', R1=['/n_R1.fastq.gz'], R2=['/n_R2.fastq.gz'])
+        self.pairs = [
+            (build_pair_sample('s_T1', R1=['/t1_R1.fastq.gz'], R2=['/t1_R2.fastq.gz']), normal),
+            (build_pair_sample('s_T2', R1=['/t2_R1.fastq.gz'], R2=['/t2_R2.fastq.gz']), normal),
+        ]
+
+    def test_sample_mapping(self):
+        sample_mapping, files = get_sample_mapping(self.pairs)
+        self.assertEqual(sample_mapping,
+                         "s_T1\t/t1_R1.fastq.gz\n"
+                         "s_T1\t/t1_R2.fastq.gz\n"
+                         "s_N\t/n_R1.fastq.gz\n"
+                         "s_N\t/n_R2.fastq.gz\n"
+                         "s_T2\t/t2_R1.fastq.gz\n"
+                         "s_T2\t/t2_R2.fastq.gz\n")
+        self.assertEqual(files, ['/t1_R1.fastq.gz', '/t1_R2.fastq.gz', '/n_R1.fastq.gz', '/n_R2.fastq.gz',
+                                 '/t2_R1.fastq.gz', '/t2_R2.fastq.gz'])
+
+    def test_sample_mapping_unique_lines(self):
+        """
+        Test the v1.1.0 format, where a normal R2 is written twice the first time it's seen
+        """
+        sample_mapping, files = get_sample_mapping(self.pairs, unique_lines=True)
+        self.assertEqual(sample_mapping,
+                         "s_T1\t/t1_R1.fastq.gz\n"
+                         "s_T1\t/t1_R2.fastq.gz\n"
+                         "s_N\t/n_R1.fastq.gz\n"
+                         "s_N\t/n_R2.fastq.gz\n"
+                         "s_N\t/n_R2.fastq.gz\n"
+                         "s_T2\t/t2_R1.fastq.gz\n"
+                         "s_T2\t/t2_R2.fastq.gz\n")
+        self.assertEqual(len(files), 6)
+
+
+class TestGetTargetAssay(TestCase):
+
+    def test_get_target_assay(self):
+        self.assertEqual(get_target_assay("IMPACT468_BAITS"), "IMPACT468_b37")
+        self.assertEqual(get_target_assay("IMPACT468+08390"), "IMPACT468_08390")
+        self.assertEqual(get_target_assay("IMPACT468+Poirier_RB1_intron_V2"), "IMPACT468_08050")
+        self.assertEqual(get_target_assay("IDT_Exome_v1_FP_Viral_Probes"), "IDT_Exome_v1_FP_b37")
+        self.assertEqual(get_target_assay("HemePACT_v4_BAITS"), "HemePACT_v4_BAITS")
+
+
+class TestParseFastqName(TestCase):
+
+    def test_parse_fastq_name(self):
+        fastq_name = parse_fastq_name("/igo/delivery/P-01_IGO_12345_1_S12_L002_R1_001.fastq.gz")
+        self.assertEqual(fastq_name.read, "R1")
+        self.assertEqual(fastq_name.lane, "002")
+        self.assertEqual(fastq_name.sample, "P-01_IGO_12345_1")
+        self.assertEqual(fastq_name.barcode, "P-01_IGO_12345_1_S12_L002__001")
+        self.assertEqual(fastq_name.mate, "/igo/delivery/P-01_IGO_12345_1_S12_L002_R2_001.fastq.gz")
+        self.assertEqual(parse_fastq_name(fastq_name.mate).barcode, fastq_name.barcode)
+
+    def test_parse_fastq_name_last_read(self):
+        fastq_name = parse_fastq_name("/R1/s_R1_R2.fastq.gz")
+        self.assertEqual(fastq_name.read, "R2")
+        self.assertEqual(fastq_name.mate, "/R1/s_R1_R1.fastq.gz")
+        self.assertIsNone(fastq_name.lane)
+        self.assertIsNone(fastq_name.sample)
+
+    def test_parse_fastq_name_without_read(self):
+        self.assertEqual(parse_fastq_name("pooled_normal.fastq.gz").read, None)
+        self.assertEqual(parse_fastq_name("pooled_normal_R1").read, None)
+        self.assertEqual(parse_fastq_name("pooled_normal.fastq.gz").barcode, "pooled_normal")
+
+
+class TestGroupFilesBySample(TestCase):
+    fixtures = [
+        "file_system.filegroup.json",
+        "file_system.filetype.json",
+        "file_system.storage.json"
+    ]
+
+    def setUp(self):
+        file_group = FileGroup.objects.first()
+        file_type = FileType.objects.get(name="fastq")
+        for sample_id, file_name in (("S2", "s2_R1.fastq.gz"), ("S1", "s1_R1.fastq.gz"), ("S2", "s2_R2.fastq.gz")):
+            f = File.objects.create(file_name=file_name, path="/%s" % file_name, file_group=file_group,
+                                    file_type=file_type)
+            FileMetadata.objects.create(file=f, metadata={"sampleId": sample_id, "requestId": "R1"})
+
+    def test_group_queryset(self):
+        files = FileRepository.filter(metadata={"requestId": "R1"})
+        with self.assertNumQueries(1):
+            groups = list(group_files_by_sample(files))
+        self.assertEqual([[f['metadata']['sampleId'] for f in group] for group in groups], [["S1"], ["S2", "S2"]])
+        self.assertEqual(sorted(f['file_name'] for f in groups[1]), ["s2_R1.fastq.gz", "s2_R2.fastq.gz"])
+
+    def test_group_list(self):
+        files = list(FileRepository.filter(metadata={"requestId": "R1"}).order_by('file__file_name'))
+        groups = list(group_files_by_sample(files))
+        self.assertEqual([[f['file_name'] for f in group] for group in groups],
+                         [["s1_R1.fastq.gz"], ["s2_R1.fastq.gz", "s2_R2.fastq.gz"]])
+
+
+class TestGetRunPorts(TestCase):
+    fixtures = [
+        "file_system.filegroup.json",
+        "file_system.filetype.json",
+        "file_system.storage.json"
+    ]
+
+    def setUp(self):
+        pipeline = Pipeline.objects.create(name="argos", github="http://pipeline.github.com", version="v1.0",
+                                           entrypoint="pipeline.cwl", output_file_group=FileGroup.objects.first(),
+                                           output_directory="/path/to/outputs")
+        self.runs = [Run.objects.create(app=pipeline, status=RunStatus.COMPLETED, notify_for_outputs=[])
+                     for _ in range(3)]
+        for run in self.runs[:2]:
+            for name in ("pair", "maf", "project_prefix"):
+                Port.objects.create(run=run, name=name, port_type=PortType.OUTPUT, value=name)
+
+    def test_get_run_ports(self):
+        run_ids = [run.id for run in reversed(self.runs)]
+        with self.assertNumQueries(1):
+            run_ports = get_run_ports(run_ids)
+        self.assertEqual(list(run_ports), [str(run_id) for run_id in run_ids])
+        self.assertEqual(run_ports[str(self.runs[2].id)], {})
+        ports = run_ports[str(self.runs[0].id)]
+        self.assertEqual(list(ports), ["pair", "maf", "project_prefix"])
+        self.assertEqual([port.value for port in list_run_ports(ports)], ["pair", "maf", "project_prefix"])
+
+    def test_get_run_ports_by_name(self):
+        run_ports = get_run_ports([run.id for run in self.runs], names=["pair"])
+        self.assertEqual([list(ports) for ports in run_ports.values()], [["pair"], ["pair"], []])
+        self.assertEqual(run_ports[str(self.runs[1].id)]["pair"][0].run_id, self.runs[1].id)
@@ -0,0 +1,42 @@
+import os
+import json
+import tempfile
+from django.test import SimpleTestCase
+from runner.operator import reference_cache
+
+
+class TestReferenceCache(SimpleTestCase):
+
+    def setUp(self):
+        reference_cache.clear()
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.write({"targets": {"IMPACT468_b37": {}}})
+
+    def tearDown(self):
+        os.remove(self.path)
+        reference_cache.clear()
+
+    def write(self, data, mtime=None):
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+        if mtime:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_load_json_cached(self):
+        data = reference_cache.load_json(self.path)
+        self.assertEqual(data, {"targets": {"IMPACT468_b37": {}}})
+        self.assertIs(reference_cache.load_json(self.path), data)
+
+    def test_load_json_reloaded_on_change(self):
+        self.write({"version": 1}, mtime=1000000000)
+        self.assertEqual(reference_cache.load_json(self.path), {"version": 1})
+        self.write({"version": 2}, mtime=1000000100)
+        self.assertEqual(reference_cache.load_json(self.path), {"version": 2})
+
+    def test_load_template(self):
+        with open(self.path, 'w') as f:
+            f.write('{"sample": {{ sample }}}')
+        template = reference_cache.load_template(self.path)
+        self.assertIs(reference_cache.load_template(self.path), template)
+        self.assertEqual(template.render(sample='"s_1"'), '{"sample": "s_1"}')
@@ -4,7 +4,7 @@ Tests for Operator Trigger
 import os
 import uuid
 from mock import patch, call
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from runner.models import OperatorRun, RunStatus, TriggerRunType, OperatorTrigger, Run
 from runner.tasks import process_triggers, complete_job, fail_job, create_jobs_from_operator
 from beagle_etl.models import Operator
@@ -44,6 +44,39 @@ class TestOperatorTriggers(TestCase):
         self.assertEqual(Run.objects.first().status, RunStatus.FAILED)
 
 
+    @override_settings(RUN_DISPATCH_CHUNK_SIZE=2)
+    @patch('runner.tasks.group')
+    @patch('runner.tasks.create_run_task')
+    @patch('notifier.tasks.send_notification')
+    @patch('runner.operator.argos_operator.v1_0_0.ArgosOperator.get_jobs')
+    @patch('runner.operator.argos_operator.v1_0_0.ArgosOperator.get_pipeline_id')
+    def test_create_jobs_from_operator_dispatches_chunks(self, get_pipeline_id, get_jobs, send_notification,
+                                                         create_run_task, group):
+        pipeline_id = 'cb5d793b-e650-4b7d-bfcd-882858e29cc5'
+        argos_jobs = []
+        for i in range(3):
+            serializer = APIRunCreateSerializer(data={'app': pipeline_id, 'inputs': {'i': i}, 'name': 'run %s' % i,
+                                                      'tags': {'i': i}})
+            argos_jobs.append((serializer, {'i': i}))
+        get_jobs.return_value = argos_jobs
+        get_pipeline_id.return_value = pipeline_id
+        create_run_task.s.side_effect = lambda *args: args
+        Run.objects.all().delete()
+
+        operator = OperatorFactory.get_by_model(Operator.objects.get(id=1), request_id="bar")
+        create_jobs_from_operator(operator, None)
+
+        runs = Run.objects.order_by('name')
+        self.assertEqual(len(runs), 3)
+        operator_run = runs[0].operator_run
+        self.assertEqual(operator_run.status, RunStatus.RUNNING)
+        self.assertEqual(operator_run.num_total_runs, 3)
+        self.assertTrue(runs[0].output_directory.endswith(str(runs[0].id)))
+        self.assertEqual(group.call_count, 2)
+        dispatched = group.call_args_list[0][0][0] + group.call_args_list[1][0][0]
+        self.assertEqual(sorted([d[1]['i'] for d in dispatched]), [0, 1, 2])
+        self.assertEqual(set([d[0] for d in dispatched]), set([str(run.id) for run in runs]))
+
     @patch('runner.tasks.create_jobs_from_chaining')
     def test_operator_trigger_creates_next_operator_run_when_90percent_runs_completed(self, create_jobs_from_chaining):
         operator_run = OperatorRun.objects.prefetch_related("runs").first()
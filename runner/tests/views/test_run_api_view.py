@@ -9,7 +9,7 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 from runner.views.run_api_view import OperatorViewSet
 from beagle_etl.models import JobGroup
-from runner.models import Run, RunStatus
+from runner.models import Run, RunStatus, Port, PortType
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.core.management import call_command
@@ -79,6 +79,33 @@ class TestRunAPIList(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()['count'], 7)
 
+    def test_run_facets(self):
+        url = self.api_root + '?run_facets=status,tags__requestId'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'status': {'0': 7}, 'tags__requestId': {'request1': 1, 'request2': 1}})
+
+    def test_run_facets_count_runs_not_values(self):
+        url = self.api_root + '?values_run=app&run_facets=status'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'status': {'0': 7}})
+
+    def test_run_facets_count_runs_matching_several_ports(self):
+        run = Run.objects.get(id='a6a4bc72-0b11-42ea-9a4b-c774fb2c6622')
+        Port.objects.create(run=run, name='input1', port_type=PortType.INPUT)
+        Port.objects.create(run=run, name='input2', port_type=PortType.INPUT)
+        url = self.api_root + '?ports=port_type:%s&run_facets=status' % PortType.INPUT.value
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'status': {'0': 1}})
+
+    def test_run_distribution(self):
+        url = self.api_root + '?tags=tag:value&run_distribution=tags__requestId'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'request1': 1, 'request2': 1})
+
 
 class TestRunAPIView(TestCase):
     fixtures = [
@@ -3,7 +3,7 @@ from distutils.util import strtobool
 import datetime
 from django.shortcuts import get_object_or_404
 from beagle.pagination import time_filter
-from django.db.models import Prefetch, Count
+from django.db.models import Prefetch
 from django.core.exceptions import ValidationError
 from rest_framework import status
 from rest_framework import mixins
@@ -24,6 +24,7 @@ from notifier.tasks import notifier_start
 from notifier.tasks import send_notification
 from drf_yasg.utils import swagger_auto_schema
 from beagle.common import fix_query_list
+from beagle.facets import get_facets
 from notifier.events import RunStartedEvent, AddPipelineToDescriptionEvent
 
 
@@ -50,7 +51,7 @@ class RunApiViewSet(mixins.ListModelMixin,
 
     @swagger_auto_schema(query_serializer=RunApiListSerializer)
     def list(self, request, *args, **kwargs):
-        query_list_types = ['job_groups','request_ids','inputs','tags','jira_ids','run_ids','apps','run','values_run','ports']
+        query_list_types = ['job_groups','request_ids','inputs','tags','jira_ids','run_ids','apps','run','values_run','ports','run_facets']
         fixed_query_params = fix_query_list(request.query_params,query_list_types)
         serializer = RunApiListSerializer(data=fixed_query_params)
         if serializer.is_valid():
@@ -67,6 +68,7 @@ class RunApiViewSet(mixins.ListModelMixin,
             values_run = fixed_query_params.get('values_run')
             run = fixed_query_params.get('run')
             run_distribution = fixed_query_params.get('run_distribution')
+            run_facets = fixed_query_params.get('run_facets')
             count = fixed_query_params.get('count')
             full = fixed_query_params.get('full')
             if full:
@@ -98,6 +100,12 @@ class RunApiViewSet(mixins.ListModelMixin,
                     filter_query[key] = value
                 if filter_query:
                     queryset = queryset.filter(**filter_query)
+            # facets count runs, so they're taken before values_run projects the queryset
+            if run_facets:
+                return Response(get_facets(queryset, run_facets), status=status.HTTP_200_OK)
+            if run_distribution:
+                distribution_dict = get_facets(queryset, [run_distribution])[run_distribution]
+                return Response(distribution_dict, status=status.HTTP_200_OK)
             if values_run:
                 if len(values_run) == 1:
                     ret_str = values_run[0]
@@ -106,23 +114,6 @@ class RunApiViewSet(mixins.ListModelMixin,
                     values_run_query_list = [single_run for single_run in values_run ]
                     values_run_query_set = set(values_run_query_list)
                     queryset = queryset.values_list(*values_run_query_set).distinct()
-            if run_distribution:
-                distribution_dict = {}
-                run_query = run_distribution
-                run_ids = queryset.values_list('id',flat=True)
-                queryset = Run.objects.all()
-                queryset = queryset.filter(id__in=run_ids).values(run_query).order_by().annotate(Count(run_query))
-                for single_arg in queryset:
-                    single_arg_name = None
-                    single_arg_count = 0
-                    for single_key, single_value in single_arg.items():
-                        if 'count' in single_key:
-                            single_arg_count = single_value
-                        else:
-                            single_arg_name = single_value
-                    if single_arg_name is not None:
-                        distribution_dict[single_arg_name] = single_arg_count
-                return Response(distribution_dict, status=status.HTTP_200_OK)
             if count:
                 count = bool(strtobool(count))
                 if count:
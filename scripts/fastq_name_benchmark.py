@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of fastq name parsing, comparing runner.operator.helper.parse_fastq_name
+with the string reversal it replaced (R1_or_R2 / get_r_orientation and spoof_barcode)
+
+Paths are read from a file with one fastq path per line, or generated as the pairs of
+a pooled normal / request build when no file is given. Every path is parsed --repeat
+times, as a build looks up the same fastqs once per sample, pair and check.
+
+Usage
+-----
+
+$ fastq_name_benchmark.py [paths.txt] [--samples 500] [--repeat 10]
+
+Output
+------
+
+Number of parses, elapsed time and parses per second of the reversal, of the first
+(uncached) parse_fastq_name pass and of the memoized passes
+"""
+import os
+import sys
+import time
+import argparse
+import django
+
+parser = argparse.ArgumentParser(description='Benchmark fastq name parsing')
+parser.add_argument('paths', nargs='?', help='File with one fastq path per line')
+parser.add_argument('--samples', type=int, default=500, help='Samples to generate when no paths are given')
+parser.add_argument('--repeat', type=int, default=10)
+args = parser.parse_args()
+
+# import django app from parent dir
+parentdir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, parentdir)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "beagle.settings")
+django.setup()
+from runner.operator.helper import parse_fastq_name
+sys.path.pop(0)
+
+
+def reversal(path):
+    reversed_filename = ''.join(reversed(path))
+    r1_idx = reversed_filename.find('1R')
+    r2_idx = reversed_filename.find('2R')
+    if r1_idx > 0 and (r2_idx == -1 or r1_idx < r2_idx):
+        r_orientation = 'R1'
+    elif r2_idx > 0:
+        r_orientation = 'R2'
+    else:
+        r_orientation = 'ERROR'
+    reversed_str = reversed_filename.replace('1R' if r_orientation == 'R1' else '2R', '')
+    return r_orientation, ''.join(reversed(reversed_str)).split(os.extsep)[0]
+
+
+def load_paths():
+    if args.paths:
+        with open(args.paths) as f:
+            return [line.strip() for line in f if line.strip()]
+    paths = list()
+    for i in range(args.samples):
+        for lane in range(1, 5):
+            for read in ('R1', 'R2'):
+                paths.append('/igo/delivery/FASTQ/Project_10075_D/Sample_P-%07d-T01_IGO_10075_D_%s/'
+                             'P-%07d-T01_IGO_10075_D_%s_S%s_L%03d_%s_001.fastq.gz' % (i, i, i, i, i, lane, read))
+    return paths
+
+
+def run(parse, paths, repeat):
+    start = time.monotonic()
+    for _ in range(repeat):
+        for path in paths:
+            parse(path)
+    return time.monotonic() - start
+
+
+def report(name, total, elapsed):
+    print("%s: %s parses in %.3fs, %.0f parses/s" % (name, total, elapsed, total / elapsed if elapsed else 0.0))
+
+
+def main():
+    paths = load_paths()
+    parse_fastq_name.cache_clear()
+    report("reversal", len(paths) * args.repeat, run(reversal, paths, args.repeat))
+    report("parse_fastq_name, uncached", len(paths), run(parse_fastq_name, paths, 1))
+    report("parse_fastq_name, memoized", len(paths) * args.repeat, run(parse_fastq_name, paths, args.repeat))
+    print(parse_fastq_name.cache_info())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lightweight local stand-in for the Jira REST API used by the notifier
+
+Implements the endpoints in JiraClient.JiraEndpoints (search, create, get, update,
+comment, transitions, attachments) against in-memory tickets, with configurable
+latency and error injection. Does not require Django.
+
+Usage
+-----
+
+$ jira_stub_server.py [--port 8090] [--latency 0.05] [--jitter 0.02] [--error-rate 0.01] [--throttle-rate 0.05]
+
+Point Beagle to it with:
+
+$ export JIRA_URL=http://localhost:8090
+
+Extra endpoints
+---------------
+
+GET /_stats      number of calls per endpoint, errors and throttled responses injected
+POST /_reset     clear tickets and stats
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRANSITIONS = [
+    {"id": "11", "name": "CI Review Needed"},
+    {"id": "21", "name": "Not for CI"},
+    {"id": "31", "name": "Pipeline Completed; No Failures"},
+    {"id": "51", "name": "Admin Hold"},
+    {"id": "61", "name": "Can't Do"},
+    {"id": "71", "name": "No Samples"},
+    {"id": "81", "name": "Import Complete"},
+    {"id": "91", "name": "Import Partially Complete"},
+]
+
+ISSUE = re.compile(r'^/rest/api/2/issue/(?P<key>[^/]+)/?(?P<resource>comment|transitions|attachments)?/?$')
+
+
+class JiraStub(object):
+
+    def __init__(self, project='TEST', latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1):
+        self.project = project
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.tickets = dict()
+            self.counter = 0
+            self.stats = Counter()
+
+    def new_ticket(self, fields):
+        with self.lock:
+            self.counter += 1
+            key = "%s-%s" % (self.project, self.counter)
+            fields.setdefault('labels', [])
+            fields.setdefault('description', "")
+            fields['status'] = {'name': 'Open'}
+            self.tickets[key] = {'id': str(self.counter), 'key': key, 'fields': fields,
+                                 'comments': [], 'attachments': []}
+            return key
+
+
+class JiraStubHandler(BaseHTTPRequestHandler):
+    stub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(length) if length else b''
+        if self.headers.get('Content-Type', '').startswith('application/json') and data:
+            return json.loads(data)
+        return data
+
+    def _inject(self, endpoint):
+        stub = self.stub
+        stub.stats[endpoint] += 1
+        delay = stub.latency + random.uniform(0, stub.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if stub.throttle_rate and random.random() < stub.throttle_rate:
+            stub.stats['throttled'] += 1
+            self._send(429, {'errorMessages': ['Rate limit exceeded']}, {'Retry-After': str(stub.retry_after)})
+            return True
+        if stub.error_rate and random.random() < stub.error_rate:
+            stub.stats['errors'] += 1
+            self._send(503, {'errorMessages': ['Service unavailable']})
+            return True
+        return False
+
+    def _route(self, method):
+        path = urlparse(self.path).path
+        if path == '/_stats':
+            return self._send(200, dict(self.stub.stats))
+        if path == '/_reset':
+            self.stub.reset()
+            return self._send(204)
+        body = self._body()
+        if path == '/rest/api/2/search' and method == 'GET':
+            if self._inject('SEARCH'):
+                return
+            issues = list(self.stub.tickets.values())
+            return self._send(200, {'startAt': 0, 'maxResults': 50, 'total': len(issues), 'issues': issues})
+        if path.rstrip('/') == '/rest/api/2/issue' and method == 'POST':
+            if self._inject('CREATE'):
+                return
+            key = self.stub.new_ticket(dict(body.get('fields', {})))
+            ticket = self.stub.tickets[key]
+            return self._send(201, {'id': ticket['id'], 'key': key, 'self': '/rest/api/2/issue/%s' % ticket['id']})
+        match = ISSUE.match(path)
+        if not match:
+            return self._send(404, {'errorMessages': ['Not found']})
+        resource = match.group('resource')
+        endpoint = {None: 'GET' if method == 'GET' else 'UPDATE', 'comment': 'COMMENT',
+                    'transitions': 'TRANSITION', 'attachments': 'ATTACHMENT'}[resource]
+        if self._inject(endpoint):
+            return
+        ticket = self.stub.tickets.get(match.group('key'))
+        if not ticket:
+            return self._send(404, {'errorMessages': ['Issue does not exist']})
+        with self.stub.lock:
+            if resource is None and method == 'GET':
+                return self._send(200, {'id': ticket['id'], 'key': ticket['key'], 'fields': ticket['fields']})
+            if resource is None and method == 'PUT':
+                ticket['fields'].update(body.get('fields', {}))
+                for field, operations in body.get('update', {}).items():
+                    values = ticket['fields'].setdefault(field, [])
+                    for operation in operations:
+                        if 'add' in operation and operation['add'] not in values:
+                            values.append(operation['add'])
+                        elif 'remove' in operation and operation['remove'] in values:
+                            values.remove(operation['remove'])
+                return self._send(204)
+            if resource == 'comment' and method == 'POST':
+                ticket['comments'].append(body.get('body'))
+                return self._send(201, {'id': str(len(ticket['comments'])), 'body': body.get('body')})
+            if resource == 'comment' and method == 'GET':
+                comments = [{'id': str(i + 1), 'body': c} for i, c in enumerate(ticket['comments'])]
+                return self._send(200, {'total': len(comments), 'comments': comments})
+            if resource == 'transitions' and method == 'GET':
+                return self._send(200, {'transitions': TRANSITIONS})
+            if resource == 'transitions' and method == 'POST':
+                transition_id = body.get('transition', {}).get('id')
+                for transition in TRANSITIONS:
+                    if transition['id'] == transition_id:
+                        ticket['fields']['status'] = {'name': transition['name']}
+                        return self._send(204)
+                return self._send(400, {'errorMessages': ['Invalid transition']})
+            if resource == 'attachments' and method == 'POST':
+                ticket['attachments'].append(len(body))
+                return self._send(200, [{'id': str(len(ticket['attachments'])), 'size': len(body)}])
+        return self._send(405, {'errorMessages': ['Method not allowed']})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def do_PUT(self):
+        self._route('PUT')
+
+
+def serve(host='localhost', port=8090, **kwargs):
+    JiraStubHandler.stub = JiraStub(**kwargs)
+    server = ThreadingHTTPServer((host, port), JiraStubHandler)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Jira stand-in for notifier load testing')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--project', default='TEST')
+    parser.add_argument('--latency', type=float, default=0.0, help='Base latency per call in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency per call in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls answered with 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After sent with 429 responses')
+    args = parser.parse_args()
+    server = serve(args.host, args.port, project=args.project, latency=args.latency, jitter=args.jitter,
+                   error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    print("Jira stub listening on http://%s:%s" % (args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark notifier throughput by replaying a recorded stream of events through
+send_notification (or send_notifications when batching) against a Jira stand-in
+
+Events are read from a file with one event dict per line, as passed to
+send_notification.delay (and logged by the send_notification task). Every distinct
+job_notifier in the stream is mapped to a temporary JobGroupNotifier with its own
+ticket, and all database changes are rolled back at the end.
+
+Usage
+-----
+
+$ jira_stub_server.py --latency 0.05 &
+
+$ notifier_benchmark.py events.ndjson [--jira-url http://localhost:8090] [--batch-size 10] [--repeat 1]
+
+--batch-size 1 replays every event as its own send_notification task, larger values
+group consecutive events of the same job_notifier into send_notifications batches.
+
+Output
+------
+
+Number of events, elapsed time, events per second and JiraClient call metrics
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import django
+
+parser = argparse.ArgumentParser(description='Replay recorded notifier events against a Jira stand-in')
+parser.add_argument('events', help='File with one event JSON per line')
+parser.add_argument('--jira-url', default='http://localhost:8090')
+parser.add_argument('--project', default='TEST')
+parser.add_argument('--batch-size', type=int, default=1)
+parser.add_argument('--repeat', type=int, default=1)
+args = parser.parse_args()
+
+os.environ['JIRA_URL'] = args.jira_url
+os.environ['BEAGLE_NOTIFIER_ACTIVE'] = 'True'
+
+# import django app from parent dir
+parentdir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, parentdir)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "beagle.settings")
+django.setup()
+from django.db import transaction
+from notifier.models import Notifier, JobGroup, JobGroupNotifier
+from notifier.jira.jira_client import JiraClient
+from notifier.event_handler.jira_event_handler.jira_event_handler import JiraEventHandler
+from notifier.tasks import send_notification, send_notifications
+sys.path.pop(0)
+
+
+class Rollback(Exception):
+    pass
+
+
+def load_events(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def create_job_notifiers(events, notifier):
+    mapping = dict()
+    for event in events:
+        job_notifier = event.get('job_notifier')
+        if job_notifier not in mapping:
+            jira_id = JiraEventHandler(notifier.board).start(str(job_notifier))
+            jgn = JobGroupNotifier.objects.create(job_group=JobGroup.objects.create(),
+                                                  notifier_type=notifier,
+                                                  jira_id=jira_id)
+            mapping[job_notifier] = str(jgn.id)
+    return mapping
+
+
+def batches(events, batch_size):
+    batch = []
+    for event in events:
+        if batch and (len(batch) == batch_size or batch[-1]['job_notifier'] != event['job_notifier']):
+            yield batch
+            batch = []
+        batch.append(event)
+    if batch:
+        yield batch
+
+
+def replay(events, batch_size):
+    start = time.monotonic()
+    if batch_size <= 1:
+        for event in events:
+            send_notification(dict(event))
+    else:
+        for batch in batches(events, batch_size):
+            send_notifications(batch[0]['job_notifier'], [dict(e) for e in batch])
+    return time.monotonic() - start
+
+
+def main():
+    recorded = load_events(args.events)
+    try:
+        with transaction.atomic():
+            notifier = Notifier.objects.create(notifier_type='JIRA', board=args.project)
+            mapping = create_job_notifiers(recorded, notifier)
+            events = []
+            for event in recorded:
+                event = dict(event)
+                event['job_notifier'] = mapping[event.get('job_notifier')]
+                events.append(event)
+            metrics_before = JiraClient.get_metrics()
+            elapsed = 0.0
+            for _ in range(args.repeat):
+                elapsed += replay(events, args.batch_size)
+            metrics = JiraClient.get_metrics()
+            total = len(events) * args.repeat
+            print("events: %s" % total)
+            print("tickets: %s" % len(mapping))
+            print("batch size: %s" % args.batch_size)
+            print("elapsed: %.2fs" % elapsed)
+            print("events/s: %.1f" % (total / elapsed if elapsed else 0.0))
+            for k in ('calls', 'retries', 'throttled', 'failed'):
+                print("jira %s: %s" % (k, metrics[k] - metrics_before[k]))
+            print("jira calls/event: %.2f" % ((metrics['calls'] - metrics_before['calls']) / total if total else 0.0))
+            print("jira latency avg: %.3fs max: %.3fs" % (metrics['latency_avg'], metrics['latency_max']))
+            raise Rollback()
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()